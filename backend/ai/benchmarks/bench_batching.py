@@ -0,0 +1,84 @@
+"""
+Benchmark: throughput and tail latency of the micro-batching scheduler vs batch size
+
+Simulates many patients checking in at once by firing concurrent single-image
+requests at MicroBatchScheduler and reports requests/second and p50/p99
+latency for each max batch size.
+
+Usage:
+    python benchmarks/bench_batching.py --batch-sizes 1 4 8 16 32 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import time
+
+from common import load_detector, percentile
+
+import torch
+from inference_scheduler import MicroBatchScheduler
+
+
+async def run_case(detector, max_batch_size, max_wait_ms, concurrency, requests):
+    """Drive the scheduler with `concurrency` clients until `requests` have completed"""
+
+    def predict_stacked(tensors):
+        return detector.predict_with_probabilities_batch(torch.cat(tensors, dim=0))
+
+    scheduler = MicroBatchScheduler(
+        predict_stacked, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms
+    )
+    await scheduler.start()
+
+    latencies = []
+    remaining = [requests]
+    sample = torch.randn(1, 3, 224, 224)
+
+    async def client():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            start = time.perf_counter()
+            await scheduler.submit(sample)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    stats = scheduler.stats()
+    await scheduler.stop()
+
+    return {
+        "max_batch_size": max_batch_size,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "avg_batch": stats["average_batch_size"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching throughput/latency benchmark")
+    parser.add_argument("--model-path", default=None, help="Path to the FER model file")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=256)
+    args = parser.parse_args()
+
+    detector = load_detector(args.model_path)
+
+    # Warm-up so the first case does not pay one-off allocation costs
+    detector.predict_with_probabilities_batch(torch.randn(2, 3, 224, 224))
+
+    print(f"{'batch':>6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'avg batch':>10}")
+    for batch_size in args.batch_sizes:
+        result = asyncio.run(run_case(
+            detector, batch_size, args.max_wait_ms, args.concurrency, args.requests
+        ))
+        print(f"{result['max_batch_size']:>6} {result['throughput_rps']:>9.1f} "
+              f"{result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} {result['avg_batch']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+"""
+Benchmark: end-to-end load test of the emotion APIs
+
+Drives the HTTP endpoints in-process (no network, no external load
+generator) at each configured concurrency level and reports throughput,
+p50/p95/p99 latency and peak RSS:
+
+  predict-face   FER service  POST /predict-face   (one synthetic face per request)
+  predict-batch  FER service  POST /predict-batch  (--batch-files faces per request)
+  app-face       Flask app    POST /api/analyze/face  (base64 JSON)
+  app-face-raw   Flask app    POST /api/analyze/face  (raw image/jpeg body)
+  app-voice      Flask app    POST /api/analyze/voice (multipart WAV)
+
+Inputs are synthetic faces and voice clips generated from --seed, so runs are
+reproducible offline on CPU. Result reuse (the repeated-frame cache and the
+change-detection gate) is disabled unless --allow-reuse is given, so every
+request measures a real forward pass. FER_PRECISION and FER_BACKEND select
+the model configuration as for the service; int8-static is calibrated on the
+synthetic faces. The Flask targets are skipped when app.py's dependencies
+(database, patient_mode, ...) cannot be imported.
+
+Usage:
+    python benchmarks/bench_load.py --concurrency 1 8 32 --requests 200 --output load.json
+    python benchmarks/bench_load.py --targets predict-face --compare load.json
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import platform
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from common import AI_DIR, load_detector, percentile, synthetic_face, synthetic_voice_clip
+
+FER_TARGETS = ("predict-face", "predict-batch")
+APP_TARGETS = ("app-face", "app-face-raw", "app-voice")
+
+
+def reset_peak_rss():
+    """Reset the peak RSS high-water mark so each scenario is measured on its own (Linux only)"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KB on Linux, bytes on macOS, and never resets
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage / (1024 * 1024) if sys.platform == "darwin" else usage / 1024
+
+
+def summarize(target, concurrency, latencies, statuses, elapsed, rss_mb):
+    """Build one result entry from the per-request latencies (seconds) and status codes"""
+    status_counts = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": sum(1 for status in statuses if status != 200),
+        "status_counts": status_counts,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies_ms, 50), 2),
+            "p95": round(percentile(latencies_ms, 95), 2),
+            "p99": round(percentile(latencies_ms, 99), 2),
+            "mean": round(sum(latencies_ms) / len(latencies_ms), 2),
+            "max": round(max(latencies_ms), 2),
+        },
+        "peak_rss_mb": round(rss_mb, 1),
+    }
+
+
+def print_result(result):
+    latency = result["latency_ms"]
+    print(f"  {result['target']:<14} c={result['concurrency']:<4}"
+          f" {result['throughput_rps']:>8.1f} req/s"
+          f"   p50 {latency['p50']:>8.1f} ms   p95 {latency['p95']:>8.1f} ms"
+          f"   p99 {latency['p99']:>8.1f} ms"
+          f"   errors {result['errors']:<4} peak RSS {result['peak_rss_mb']:.0f} MB")
+
+
+# ---------------------------------------------------------------------------
+# FER service (FastAPI)
+# ---------------------------------------------------------------------------
+
+async def drive_async(send, concurrency, requests):
+    """Run `requests` calls of send(i) from `concurrency` concurrent tasks"""
+    latencies = []
+    statuses = []
+    indices = iter(range(requests))
+
+    async def worker():
+        for i in indices:
+            start = time.perf_counter()
+            status = await send(i)
+            latencies.append(time.perf_counter() - start)
+            statuses.append(status)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+async def run_fer_targets(args, targets, faces):
+    import httpx
+
+    if not args.allow_reuse:
+        # Must be set before main is imported; it reads its config at import time
+        os.environ.setdefault("FER_CACHE_SIZE", "0")
+        os.environ.setdefault("FER_GATE_THRESHOLD", "0")
+
+    import main
+
+    # int8-static needs calibration batches; use the request faces, preprocessed
+    # exactly as the service preprocesses them
+    calibration_data = None
+    if main.PRECISION == "int8-static":
+        import torch
+
+        calibration_data = [torch.stack([main._preprocess(face)[0] for face in faces])]
+
+    # Loaded up front so the background loader only warms it up
+    main.detector = load_detector(args.model_path, precision=main.PRECISION, backend=main.BACKEND,
+                                  calibration_data=calibration_data)
+
+    results = []
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                     timeout=None) as client:
+            while (await client.get("/health/ready")).status_code != 200:
+                if main.model_status["state"] == "failed":
+                    raise RuntimeError(f"Model failed to load: {main.model_status['error']}")
+                await asyncio.sleep(0.1)
+
+            async def predict_face(i):
+                files = {"file": ("face.jpg", faces[i % len(faces)], "image/jpeg")}
+                response = await client.post("/predict-face", files=files)
+                return response.status_code
+
+            async def predict_batch(i):
+                files = [
+                    ("files", (f"face{j}.jpg", faces[(i + j) % len(faces)], "image/jpeg"))
+                    for j in range(args.batch_files)
+                ]
+                response = await client.post("/predict-batch", files=files)
+                return response.status_code
+
+            senders = {"predict-face": predict_face, "predict-batch": predict_batch}
+            for target in targets:
+                send = senders[target]
+                for concurrency in args.concurrency:
+                    await drive_async(send, concurrency, args.warmup)
+                    reset_peak_rss()
+                    latencies, statuses, elapsed = await drive_async(
+                        send, concurrency, args.requests
+                    )
+                    result = summarize(target, concurrency, latencies, statuses,
+                                       elapsed, peak_rss_mb())
+                    print_result(result)
+                    results.append(result)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Flask app
+# ---------------------------------------------------------------------------
+
+def import_flask_app():
+    """
+    Import backend/app.py, or return None with the reason if it cannot be set up
+
+    Besides missing dependencies, module-level setup may fail on an absent or
+    unexpected database (sqlite3.Error, ValueError, e.g. from MoodRollup).
+    """
+    backend_dir = str(AI_DIR.parent)
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+    # app.py logs to app.log in the working directory; keep it out of the tree
+    os.chdir(tempfile.mkdtemp(prefix="bench_load_"))
+    try:
+        import app
+    except (ImportError, ValueError, sqlite3.Error) as e:
+        return None, f"{type(e).__name__}: {e}"
+    return app.app, None
+
+
+def drive_threads(app, send, concurrency, requests):
+    """Run `requests` calls of send(client, i) from `concurrency` threads"""
+    latencies = []
+    statuses = []
+    indices = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                i = next(indices, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            status = send(client, i)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses.append(status)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return latencies, statuses, time.perf_counter() - start
+
+
+def run_app_targets(args, targets, faces, clips):
+    app, error = import_flask_app()
+    if app is None:
+        print(f"  Skipping {', '.join(targets)}: could not import app.py ({error})")
+        return []
+
+    images = [base64.b64encode(face).decode("ascii") for face in faces]
+
+    def analyze_face(client, i):
+        response = client.post("/api/analyze/face", json={"image": images[i % len(images)]})
+        return response.status_code
+
+    def analyze_face_raw(client, i):
+        response = client.post("/api/analyze/face", data=faces[i % len(faces)],
+                               content_type="image/jpeg")
+        return response.status_code
+
+    def analyze_voice(client, i):
+        data = {"audio": (io.BytesIO(clips[i % len(clips)]), "clip.wav")}
+        response = client.post("/api/analyze/voice", data=data,
+                               content_type="multipart/form-data")
+        return response.status_code
+
+    senders = {"app-face": analyze_face, "app-face-raw": analyze_face_raw,
+               "app-voice": analyze_voice}
+    results = []
+    for target in targets:
+        send = senders[target]
+        for concurrency in args.concurrency:
+            drive_threads(app, send, concurrency, args.warmup)
+            reset_peak_rss()
+            latencies, statuses, elapsed = drive_threads(app, send, concurrency, args.requests)
+            result = summarize(target, concurrency, latencies, statuses, elapsed, peak_rss_mb())
+            print_result(result)
+            results.append(result)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def run_metadata(args):
+    """Describe the run so results from different machines and commits can be compared"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=AI_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    import torch
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "compare")
+        },
+    }
+
+
+def compare(results, baseline_path):
+    """Print throughput and p99 changes against a previous --output file"""
+    with open(baseline_path) as f:
+        baseline = {
+            (entry["target"], entry["concurrency"]): entry for entry in json.load(f)["results"]
+        }
+
+    print(f"\nCompared with {baseline_path}")
+    for result in results:
+        previous = baseline.get((result["target"], result["concurrency"]))
+        if previous is None:
+            continue
+        throughput = result["throughput_rps"] / previous["throughput_rps"] - 1
+        p99 = result["latency_ms"]["p99"] / previous["latency_ms"]["p99"] - 1
+        print(f"  {result['target']:<14} c={result['concurrency']:<4}"
+              f" throughput {throughput:+7.1%}   p99 {p99:+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the emotion APIs")
+    parser.add_argument("--targets", nargs="+", choices=FER_TARGETS + APP_TARGETS,
+                        default=list(FER_TARGETS + APP_TARGETS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200,
+                        help="Timed requests per target and concurrency level")
+    parser.add_argument("--warmup", type=int, default=10,
+                        help="Untimed requests before each measurement")
+    parser.add_argument("--batch-files", type=int, default=8,
+                        help="Images per /predict-batch request")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[640, 480],
+                        metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--voice-seconds", type=float, default=3.0)
+    parser.add_argument("--distinct-inputs", type=int, default=32,
+                        help="Number of different synthetic faces/clips to cycle through")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--allow-reuse", action="store_true",
+                        help="Keep the result cache and frame gate enabled")
+    parser.add_argument("--model-path", default=None, help="Path to the FER model file")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Previous --output file to compare against")
+    args = parser.parse_args()
+
+    # Relative to where the benchmark was started, before the Flask import changes directory
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+
+    faces = [
+        synthetic_face(args.seed + i, tuple(args.image_size))
+        for i in range(args.distinct_inputs)
+    ]
+    clips = [
+        synthetic_voice_clip(args.seed + i, args.voice_seconds)
+        for i in range(args.distinct_inputs)
+    ]
+
+    if not reset_peak_rss():
+        print("Peak RSS cannot be reset on this platform; it is cumulative across scenarios")
+    print(f"Requests per scenario: {args.requests} (+{args.warmup} warm-up)")
+
+    results = []
+    fer_targets = [target for target in args.targets if target in FER_TARGETS]
+    app_targets = [target for target in args.targets if target in APP_TARGETS]
+    if fer_targets:
+        print("\nFER service")
+        results += asyncio.run(run_fer_targets(args, fer_targets, faces))
+    if app_targets:
+        print("\nFlask app")
+        results += run_app_targets(args, app_targets, faces, clips)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"meta": run_metadata(args), "results": results}, f, indent=2)
+        print(f"\nWrote {output}")
+    if baseline:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
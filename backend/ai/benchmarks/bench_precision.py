@@ -0,0 +1,113 @@
+"""
+Benchmark: latency, memory and top-1 agreement of the FER precision modes
+
+Loads the detector once per precision mode, runs the same images through
+each, and compares against fp32.
+
+Usage:
+    python benchmarks/bench_precision.py --images path/to/faces --calibration path/to/faces
+    python benchmarks/bench_precision.py   # synthetic images when no folder is given
+"""
+
+import argparse
+import io
+import time
+
+from common import load_detector, percentile
+
+import torch
+from face_emotion_model import PRECISION_MODES
+from preprocessing import load_calibration_batches
+
+
+def rss_mb():
+    """Current resident set size of this process in MB (Linux), or 0.0"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return 0.0
+    import resource
+    return pages * resource.getpagesize() / (1024 * 1024)
+
+
+def model_size_mb(model):
+    """Serialized size of the model's state dict in MB"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def synthetic_batches(count, batch_size, seed=0):
+    """Deterministic random image batches for machines without sample images"""
+    generator = torch.Generator().manual_seed(seed)
+    images = torch.randn(count, 3, 224, 224, generator=generator)
+    return [images[i:i + batch_size] for i in range(0, count, batch_size)]
+
+
+def measure(detector, batches, repeats):
+    """Per-image latency (ms) at batch size 1 and the predictions for every image"""
+    images = torch.cat(batches)
+    latencies = []
+    for _ in range(repeats):
+        for image in images:
+            start = time.perf_counter()
+            detector.predict_batch(image.unsqueeze(0))
+            latencies.append((time.perf_counter() - start) * 1000.0)
+
+    predicted = torch.cat([torch.from_numpy(detector.predict_batch(batch)[0]) for batch in batches])
+    return latencies, predicted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FER precision mode benchmark")
+    parser.add_argument("--model-path", default=None, help="Path to the FER model file")
+    parser.add_argument("--images", default=None, help="Folder of evaluation images")
+    parser.add_argument("--calibration", default=None,
+                        help="Folder of calibration images for int8-static (default: --images)")
+    parser.add_argument("--limit", type=int, default=64, help="Maximum images to evaluate")
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--modes", nargs="+", default=list(PRECISION_MODES), choices=PRECISION_MODES)
+    args = parser.parse_args()
+
+    if args.images:
+        batches = load_calibration_batches(args.images, limit=args.limit)
+    else:
+        batches = synthetic_batches(min(args.limit, 32), 8)
+    calibration = (
+        load_calibration_batches(args.calibration, limit=args.limit)
+        if args.calibration else batches
+    )
+
+    reference = None
+    rows = []
+    for mode in ["fp32"] + [m for m in args.modes if m != "fp32"]:
+        before = rss_mb()
+        detector = load_detector(args.model_path, precision=mode, calibration_data=calibration)
+        rss_delta = rss_mb() - before
+
+        # Warm-up
+        detector.predict_batch(batches[0][:1])
+        latencies, predicted = measure(detector, batches, args.repeats)
+
+        if reference is None:
+            reference = predicted
+        agreement = (predicted == reference).float().mean().item() * 100.0
+
+        rows.append((
+            detector.precision if detector.precision == mode else f"{mode}->{detector.precision}",
+            percentile(latencies, 50),
+            percentile(latencies, 99),
+            model_size_mb(detector.model),
+            rss_delta,
+            agreement,
+        ))
+        del detector
+
+    print(f"{'mode':<16} {'p50 ms':>8} {'p99 ms':>8} {'size MB':>8} {'RSS +MB':>8} {'top-1 agree %':>14}")
+    for mode, p50, p99, size, rss, agree in rows:
+        print(f"{mode:<16} {p50:>8.1f} {p99:>8.1f} {size:>8.1f} {rss:>8.1f} {agree:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
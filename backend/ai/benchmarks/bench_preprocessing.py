@@ -0,0 +1,97 @@
+"""
+Benchmark: decode + preprocess time per megapixel, reference vs optimized pipeline
+
+Compares the original PIL open/convert + torchvision Resize/ToTensor/Normalize
+path with preprocessing.decode_image (JPEG draft decoding, fused
+normalization) and decode_batch (in-place batch assembly) on synthetic
+webcam-sized JPEG frames.
+
+Usage:
+    python benchmarks/bench_preprocessing.py --repeats 50
+"""
+
+import argparse
+import io
+import time
+
+import common  # noqa: F401  (puts backend/ai on sys.path)
+
+import numpy as np
+import torch
+from PIL import Image
+from preprocessing import decode_batch, decode_image, reference_transform
+
+RESOLUTIONS = {
+    "480p": (640, 480),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+
+
+def synthetic_frame(width, height, seed=0):
+    """A smooth gradient with mild noise, encoded as a webcam-quality JPEG"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    pixels = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    pixels += rng.normal(0, 8, pixels.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+transform = reference_transform()
+
+
+def reference_decode(image_bytes):
+    """The original per-upload pipeline"""
+    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+    return transform(image)
+
+
+def time_per_image(fn, image_bytes, repeats):
+    """Average milliseconds per call"""
+    fn(image_bytes)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(image_bytes)
+    return (time.perf_counter() - start) * 1000.0 / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FER preprocessing benchmark")
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    print(f"{'frame':<7} {'MP':>5} {'ref ms':>8} {'fast ms':>8} {'ref ms/MP':>10} "
+          f"{'fast ms/MP':>11} {'speedup':>8} {'max |diff|':>11}")
+    for name, (width, height) in RESOLUTIONS.items():
+        frame = synthetic_frame(width, height)
+        megapixels = width * height / 1e6
+
+        ref_ms = time_per_image(reference_decode, frame, args.repeats)
+        fast_ms = time_per_image(decode_image, frame, args.repeats)
+        diff = (reference_decode(frame) - decode_image(frame)).abs().max().item()
+
+        print(f"{name:<7} {megapixels:>5.2f} {ref_ms:>8.2f} {fast_ms:>8.2f} "
+              f"{ref_ms / megapixels:>10.2f} {fast_ms / megapixels:>11.2f} "
+              f"{ref_ms / fast_ms:>7.1f}x {diff:>11.3f}")
+
+    # Batch assembly: per-image tensors + torch.stack vs decoding into one buffer
+    frames = [synthetic_frame(1280, 720, seed=i) for i in range(args.batch_size)]
+
+    start = time.perf_counter()
+    torch.stack([reference_decode(frame) for frame in frames])
+    stacked_ms = (time.perf_counter() - start) * 1000.0
+
+    start = time.perf_counter()
+    decode_batch(frames)
+    batched_ms = (time.perf_counter() - start) * 1000.0
+
+    print(f"\nBatch of {args.batch_size} x 720p: reference + stack {stacked_ms:.1f} ms, "
+          f"decode_batch {batched_ms:.1f} ms ({stacked_ms / batched_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
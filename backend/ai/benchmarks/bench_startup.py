@@ -0,0 +1,128 @@
+"""
+Benchmark: cold-start time of the FER service
+
+Every measurement runs in a fresh interpreter, so nothing is already
+imported or loaded in memory (the OS page cache is not dropped):
+
+  import main        time before uvicorn can accept connections
+  detector load      FaceEmotionDetector from the original checkpoint vs
+                     the memory-mapped converted weights
+  first inference    the warm-up forward pass vs a steady-state forward pass
+
+Usage:
+    python benchmarks/bench_startup.py --repeats 5
+    python benchmarks/bench_startup.py --model-path models/FER_static_ResNet50_AffectNet.pt
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from common import AI_DIR, benchmark_model_path, percentile
+
+
+def child_import():
+    """Time importing the FastAPI app module"""
+    start = time.perf_counter()
+    import main  # noqa: F401
+    return {"import_main_s": time.perf_counter() - start}
+
+
+def child_load(model_path, weights_cache):
+    """Time loading the detector and its first and steady-state forward passes"""
+    start = time.perf_counter()
+    import torch
+    from face_emotion_model import FaceEmotionDetector
+    imported = time.perf_counter()
+
+    # The detector imports torchvision lazily; time it on its own
+    import torchvision  # noqa: F401
+    vision_imported = time.perf_counter()
+
+    detector = FaceEmotionDetector(model_path=model_path, weights_cache=weights_cache)
+    loaded = time.perf_counter()
+
+    image = torch.zeros(1, 3, 224, 224)
+    detector.predict_batch(image)
+    first = time.perf_counter()
+
+    steady = []
+    for _ in range(10):
+        begin = time.perf_counter()
+        detector.predict_batch(image)
+        steady.append(time.perf_counter() - begin)
+
+    return {
+        "import_s": imported - start,
+        "import_torchvision_s": vision_imported - imported,
+        "load_s": loaded - vision_imported,
+        "first_inference_s": first - loaded,
+        "steady_inference_s": percentile(steady, 50),
+    }
+
+
+def run_child(*args):
+    """Run one stage in a fresh interpreter and return its timings"""
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), *args],
+        cwd=AI_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    # The detector prints progress; the timings are the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(label, runs):
+    """Print the median of every timing across repeated runs"""
+    print(f"\n{label}")
+    for key in runs[0]:
+        values = [run[key] for run in runs]
+        print(f"  {key:<22} {percentile(values, 50) * 1000:>9.1f} ms"
+              f"   (min {min(values) * 1000:.1f}, max {max(values) * 1000:.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FER service cold-start benchmark")
+    parser.add_argument("--model-path", default=None, help="Path to the FER model file")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--stage", choices=["import", "load"], help=argparse.SUPPRESS)
+    parser.add_argument("--no-weights-cache", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage == "import":
+        print(json.dumps(child_import()))
+        return
+    if args.stage == "load":
+        print(json.dumps(child_load(args.model_path, not args.no_weights_cache)))
+        return
+
+    model_path = os.path.abspath(benchmark_model_path(args.model_path))
+
+    print(f"Model: {model_path}")
+    print(f"Repeats: {args.repeats} (medians, each run in a fresh interpreter)")
+
+    summarize("import main", [run_child("--stage", "import") for _ in range(args.repeats)])
+
+    checkpoint = [
+        run_child("--stage", "load", "--model-path", model_path, "--no-weights-cache")
+        for _ in range(args.repeats)
+    ]
+    summarize("detector from original checkpoint", checkpoint)
+
+    # The first cached load converts the checkpoint; only later loads are timed
+    run_child("--stage", "load", "--model-path", model_path)
+    converted = [
+        run_child("--stage", "load", "--model-path", model_path)
+        for _ in range(args.repeats)
+    ]
+    summarize("detector from memory-mapped converted weights", converted)
+
+    before = percentile([run["load_s"] for run in checkpoint], 50)
+    after = percentile([run["load_s"] for run in converted], 50)
+    print(f"\nWeight loading speedup: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Benchmark: voice feature extraction time per minute of audio
+
+Compares the per-feature librosa calls (voice_features.reference_features,
+one STFT per feature plus a separate harmonic/percussive separation) with
+FeatureEngine's full and lite profiles on synthetic voice clips, and reports
+how far each profile's features are from the reference.
+
+With --online, instead checks voice_features.OnlineFeatureExtractor fed in
+chunks against FeatureEngine("lite") on the whole clip, for a steady clip,
+one alternating with silence and one fading in, and exits with status 1 if
+any feature deviates more than ONLINE_TOLERANCE allows.
+
+Usage:
+    python benchmarks/bench_voice_features.py --durations 5 30 60 --repeats 3
+    python benchmarks/bench_voice_features.py --online --durations 1 3 10
+"""
+
+import argparse
+import io
+import sys
+import time
+
+from common import percentile, synthetic_voice_clip
+
+import librosa
+import numpy as np
+from voice_features import PROFILES, FeatureEngine, OnlineFeatureExtractor, reference_features
+
+SAMPLE_RATE = 22050
+# Samples per streamed chunk (about 56 ms, not a multiple of the hop length)
+ONLINE_CHUNK = 1234
+
+# Largest max_deviation allowed per clip shape and feature (default for
+# features not listed). Mel, chroma and tonnetz match to float precision; the
+# online MFCC and contrast dB floors follow the loudest frame so far rather
+# than the loudest of the clip, so they drift until the clip's peak level is
+# reached, most on a clip that keeps getting louder
+_FLOORED = {"mfcc_mean": 5e-3, "mfcc_std": 3e-2, "contrast_mean": 1e-2}
+ONLINE_TOLERANCE = {
+    "steady": {"default": 1e-5, **_FLOORED},
+    "gaps": {"default": 1e-5, **_FLOORED},
+    "fade-in": {"default": 1e-5, "mfcc_mean": 0.15, "mfcc_std": 0.5, "contrast_mean": 0.15},
+}
+
+
+def time_extractor(extract, y, repeats):
+    """Median seconds per call, after one untimed call"""
+    extract(y)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        extract(y)
+        timings.append(time.perf_counter() - start)
+    return percentile(timings, 50)
+
+
+def max_deviation(features, reference):
+    """Largest absolute difference per feature, relative to the feature's range"""
+    return {
+        key: float(np.max(np.abs(features[key] - reference[key]))
+                   / (np.max(np.abs(reference[key])) or 1.0))
+        for key in reference
+    }
+
+
+def shaped_clip(y, shape):
+    """Apply one of ONLINE_TOLERANCE's clip shapes to a signal"""
+    t = np.arange(len(y)) / SAMPLE_RATE
+    if shape == "gaps":
+        # One second of speech, one of digital silence
+        return y * (np.sin(np.pi * t) > 0)
+    if shape == "fade-in":
+        # 40 dB quieter at the start than at the end
+        return y * np.linspace(0.01, 1.0, len(y)) ** 2
+    return y
+
+
+def check_online(durations):
+    """Compare streamed and whole-clip lite features; returns False if a tolerance is exceeded"""
+    engine = FeatureEngine("lite")
+    within = True
+    print(f"Online vs lite max deviation (relative to each feature's largest value), "
+          f"{ONLINE_CHUNK}-sample chunks")
+    for seconds in durations:
+        clip = synthetic_voice_clip(seed=0, seconds=seconds)
+        y, _ = librosa.load(io.BytesIO(clip), sr=SAMPLE_RATE)
+        for shape, tolerance in ONLINE_TOLERANCE.items():
+            shaped = shaped_clip(y, shape).astype(np.float32)
+            extractor = OnlineFeatureExtractor(SAMPLE_RATE)
+            for start in range(0, len(shaped), ONLINE_CHUNK):
+                extractor.update(shaped[start:start + ONLINE_CHUNK])
+            deviation = max_deviation(extractor.features(), engine.compute(shaped, SAMPLE_RATE))
+
+            failed = [key for key, value in deviation.items()
+                      if value > tolerance.get(key, tolerance["default"])]
+            within = within and not failed
+            print(f"  {seconds:>4.0f}s {shape:<8} "
+                  + "  ".join(f"{key} {value:.2e}" for key, value in deviation.items())
+                  + (f"  EXCEEDED: {', '.join(failed)}" if failed else ""))
+    return within
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Voice feature extraction benchmark")
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 30, 60],
+                        help="Clip lengths in seconds")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--online", action="store_true",
+                        help="Check the streaming extractor against the lite profile instead")
+    args = parser.parse_args()
+
+    if args.online:
+        sys.exit(0 if check_online(args.durations) else 1)
+
+    extractors = {"reference": lambda y: reference_features(y, SAMPLE_RATE)}
+    for profile in PROFILES:
+        engine = FeatureEngine(profile)
+        extractors[profile] = lambda y, engine=engine: engine.compute(y, SAMPLE_RATE)
+
+    print(f"{'clip':>6}  {'extractor':<10} {'s/clip':>8} {'s/min audio':>12} {'speedup':>8}")
+    for seconds in args.durations:
+        clip = synthetic_voice_clip(seed=0, seconds=seconds)
+        y, _ = librosa.load(io.BytesIO(clip), sr=SAMPLE_RATE)
+
+        baseline = None
+        for name, extract in extractors.items():
+            elapsed = time_extractor(extract, y, args.repeats)
+            baseline = baseline or elapsed
+            print(f"{seconds:>5.0f}s  {name:<10} {elapsed:>8.3f} {elapsed * 60 / seconds:>12.3f}"
+                  f" {baseline / elapsed:>7.2f}x")
+
+    # Accuracy on the last clip
+    reference = reference_features(y, SAMPLE_RATE)
+    print("\nMax deviation from reference (relative to each feature's largest value)")
+    for profile in PROFILES:
+        deviation = max_deviation(FeatureEngine(profile).compute(y, SAMPLE_RATE), reference)
+        print(f"  {profile:<5} " + "  ".join(f"{key} {value:.2e}" for key, value in deviation.items()))
+
+
+if __name__ == "__main__":
+    main()
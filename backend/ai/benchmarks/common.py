@@ -0,0 +1,191 @@
+"""
+Shared helpers for the FER service benchmarks
+"""
+
+import io
+import os
+import sys
+import tempfile
+import wave
+from pathlib import Path
+
+# Benchmarks live in backend/ai/benchmarks; make the service modules importable
+AI_DIR = Path(__file__).resolve().parent.parent
+if str(AI_DIR) not in sys.path:
+    sys.path.insert(0, str(AI_DIR))
+
+DEFAULT_MODEL_PATH = str(AI_DIR / "models" / "FER_static_ResNet50_AffectNet.pt")
+
+
+def benchmark_model_path(model_path=None):
+    """
+    Get a loadable FER model file for benchmarking
+
+    If the real weights are not available (for example when only the git-lfs
+    pointer is checked out), a randomly initialised ResNet50 with the same
+    shape is saved to a temporary file and used instead. Timings are
+    unaffected by the weight values.
+
+    Args:
+        model_path: Path to the FER model file (defaults to models/ in backend/ai)
+
+    Returns:
+        str: Path to the real weights, or to the random fallback weights
+    """
+    import torch
+
+    model_path = model_path or DEFAULT_MODEL_PATH
+    try:
+        torch.load(model_path, map_location="cpu", weights_only=False)
+        return model_path
+    except Exception as e:
+        print(f"Could not load {model_path} ({e}); using random ResNet50 weights")
+
+    # Seeded so repeated loads (e.g. one per precision mode) get identical weights
+    fallback_path = os.path.join(tempfile.gettempdir(), "fer_benchmark_random_resnet50.pt")
+    if not os.path.exists(fallback_path):
+        from torchvision import models
+
+        torch.manual_seed(0)
+        model = models.resnet50(weights=None)
+        model.fc = torch.nn.Linear(model.fc.in_features, 7)
+        torch.save(model.state_dict(), fallback_path)
+    return fallback_path
+
+
+def load_detector(model_path=None, **kwargs):
+    """
+    Load a FaceEmotionDetector for benchmarking (see benchmark_model_path)
+
+    Args:
+        model_path: Path to the FER model file (defaults to models/ in backend/ai)
+        **kwargs: Extra keyword arguments for FaceEmotionDetector
+
+    Returns:
+        FaceEmotionDetector: Loaded detector
+    """
+    from face_emotion_model import FaceEmotionDetector
+
+    return FaceEmotionDetector(model_path=benchmark_model_path(model_path), **kwargs)
+
+
+def percentile(values, pct):
+    """
+    Get a percentile of a list of numbers using linear interpolation
+
+    Args:
+        values: Sequence of numbers
+        pct: Percentile in the range 0-100
+
+    Returns:
+        float: The requested percentile (0.0 for an empty sequence)
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def synthetic_face(seed=0, size=(640, 480), expression=None):
+    """
+    Draw a deterministic cartoon face and encode it as a JPEG
+
+    Skin tone, face position, eyes, brows and mouth vary with the seed so
+    consecutive requests are not identical frames. No network access or
+    datasets are needed.
+
+    Args:
+        seed: Random seed
+        size: (width, height) of the image
+        expression: Mouth to draw, "smile", "frown" or "open" (default: chosen
+                    by the seed); the rest of the face is the same either way
+
+    Returns:
+        bytes: JPEG data
+    """
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(seed)
+    width, height = size
+    background = tuple(int(v) for v in rng.integers(40, 200, 3))
+    image = Image.new("RGB", size, background)
+    draw = ImageDraw.Draw(image)
+
+    face_w = int(width * rng.uniform(0.3, 0.45))
+    face_h = int(face_w * 1.3)
+    cx = int(width / 2 + rng.uniform(-0.1, 0.1) * width)
+    cy = int(height / 2 + rng.uniform(-0.05, 0.05) * height)
+    skin = tuple(int(v) for v in rng.integers([150, 100, 70], [255, 200, 170]))
+    draw.ellipse([cx - face_w // 2, cy - face_h // 2, cx + face_w // 2, cy + face_h // 2], fill=skin)
+
+    eye_y = cy - face_h // 8
+    eye_r = max(3, face_w // 14)
+    brow_tilt = int(rng.uniform(-1, 1) * eye_r)
+    for side in (-1, 1):
+        ex = cx + side * face_w // 5
+        draw.ellipse([ex - eye_r, eye_y - eye_r, ex + eye_r, eye_y + eye_r], fill=(255, 255, 255))
+        draw.ellipse([ex - eye_r // 2, eye_y - eye_r // 2, ex + eye_r // 2, eye_y + eye_r // 2], fill=(30, 20, 10))
+        draw.line([ex - eye_r * 2, eye_y - eye_r * 2 - side * brow_tilt,
+                   ex + eye_r * 2, eye_y - eye_r * 2 + side * brow_tilt], fill=(60, 40, 20), width=3)
+
+    # Smile, frown or open mouth
+    mouth_w = face_w // 3
+    mouth_y = cy + face_h // 4
+    box = [cx - mouth_w // 2, mouth_y - mouth_w // 4, cx + mouth_w // 2, mouth_y + mouth_w // 4]
+    # Always drawn from the generator, so the noise below does not depend on the choice
+    drawn = ("smile", "frown", "open")[int(rng.integers(0, 3))]
+    expression = expression or drawn
+    if expression == "smile":
+        draw.arc(box, 20, 160, fill=(120, 30, 30), width=4)
+    elif expression == "frown":
+        draw.arc(box, 200, 340, fill=(120, 30, 30), width=4)
+    else:
+        draw.ellipse(box, fill=(90, 20, 20))
+
+    pixels = np.asarray(image, dtype=np.float32)
+    pixels += rng.normal(0, 4, pixels.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def synthetic_voice_clip(seed=0, seconds=3.0, sample_rate=16000):
+    """
+    Synthesize a deterministic voice-like clip and encode it as a 16-bit mono WAV
+
+    A harmonic tone with a wandering pitch, syllable-rate amplitude
+    modulation and background noise, so pitch, energy and spectral
+    features all have something to measure.
+
+    Args:
+        seed: Random seed
+        seconds: Clip length
+        sample_rate: Samples per second
+
+    Returns:
+        bytes: WAV data
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+
+    base_pitch = rng.uniform(100, 250)
+    pitch = base_pitch * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(0.2, 1.0) * t))
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    syllables = 0.5 * (1 + np.sin(2 * np.pi * rng.uniform(2, 5) * t))
+    signal = voice * syllables * rng.uniform(0.2, 0.6) + rng.normal(0, 0.02, t.shape)
+
+    samples = (np.clip(signal / np.abs(signal).max(), -1, 1) * 32767 * 0.8).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    return buffer.getvalue()
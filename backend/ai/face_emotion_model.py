@@ -5,9 +5,27 @@ Uses FER_static_ResNet50_AffectNet.pt pre-trained model for emotion recognition
 
 import torch
 import torch.nn.functional as F
-from torchvision import models
+import numpy as np
+import contextlib
+import copy
 import os
+import sys
+import time
 from pathlib import Path
+from inference_backends import (
+    artifact_path, create_backend, remove_stale_artifacts, weights_fingerprint
+)
+import psychiatric_scoring
+
+# Supported inference precision modes
+# fp32:         full precision eager model (default)
+# int8-dynamic: dynamically quantized Linear layers (weights int8, activations quantized on the fly)
+# int8-static:  post-training static quantization of the whole network, calibrated on sample images
+# bf16:         bfloat16 autocast, used only where the hardware supports it natively
+PRECISION_MODES = ("fp32", "int8-dynamic", "int8-static", "bf16")
+
+# Suffix of the converted weights cached next to the checkpoint
+CONVERTED_SUFFIX = ".mmap.pt"
 
 class FaceEmotionDetector:
     """
@@ -15,14 +33,28 @@ class FaceEmotionDetector:
     Detects 7 basic emotions and derived psychiatric indicators
     """
     
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, precision="fp32", calibration_data=None, backend="eager",
+                 weights_cache=True):
         """
         Initialize the FaceEmotionDetector with the pre-trained model
         
         Args:
             model_path: Path to the FER_static_ResNet50_AffectNet.pt model
                        If None, searches for it in default locations
+            precision: Inference precision mode, one of PRECISION_MODES
+            calibration_data: Iterable of preprocessed image batches
+                              (batch_size, 3, 224, 224), required for int8-static
+            backend: Inference backend, one of inference_backends.BACKENDS
+                     (compiled backends are only used with fp32 precision)
+            weights_cache: Convert the checkpoint once to a plain state dict
+                           and memory-map it on later loads
         """
+        if precision not in PRECISION_MODES:
+            raise ValueError(
+                f"Unknown precision mode '{precision}'. Expected one of {PRECISION_MODES}"
+            )
+        started = time.monotonic()
+        
         # List of 7 basic emotions
         self.emotions = [
             "angry", "disgust", "fear",
@@ -30,15 +62,39 @@ class FaceEmotionDetector:
         ]
         
         # Initialize device (GPU if available, else CPU)
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        # Quantized kernels and the ONNX Runtime backend are CPU-only
+        use_cuda = (torch.cuda.is_available() and not precision.startswith("int8")
+                    and backend != "onnx")
+        self.device = torch.device("cuda" if use_cuda else "cpu")
         print(f"Using device: {self.device}")
         
         # Find model path if not provided
         if model_path is None:
             model_path = self._find_model_path()
+        self.model_path = model_path
+        
+        # Version of the weights: short content hash of the model file
+        try:
+            self.version = weights_fingerprint(model_path)
+        except OSError:
+            self.version = None
         
         # Load the pre-trained ResNet50 model
-        self._load_model(model_path)
+        self._load_model(model_path, weights_cache)
+        
+        # Switch to the requested precision
+        self.precision = "fp32"
+        self._autocast_dtype = None
+        self._apply_precision(precision, calibration_data)
+        
+        # Compile the forward pass if requested
+        if backend != "eager" and self.precision != "fp32":
+            print(f"The {backend} backend only supports fp32; using eager for {self.precision}")
+            backend = "eager"
+        self.backend = create_backend(backend, self.model, self.device, model_path)
+        
+        self.loaded_at = time.time()
+        self.load_seconds = time.monotonic() - started
     
     def _find_model_path(self):
         """
@@ -74,9 +130,101 @@ class FaceEmotionDetector:
             f"Searched in: {possible_paths}"
         )
     
-    def _load_model(self, model_path):
+    def _load_model(self, model_path, weights_cache=True):
         """
         Load the pre-trained FER model
+        
+        The first load reads the original checkpoint and caches its weights
+        as a plain state dict next to it. Every load, the first included,
+        then memory-maps that file into a ResNet50 skeleton built on the meta
+        device, so startup skips unpickling, random initialization and
+        copying of the weights, and pre-forked workers share the weights'
+        page cache instead of each holding a private copy (also after a
+        hot-swap to a new checkpoint).
+        
+        Args:
+            model_path: Path to the model file
+            weights_cache: Use (and create) the converted weights cache
+        """
+        converted_path = None
+        if weights_cache:
+            try:
+                converted_path = artifact_path(model_path, CONVERTED_SUFFIX)
+            except OSError:
+                pass
+        
+        if converted_path is not None and converted_path.exists():
+            try:
+                self._load_converted(converted_path)
+                return
+            except Exception as e:
+                print(f"  Could not load converted weights ({e}); reading the checkpoint")
+                converted_path.unlink(missing_ok=True)
+        
+        self._load_checkpoint(model_path)
+        if converted_path is not None and self._save_converted(converted_path):
+            try:
+                self._load_converted(converted_path)
+            except Exception as e:
+                print(f"  Could not load converted weights ({e}); keeping the checkpoint")
+    
+    def _resnet50(self, device="cpu"):
+        """Build the ResNet50 architecture with a 7-class head on the given device"""
+        # torchvision takes longer to import than torch itself; only pay for it here
+        from torchvision import models
+        
+        with torch.device(device):
+            model = models.resnet50(weights=None)
+            model.fc = torch.nn.Linear(model.fc.in_features, len(self.emotions))
+        return model
+    
+    def _load_converted(self, path):
+        """Memory-map converted weights into a ResNet50 skeleton"""
+        state_dict = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+        
+        # Parameters start on the meta device and are replaced by the mapped tensors
+        self.model = self._resnet50("meta")
+        self.model.load_state_dict(state_dict, assign=True)
+        self.model = self.model.to(self.device)
+        self.model.eval()
+        print(f"✓ Model loaded successfully (memory-mapped {path.name})")
+    
+    def _save_converted(self, path):
+        """
+        Cache the loaded weights as a plain state dict for memory-mapped loading
+        
+        Returns:
+            bool: Whether the converted weights were written
+        """
+        state_dict = self.model.state_dict()
+        
+        # Only checkpoints with exactly the ResNet50 layout can be mapped back in
+        skeleton = self._resnet50("meta").state_dict()
+        if state_dict.keys() != skeleton.keys() or any(
+            state_dict[key].shape != skeleton[key].shape for key in skeleton
+        ):
+            print("  Checkpoint does not match the ResNet50 layout; not caching converted weights")
+            return False
+        
+        try:
+            # Write to a temporary name first so a crash never leaves a partial file
+            # (per process, as pre-forked workers may convert at the same time)
+            partial = path.with_name(f"{path.name}.{os.getpid()}.partial")
+            torch.save(
+                {key: value.detach().cpu().contiguous() for key, value in state_dict.items()},
+                partial
+            )
+            os.replace(partial, path)
+            remove_stale_artifacts(path, CONVERTED_SUFFIX)
+            print(f"  Cached converted weights as {path.name}")
+            return True
+        except OSError as e:
+            print(f"  Could not cache converted weights: {e}")
+            return False
+    
+    def _load_checkpoint(self, model_path):
+        """
+        Load the original checkpoint
         The model file contains the complete model architecture and weights
         trained on AffectNet dataset
         
@@ -101,9 +249,7 @@ class FaceEmotionDetector:
             checkpoint = torch.load(model_path, map_location=self.device)
             
             # Initialize ResNet50 architecture with 7 emotion classes
-            self.model = models.resnet50(weights=None)
-            num_emotions = len(self.emotions)
-            self.model.fc = torch.nn.Linear(self.model.fc.in_features, num_emotions)
+            self.model = self._resnet50()
             
             # Load with strict=False to allow architecture mismatches
             if isinstance(checkpoint, dict):
@@ -126,33 +272,139 @@ class FaceEmotionDetector:
             print(f"Error loading model: {e}")
             raise
     
-    def predict_tensor(self, img_tensor):
+    def _apply_precision(self, precision, calibration_data=None):
         """
-        Predict emotion from a PyTorch tensor
+        Convert the loaded fp32 model to the requested precision mode
         
         Args:
-            img_tensor: Input image as PyTorch tensor (batch_size, 3, 224, 224)
+            precision: One of PRECISION_MODES
+            calibration_data: Iterable of image batches used by int8-static
+        """
+        if precision == "fp32":
+            return
+        
+        if precision == "int8-dynamic":
+            # Only Linear layers have dynamic int8 kernels; convolutions stay fp32
+            self.model = torch.ao.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        
+        elif precision == "int8-static":
+            if calibration_data is None:
+                raise ValueError("int8-static precision requires calibration_data")
+            self.model = self._quantize_static(calibration_data)
+        
+        elif precision == "bf16":
+            if not self._bf16_supported():
+                print("bfloat16 is not supported natively on this device; staying in fp32")
+                return
+            self._autocast_dtype = torch.bfloat16
+        
+        self.precision = precision
+        print(f"✓ Inference precision set to {precision}")
+    
+    def _quantize_static(self, calibration_data):
+        """
+        Post-training static INT8 quantization with FX graph mode
+        
+        Args:
+            calibration_data: Iterable of image batches (batch_size, 3, 224, 224)
             
         Returns:
-            tuple: (emotion_label, confidence_score)
+            torch.nn.Module: Quantized model
+        """
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+        
+        batches = list(calibration_data)
+        if not batches:
+            raise ValueError("calibration_data is empty")
+        
+        backend = "x86" if "x86" in torch.backends.quantized.supported_engines else "qnnpack"
+        torch.backends.quantized.engine = backend
+        
+        prepared = prepare_fx(
+            copy.deepcopy(self.model).eval(),
+            get_default_qconfig_mapping(backend),
+            example_inputs=(batches[0],)
+        )
+        
+        # Record activation ranges on the sample images
+        with torch.no_grad():
+            for batch in batches:
+                prepared(batch)
+        
+        print(f"  Calibrated on {sum(len(batch) for batch in batches)} image(s)")
+        return convert_fx(prepared)
+    
+    def _bf16_supported(self):
+        """
+        Check whether bfloat16 runs natively on the inference device
+        
+        Returns:
+            bool: True if bf16 autocast is worth enabling
+        """
+        if self.device.type == "cuda":
+            return torch.cuda.is_bf16_supported()
+        
+        # Without AVX512-BF16/AMX, CPU bf16 is emulated and slower than fp32
+        if sys.platform.startswith("linux"):
+            try:
+                with open("/proc/cpuinfo") as f:
+                    flags = f.read()
+            except OSError:
+                return False
+            return "avx512_bf16" in flags or "amx_bf16" in flags
+        return False
+    
+    def _autocast(self):
+        """Get the autocast context for the active precision mode"""
+        if self._autocast_dtype is None:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=self._autocast_dtype)
+    
+    def predict_batch(self, img_tensor):
+        """
+        Predict emotions for a whole batch of images with a single forward pass
+        
+        Args:
+            img_tensor: Input images as PyTorch tensor (batch_size, 3, 224, 224)
+            
+        Returns:
+            tuple: (predicted, confidences, probabilities) as NumPy arrays where
+                   predicted is (batch_size,) class indices into self.emotions,
+                   confidences is (batch_size,) max probabilities and
+                   probabilities is the full (batch_size, 7) softmax matrix
         """
         with torch.no_grad():
             # Move tensor to device
             img_tensor = img_tensor.to(self.device)
             
-            # Forward pass through model
-            outputs = self.model(img_tensor)
-            
-            # Apply softmax to get probabilities
-            probs = F.softmax(outputs, dim=1)
+            # Forward pass through the active backend
+            with self._autocast():
+                outputs = self.backend(img_tensor)
             
-            # Get predicted emotion and confidence
-            confidence, predicted = torch.max(probs, 1)
+            # Apply softmax to get probabilities (always in fp32)
+            probs = F.softmax(outputs.float(), dim=1)
             
-            emotion = self.emotions[predicted.item()]
-            confidence = confidence.item()
+            # Get predicted emotion and confidence for every row at once
+            confidences, predicted = torch.max(probs, 1)
+        
+        # Single device-to-host transfer per output
+        return predicted.cpu().numpy(), confidences.cpu().numpy(), probs.cpu().numpy()
+    
+    def predict_tensor(self, img_tensor):
+        """
+        Predict emotion from a PyTorch tensor
+        
+        Args:
+            img_tensor: Input image as PyTorch tensor (batch_size, 3, 224, 224)
             
-            return emotion, confidence
+        Returns:
+            tuple: (emotion_label, confidence_score)
+        """
+        predicted, confidences, _ = self.predict_batch(img_tensor[:1])
+        return self.emotions[int(predicted[0])], float(confidences[0])
     
     def predict_with_probabilities(self, img_tensor):
         """
@@ -164,31 +416,45 @@ class FaceEmotionDetector:
         Returns:
             dict: Dictionary with emotion labels and their probabilities
         """
-        with torch.no_grad():
-            # Move tensor to device
-            img_tensor = img_tensor.to(self.device)
-            
-            # Forward pass through model
-            outputs = self.model(img_tensor)
-            
-            # Apply softmax to get probabilities
-            probs = F.softmax(outputs, dim=1)
-            
-            # Create dictionary of emotion probabilities
-            emotion_probs = {}
-            for i, emotion in enumerate(self.emotions):
-                emotion_probs[emotion] = probs[0, i].item()
+        _, _, probs = self.predict_batch(img_tensor[:1])
+        return self.probabilities_to_dicts(probs)[0]
+    
+    def predict_with_probabilities_batch(self, img_tensor):
+        """
+        Get emotion probabilities for every image in a batch with one forward pass
+        
+        Args:
+            img_tensor: Input images as PyTorch tensor (batch_size, 3, 224, 224)
             
-            # Calculate derived psychiatric indicators
-            emotion_probs['aggressive'] = (emotion_probs['angry'] * 0.7 + 
-                                          emotion_probs['disgust'] * 0.3)
-            emotion_probs['depressed'] = (emotion_probs['sad'] * 0.6 + 
-                                         emotion_probs['fear'] * 0.3 + 
-                                         emotion_probs['disgust'] * 0.1)
-            emotion_probs['anxious'] = (emotion_probs['fear'] * 0.8 + 
-                                       emotion_probs['surprise'] * 0.2)
+        Returns:
+            list: One probability dictionary per image, in batch order
+        """
+        _, _, probs = self.predict_batch(img_tensor)
+        return self.probabilities_to_dicts(probs)
+    
+    def probabilities_to_dicts(self, probs):
+        """
+        Convert a probability matrix into per-image dictionaries with
+        derived psychiatric indicators
+        
+        Args:
+            probs: (batch_size, 7) probability matrix from predict_batch (or any array-like)
             
-            return emotion_probs
+        Returns:
+            list: One dictionary of emotion probabilities per row
+        """
+        probs = np.asarray(probs)
+        
+        # Derived psychiatric indicators for all rows in one matrix product
+        indicators = psychiatric_scoring.score(probs, self.emotions)
+        
+        results = []
+        for row, indicator_row in zip(probs.tolist(), indicators.tolist()):
+            emotion_probs = dict(zip(self.emotions, row))
+            emotion_probs.update(zip(psychiatric_scoring.INDICATORS, indicator_row))
+            results.append(emotion_probs)
+        
+        return results
     
     def get_emotion_mapping(self):
         """
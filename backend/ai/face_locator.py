@@ -0,0 +1,200 @@
+"""
+Face localization stage for the FER service
+Detects the face with OpenCV's bundled Haar cascade and tracks its box across
+consecutive frames of a session, so full detection only runs occasionally
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+class _SessionTrack:
+    """Tracking state for one session"""
+
+    __slots__ = ("box", "template", "frames_since_detection", "last_seen")
+
+    def __init__(self, box, template):
+        self.box = box
+        self.template = template
+        self.frames_since_detection = 0
+        self.last_seen = time.monotonic()
+
+
+class FaceLocator:
+    """
+    Locate the patient's face in a frame
+
+    Detection runs on a small grayscale copy of the frame. For frames that
+    carry a session id, the last face box is tracked by template matching in
+    a window around its previous position; the full detector only runs every
+    detect_every frames or when the match score drops below track_threshold.
+    """
+
+    def __init__(self, detect_every=10, track_threshold=0.6, detection_width=320,
+                 min_face_fraction=0.1, max_sessions=1024, session_ttl=300.0,
+                 cascade_path=None):
+        """
+        Initialize the face locator
+
+        Args:
+            detect_every: Run full detection at least every N frames of a session
+            track_threshold: Minimum normalized correlation for a tracked box
+            detection_width: Width frames are downscaled to before detection
+            min_face_fraction: Smallest face searched for, as a fraction of
+                               the detection width
+            max_sessions: Maximum number of sessions tracked at once (LRU)
+            session_ttl: Seconds after which an idle session is forgotten
+            cascade_path: Haar cascade file (defaults to OpenCV's bundled
+                          frontal face cascade)
+        """
+        cascade_path = cascade_path or (
+            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+        )
+        self.cascade_path = cascade_path
+        if cv2.CascadeClassifier(cascade_path).empty():
+            raise FileNotFoundError(f"Could not load face cascade from {cascade_path}")
+        # CascadeClassifier is not thread-safe; each worker thread loads its own
+        self._local = threading.local()
+
+        self.detect_every = max(1, detect_every)
+        self.track_threshold = track_threshold
+        self.detection_width = detection_width
+        self.min_face = max(16, int(detection_width * min_face_fraction))
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+
+        self._sessions = OrderedDict()
+        # Preprocessing runs on several worker threads
+        self._lock = threading.Lock()
+
+        # Counters, exposed through stats()
+        self.detections = 0
+        self.tracked = 0
+        self.misses = 0
+
+    def locate(self, rgb, session_id=None):
+        """
+        Find the face box in an RGB frame
+
+        Args:
+            rgb: Frame as an (H, W, 3) uint8 array
+            session_id: Optional id of the stream the frame belongs to
+
+        Returns:
+            tuple: (x, y, w, h) in frame pixels, or None if no face was found
+        """
+        small, scale = self._downscale(rgb)
+
+        track = self._get_track(session_id) if session_id else None
+        box = None
+
+        if track is not None and track.frames_since_detection < self.detect_every:
+            box = self._track(small, track)
+            if box is not None:
+                self.tracked += 1
+
+        if box is None:
+            box, template = self._detect(small)
+            if box is None:
+                self.misses += 1
+                if session_id:
+                    self.reset(session_id)
+                return None
+            self.detections += 1
+            if session_id:
+                self._put_track(session_id, _SessionTrack(box, template))
+
+        x, y, w, h = box
+        return (int(x * scale), int(y * scale), int(w * scale), int(h * scale))
+
+    def reset(self, session_id):
+        """Forget the tracking state of a session"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        """Get detection and tracking statistics"""
+        with self._lock:
+            sessions = len(self._sessions)
+        return {
+            "detect_every": self.detect_every,
+            "active_sessions": sessions,
+            "detections": self.detections,
+            "tracked_frames": self.tracked,
+            "frames_without_face": self.misses,
+        }
+
+    def _downscale(self, rgb):
+        """Grayscale copy at detection_width, plus the factor back to frame pixels"""
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        height, width = gray.shape
+        if width <= self.detection_width:
+            return gray, 1.0
+        scale = width / self.detection_width
+        size = (self.detection_width, int(round(height / scale)))
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA), scale
+
+    def _detect(self, small):
+        """Run the cascade and keep the largest face"""
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            cascade = self._local.cascade = cv2.CascadeClassifier(self.cascade_path)
+        faces = cascade.detectMultiScale(
+            cv2.equalizeHist(small),
+            scaleFactor=1.2,
+            minNeighbors=5,
+            minSize=(self.min_face, self.min_face)
+        )
+        if len(faces) == 0:
+            return None, None
+
+        x, y, w, h = max(faces, key=lambda face: face[2] * face[3])
+        box = (int(x), int(y), int(w), int(h))
+        return box, small[y:y + h, x:x + w].copy()
+
+    def _track(self, small, track):
+        """Template-match the last face in a window around its previous box"""
+        x, y, w, h = track.box
+        height, width = small.shape
+
+        # Search a window twice the size of the face, centred on the old box
+        x0, y0 = max(0, x - w // 2), max(0, y - h // 2)
+        x1, y1 = min(width, x + w + w // 2), min(height, y + h + h // 2)
+        window = small[y0:y1, x0:x1]
+        if window.shape[0] < h or window.shape[1] < w:
+            return None
+
+        scores = cv2.matchTemplate(window, track.template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (dx, dy) = cv2.minMaxLoc(scores)
+        if not np.isfinite(best) or best < self.track_threshold:
+            return None
+
+        with self._lock:
+            track.box = (x0 + dx, y0 + dy, w, h)
+            track.frames_since_detection += 1
+            track.last_seen = time.monotonic()
+        return track.box
+
+    def _get_track(self, session_id):
+        """Look up a live session, dropping it if it has been idle too long"""
+        with self._lock:
+            track = self._sessions.get(session_id)
+            if track is None:
+                return None
+            if time.monotonic() - track.last_seen > self.session_ttl:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return track
+
+    def _put_track(self, session_id, track):
+        """Store a session, evicting the least recently used one when full"""
+        with self._lock:
+            self._sessions[session_id] = track
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
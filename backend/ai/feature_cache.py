@@ -0,0 +1,173 @@
+"""
+Persistent feature cache for the voice emotion model
+Stores extracted feature vectors on disk keyed by a hash of the audio bytes
+and the feature configuration, so re-analysing a recording skips decoding
+"""
+
+import hashlib
+import os
+import zipfile
+
+import numpy as np
+
+SUFFIX = ".npz"
+
+
+def content_key(audio_bytes, config_id):
+    """
+    Get the cache key of a clip
+
+    Args:
+        audio_bytes: Encoded file contents, or the raw bytes of a decoded signal
+        config_id: FeatureEngine.config_id of the extraction settings
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256(config_id.encode())
+    digest.update(b"\0")
+    digest.update(audio_bytes)
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """
+    Size-capped, least-recently-used directory of float32 feature files
+
+    Each entry is one uncompressed .npz file named after its key. A hit
+    refreshes the file's modification time, and eviction removes the oldest
+    files first, so the order survives restarts and is shared by every
+    process using the directory (e.g. conversation worker processes). Files
+    are written under a temporary name and renamed into place, so readers
+    never see a partial entry.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        """
+        Initialize the cache
+
+        Args:
+            directory: Directory holding the cache files (created if missing)
+            max_bytes: Total size above which the oldest entries are evicted
+        """
+        self.directory = str(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Running estimate; other processes may add files, so eviction rescans
+        self._bytes = sum(size for _, size, _ in self._scan())
+
+        # Counters, exposed through stats()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def _scan(self):
+        """List (path, size, mtime) of every cache file"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # Evicted by another process meanwhile
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key):
+        """
+        Get cached features
+
+        Args:
+            key: Key from content_key
+
+        Returns:
+            dict of float32 arrays, or None on a miss
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                features = {name: data[name] for name in data.files}
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError, zipfile.BadZipFile):
+            # Unreadable entry (e.g. the disk filled up while it was written); recompute it
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return features
+
+    def put(self, key, features):
+        """
+        Store features
+
+        Args:
+            key: Key from content_key
+            features: dict of feature name -> array
+        """
+        path = self._path(key)
+        partial = f"{path}.{os.getpid()}.partial"
+        try:
+            with open(partial, "wb") as f:
+                np.savez(f, **{
+                    name: np.asarray(value, dtype=np.float32) for name, value in features.items()
+                })
+            os.replace(partial, path)
+            self._bytes += os.path.getsize(path)
+        except OSError as e:
+            # A full or read-only cache must not fail the analysis
+            print(f"Could not cache voice features: {e}")
+            self._remove(partial)
+            return
+
+        if self._bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Remove the least recently used files until the cache is below 90% of its cap"""
+        entries = sorted(self._scan(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            if self._remove(path):
+                self.evictions += 1
+            total -= size
+        self._bytes = total
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def clear(self):
+        """Remove every cached entry"""
+        for path, _, _ in self._scan():
+            self._remove(path)
+        self._bytes = 0
+
+    def stats(self):
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "directory": self.directory,
+            "max_bytes": self.max_bytes,
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,202 @@
+"""
+Prometheus metrics for the FER service
+Per-stage latency histograms, request counters, forward pass times, batch sizes,
+queue depths and cache counters, exposed in the Prometheus text format
+"""
+
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    disable_created_metrics, generate_latest
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Skip the *_created series; they double the output without helping dashboards
+disable_created_metrics()
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow batches
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+REQUESTS = Counter(
+    "fer_requests_total", "HTTP requests by endpoint, method and status code",
+    ["endpoint", "method", "status"]
+)
+REQUEST_SECONDS = Histogram(
+    "fer_request_seconds", "End-to-end HTTP request latency",
+    ["endpoint"], buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "fer_stage_seconds",
+    "Latency of each prediction stage (read, preprocess, inference, serialize)",
+    ["endpoint", "stage"], buckets=LATENCY_BUCKETS
+)
+FORWARD_SECONDS = Histogram(
+    "fer_forward_seconds", "Model forward pass time per batch", buckets=LATENCY_BUCKETS
+)
+BATCH_SIZE = Histogram(
+    "fer_batch_size", "Images per model forward pass", buckets=BATCH_SIZE_BUCKETS
+)
+
+# Labelled children are resolved once; labels() takes a lock on every call
+_stage_children = {}
+# Collectors added by register_state_collector, re-registered in multiprocess mode
+_state_collectors = []
+
+
+def time_stage(endpoint, stage):
+    """
+    Time a block as one stage of a prediction request
+
+    Usage:
+        with time_stage("/predict-face", "preprocess"):
+            ...
+    """
+    child = _stage_children.get((endpoint, stage))
+    if child is None:
+        child = _stage_children[(endpoint, stage)] = STAGE_SECONDS.labels(endpoint, stage)
+    return child.time()
+
+
+def observe_forward(seconds, batch_size):
+    """Record one model forward pass"""
+    FORWARD_SECONDS.observe(seconds)
+    BATCH_SIZE.observe(batch_size)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware counting and timing HTTP requests
+
+    Requests are labelled with their route template (e.g. /predict-face),
+    so path parameters cannot blow up the number of series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the shared scope
+            route = scope.get("route")
+            endpoint = getattr(route, "path", "unmatched")
+            REQUESTS.labels(endpoint, scope["method"], str(status)).inc()
+            REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+
+
+class ServiceStateCollector:
+    """
+    Expose state the service already tracks, read only when /metrics is scraped
+
+    Queue depths and cache, gate and face tracking counters come from the
+    same stats() dictionaries /health reports, so they add no per-request cost.
+    """
+
+    def __init__(self, state_fn):
+        """
+        Args:
+            state_fn: Callable returning a /health style dict with the
+                      batching, executor, cache, gating, face_detection,
+                      active_streams and model_loaded entries
+        """
+        self.state_fn = state_fn
+
+    def describe(self):
+        # Without describe() the registry calls collect() at registration,
+        # before the service state exists
+        return []
+
+    def collect(self):
+        state = self.state_fn()
+
+        queue_depth = GaugeMetricFamily(
+            "fer_queue_depth", "Requests waiting per queue", labels=["queue"]
+        )
+        queue_depth.add_metric(["batching"], state["batching"]["queue_depth"])
+        queue_depth.add_metric(["executor"], state["executor"]["pending"])
+        yield queue_depth
+
+        yield CounterMetricFamily(
+            "fer_rejected_requests", "Requests rejected with 503 because the queue was full",
+            value=state["executor"]["rejected"]
+        )
+        yield GaugeMetricFamily(
+            "fer_active_streams", "Open WebSocket streams", value=state["active_streams"]
+        )
+        yield GaugeMetricFamily(
+            "fer_model_ready", "1 when the model is loaded and warmed up",
+            value=1 if state["model_loaded"] else 0
+        )
+
+        # Hit/miss counters; hit rate = rate(hits) / rate(hits + misses)
+        lookups = CounterMetricFamily(
+            "fer_cache_lookups", "Result reuse lookups by cache and outcome",
+            labels=["cache", "outcome"]
+        )
+        if state.get("cache"):
+            lookups.add_metric(["result_cache", "hit"], state["cache"]["hits"])
+            lookups.add_metric(["result_cache", "miss"], state["cache"]["misses"])
+        if state.get("gating"):
+            lookups.add_metric(["frame_gate", "hit"], state["gating"]["reused_frames"])
+            lookups.add_metric(["frame_gate", "miss"], state["gating"]["refreshed_frames"])
+        yield lookups
+
+        if state.get("face_detection"):
+            faces = state["face_detection"]
+            frames = CounterMetricFamily(
+                "fer_face_locator_frames", "Frames by face localization outcome",
+                labels=["outcome"]
+            )
+            frames.add_metric(["detected"], faces["detections"])
+            frames.add_metric(["tracked"], faces["tracked_frames"])
+            frames.add_metric(["no_face"], faces["frames_without_face"])
+            yield frames
+
+
+def register_state_collector(state_fn):
+    """Register a ServiceStateCollector for state_fn on the default registry"""
+    collector = ServiceStateCollector(state_fn)
+    REGISTRY.register(collector)
+    _state_collectors.append(collector)
+
+
+def render():
+    """
+    Render all metrics in the Prometheus text format
+
+    With PROMETHEUS_MULTIPROC_DIR set (pre-fork mode), counters and
+    histograms are aggregated over every worker; the service state
+    collector still reports the worker that answered the scrape.
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _state_collectors:
+            registry.register(collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,152 @@
+"""
+Change-detection gating for the FER service
+Reuses a session's last result while its face has not visibly changed, so
+slowly changing streams do not run the model on every frame
+"""
+
+import time
+from collections import OrderedDict
+
+import torch
+import torch.nn.functional as F
+
+from preprocessing import MEAN, STD
+
+# Side length of the grayscale thumbnail frames are compared at
+THUMBNAIL_SIZE = 16
+
+_MEAN = torch.tensor(MEAN).view(3, 1, 1)
+_STD = torch.tensor(STD).view(3, 1, 1)
+
+
+def motion_thumbnail(img_tensor):
+    """
+    Reduce a preprocessed image to a small grayscale thumbnail for motion scoring
+
+    The ImageNet normalization is undone so thumbnail values are intensities
+    in [0, 1] and the gate threshold does not depend on the color channel.
+
+    Args:
+        img_tensor: Preprocessed image tensor (3, 224, 224)
+
+    Returns:
+        torch.Tensor: (THUMBNAIL_SIZE, THUMBNAIL_SIZE) float tensor
+    """
+    pooled = F.adaptive_avg_pool2d(img_tensor.unsqueeze(0), THUMBNAIL_SIZE)[0]
+    return (pooled * _STD + _MEAN).mean(dim=0)
+
+
+def motion_score(thumbnail, reference):
+    """Mean absolute intensity difference between two thumbnails (0-1)"""
+    return float((thumbnail - reference).abs().mean())
+
+
+class _GateState:
+    """Last computed result of one session"""
+
+    __slots__ = ("reference", "result", "skipped", "last_seen")
+
+    def __init__(self, reference, result):
+        self.reference = reference
+        self.result = result
+        self.skipped = 0
+        self.last_seen = time.monotonic()
+
+
+class FrameGate:
+    """
+    Decide per session whether a frame needs a fresh forward pass
+
+    Each frame is compared with the frame the session's last result was
+    computed on (not the previous frame, so slow drift still adds up to a
+    refresh). Frames scoring below threshold reuse that result; after
+    max_skipped consecutive reuses the next frame is always recomputed. Only
+    used from the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, threshold=0.02, max_skipped=15, max_sessions=1024, session_ttl=60.0):
+        """
+        Initialize the gate
+
+        Args:
+            threshold: Motion score below which a frame counts as unchanged
+            max_skipped: Maximum consecutive frames that may reuse a result
+            max_sessions: Maximum number of sessions tracked at once (LRU)
+            session_ttl: Seconds after which an idle session's result is dropped
+        """
+        self.threshold = threshold
+        self.max_skipped = max_skipped
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+
+        self._sessions = OrderedDict()
+
+        # Counters, exposed through stats()
+        self.reused = 0
+        self.refreshed = 0
+
+    def check(self, session_id, thumbnail):
+        """
+        Get the session's last result if the frame is unchanged
+
+        Args:
+            session_id: Id of the stream the frame belongs to
+            thumbnail: motion_thumbnail of the frame
+
+        Returns:
+            The reusable result, or None if the frame must be computed
+        """
+        state = self._sessions.get(session_id)
+        if state is None:
+            return None
+
+        now = time.monotonic()
+        if now - state.last_seen > self.session_ttl:
+            del self._sessions[session_id]
+            return None
+
+        if (state.skipped >= self.max_skipped
+                or motion_score(thumbnail, state.reference) >= self.threshold):
+            return None
+
+        state.skipped += 1
+        state.last_seen = now
+        self._sessions.move_to_end(session_id)
+        self.reused += 1
+        return state.result
+
+    def update(self, session_id, thumbnail, result):
+        """
+        Record a fresh result as the session's new reference
+
+        Args:
+            session_id: Id of the stream the frame belongs to
+            thumbnail: motion_thumbnail of the frame
+            result: Prediction for it (from the model or the result cache)
+        """
+        self._sessions[session_id] = _GateState(thumbnail, result)
+        self._sessions.move_to_end(session_id)
+        self.refreshed += 1
+
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def reset(self, session_id):
+        """Forget the gating state of a session"""
+        self._sessions.pop(session_id, None)
+
+    def clear(self):
+        """Forget every session's result, e.g. after the model has changed"""
+        self._sessions.clear()
+
+    def stats(self):
+        """Get gating statistics"""
+        frames = self.reused + self.refreshed
+        return {
+            "threshold": self.threshold,
+            "max_skipped": self.max_skipped,
+            "active_sessions": len(self._sessions),
+            "refreshed_frames": self.refreshed,
+            "reused_frames": self.reused,
+            "reuse_rate": round(self.reused / frames, 4) if frames else 0.0,
+        }
@@ -0,0 +1,242 @@
+"""
+Inference backends for the FER model
+Runs the ResNet50 forward pass eagerly, as a frozen TorchScript graph or through ONNX Runtime
+"""
+
+import glob
+import hashlib
+import inspect
+import os
+import re
+from pathlib import Path
+
+import torch
+
+# Supported backends
+# eager:       plain PyTorch module (default, supports every precision mode)
+# torchscript: traced and frozen TorchScript graph
+# onnx:        ONNX graph executed by ONNX Runtime on CPU
+BACKENDS = ("eager", "torchscript", "onnx")
+
+INPUT_SHAPE = (1, 3, 224, 224)
+
+# Suffix of the cached TorchScript export
+TORCHSCRIPT_SUFFIX = ".torchscript.pt"
+
+
+def weights_fingerprint(model_path, chunk_size=1 << 20):
+    """
+    Get a short content hash of the source weights file
+
+    Exported artifacts embed this hash in their file name, so they are
+    rebuilt only when the weights change. The hash is recorded in a
+    <stem>.fingerprint file together with the file's size and mtime, so a
+    restart does not read the whole weights file just to name its artifacts.
+
+    Args:
+        model_path: Path to the source .pt file
+
+    Returns:
+        str: First 12 hex characters of the file's SHA-256
+    """
+    source = Path(model_path)
+    stat = source.stat()
+    stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+    record = source.with_suffix(".fingerprint")
+
+    try:
+        recorded_stamp, fingerprint = record.read_text().split()
+        if recorded_stamp == stamp:
+            return fingerprint
+    except (OSError, ValueError):
+        pass
+
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    fingerprint = digest.hexdigest()[:12]
+
+    try:
+        record.write_text(f"{stamp} {fingerprint}\n")
+    except OSError:
+        # Read-only model directory: hash again on the next start
+        pass
+    return fingerprint
+
+
+def artifact_path(model_path, suffix):
+    """
+    Get the cached artifact path for a source weights file
+
+    Args:
+        model_path: Path to the source .pt file
+        suffix: Artifact extension, e.g. ".onnx"
+
+    Returns:
+        Path: <models dir>/<stem>.<fingerprint><suffix>
+    """
+    source = Path(model_path)
+    return source.with_name(f"{source.stem}.{weights_fingerprint(source)}{suffix}")
+
+
+def remove_stale_artifacts(current, suffix):
+    """
+    Delete artifacts of the same source weights built from older versions of them
+
+    Only files named <source stem>.<fingerprint><suffix> (or their partial
+    writes, and the external weights of exports that had them) are removed, so artifacts of other weights files whose names
+    share a prefix (e.g. model.v2.pt next to model.pt) are kept.
+
+    Args:
+        current: Path of the artifact just built (from artifact_path)
+        suffix: Artifact extension it was built with
+    """
+    stem = current.name[:-len(suffix)].rsplit(".", 1)[0]
+    pattern = re.compile(
+        rf"{re.escape(stem)}\.[0-9a-f]{{12}}{re.escape(suffix)}(\.\d+\.partial)?(\.data)?"
+    )
+    for path in current.parent.glob(f"{glob.escape(stem)}.*"):
+        # Partial writes of the current artifact may belong to another worker
+        if pattern.fullmatch(path.name) and not path.name.startswith(current.name):
+            try:
+                path.unlink()
+                print(f"  Removed stale artifact: {path.name}")
+            except OSError:
+                pass
+
+
+class EagerBackend:
+    """Run the PyTorch module directly"""
+
+    name = "eager"
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def __call__(self, img_tensor):
+        return self.model(img_tensor.to(self.device))
+
+
+class TorchScriptBackend:
+    """Run a traced, frozen TorchScript graph cached next to the weights"""
+
+    name = "torchscript"
+
+    def __init__(self, model, device, model_path):
+        self.device = device
+        self.path = artifact_path(model_path, TORCHSCRIPT_SUFFIX)
+
+        if not self.path.exists():
+            print(f"  Exporting TorchScript graph to {self.path.name}")
+            example = torch.randn(*INPUT_SHAPE, device=device)
+            with torch.no_grad():
+                scripted = torch.jit.freeze(torch.jit.trace(model.eval(), example))
+            # Write to a temporary name first so a crash never leaves a partial artifact
+            # (per process, as pre-forked workers may export at the same time)
+            partial = self.path.with_name(f"{self.path.name}.{os.getpid()}.partial")
+            scripted.save(str(partial))
+            os.replace(partial, self.path)
+            remove_stale_artifacts(self.path, TORCHSCRIPT_SUFFIX)
+
+        self.model = torch.jit.load(str(self.path), map_location=device)
+        self.model.eval()
+
+    def __call__(self, img_tensor):
+        return self.model(img_tensor.to(self.device))
+
+
+class OnnxRuntimeBackend:
+    """Run an ONNX export of the model with ONNX Runtime on CPU"""
+
+    name = "onnx"
+
+    def __init__(self, model, device, model_path, intra_op_threads=0):
+        import onnxruntime as ort
+
+        self.path = artifact_path(model_path, ".onnx")
+
+        if not self.path.exists():
+            print(f"  Exporting ONNX graph to {self.path.name}")
+            example = torch.randn(*INPUT_SHAPE)
+            partial = self.path.with_name(f"{self.path.name}.{os.getpid()}.partial")
+            # Keep the weights inside the graph file (the model is far below ONNX's
+            # 2GB limit); external data would stay named after the partial file.
+            # Older exporters have no such option and always write one file
+            options = {}
+            if "external_data" in inspect.signature(torch.onnx.export).parameters:
+                options["external_data"] = False
+            torch.onnx.export(
+                model.eval().cpu(),
+                (example,),
+                str(partial),
+                input_names=["input"],
+                output_names=["logits"],
+                dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+                **options
+            )
+            os.replace(partial, self.path)
+            model.to(device)
+            remove_stale_artifacts(self.path, ".onnx")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+
+        try:
+            self.session = ort.InferenceSession(
+                str(self.path), options, providers=["CPUExecutionProvider"]
+            )
+        except Exception:
+            # Drop a broken or partial export so the next start rebuilds it
+            for path in self.path.parent.glob(self.path.name + "*"):
+                path.unlink()
+            raise
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, img_tensor):
+        inputs = img_tensor.detach().cpu().numpy()
+        (logits,) = self.session.run(None, {self.input_name: inputs})
+        return torch.from_numpy(logits)
+
+
+def create_backend(name, model, device, model_path, intra_op_threads=None):
+    """
+    Build an inference backend, falling back to eager if it cannot be created
+
+    Exporting a compiled backend runs the model, so in multi-process serving
+    backends are built in each worker after forking (see worker_pool).
+
+    Args:
+        name: One of BACKENDS
+        model: Loaded fp32 torch.nn.Module
+        device: torch.device the model lives on
+        model_path: Path to the source weights, used for the artifact cache
+        intra_op_threads: ONNX Runtime thread budget (default: torch's
+                          intra-op thread count, which worker_pool sets to
+                          each worker's share of the cores)
+
+    Returns:
+        Backend object callable on a (batch_size, 3, 224, 224) tensor
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}'. Expected one of {BACKENDS}")
+
+    if name == "eager":
+        return EagerBackend(model, device)
+
+    try:
+        if name == "torchscript":
+            backend = TorchScriptBackend(model, device, model_path)
+        else:
+            backend = OnnxRuntimeBackend(
+                model, device, model_path,
+                intra_op_threads=intra_op_threads or torch.get_num_threads()
+            )
+        print(f"✓ Using {name} inference backend ({backend.path.name})")
+        return backend
+    except Exception as e:
+        print(f"Could not initialize {name} backend ({e}); falling back to eager")
+        return EagerBackend(model, device)
@@ -0,0 +1,118 @@
+"""
+Bounded execution layer for CPU-bound FER work
+Keeps image decoding and model forward passes off the asyncio event loop
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+def _init_process_worker():
+    """Keep each preprocessing process to one torch thread to avoid oversubscription"""
+    import torch
+    torch.set_num_threads(1)
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the executor has no room for another request"""
+
+    def __init__(self, retry_after):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Dedicated worker pools with admission control for inference requests
+
+    Preprocessing (PIL decode, transforms) runs on a pool of threads or
+    processes. Model forward passes run on a single dedicated thread, since
+    torch already parallelises each forward pass internally and the model
+    object lives in this process. At most max_pending requests are admitted
+    at once; further requests are rejected immediately so the caller can
+    answer 503 instead of letting work pile up behind the event loop.
+    """
+
+    def __init__(self, max_workers=2, max_pending=64, use_processes=False, retry_after=1):
+        """
+        Initialize the executor
+
+        Args:
+            max_workers: Number of preprocessing threads or processes
+            max_pending: Maximum number of requests admitted at the same time
+            use_processes: Run preprocessing in worker processes instead of threads
+            retry_after: Seconds suggested to rejected clients in Retry-After
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.use_processes = use_processes
+        self.retry_after = retry_after
+
+        if use_processes:
+            # fork avoids re-importing the service (and reloading the model) in
+            # every child; fall back to spawn where fork is unavailable
+            methods = multiprocessing.get_all_start_methods()
+            self._pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("fork" if "fork" in methods else "spawn"),
+                initializer=_init_process_worker
+            )
+        else:
+            self._pool = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix="fer-preprocess"
+            )
+        self.model_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fer-model")
+
+        self._pending = 0
+        self.rejected = 0
+
+    @contextmanager
+    def admit(self):
+        """
+        Reserve a slot for one request for the duration of the block
+
+        Only called from the event loop thread, so the counter needs no lock.
+
+        Raises:
+            InferenceQueueFull: If max_pending requests are already in flight
+        """
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise InferenceQueueFull(self.retry_after)
+
+        self._pending += 1
+        try:
+            yield
+        finally:
+            self._pending -= 1
+
+    async def run(self, fn, *args):
+        """Run a preprocessing function on the worker pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def run_model(self, fn, *args):
+        """Run a model function on the dedicated model thread"""
+        return await asyncio.get_running_loop().run_in_executor(self.model_executor, fn, *args)
+
+    def stats(self):
+        """Get executor statistics"""
+        return {
+            "kind": "process" if self.use_processes else "thread",
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        """Shut down both pools"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.model_executor.shutdown(wait=False, cancel_futures=True)
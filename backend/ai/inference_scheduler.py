@@ -0,0 +1,156 @@
+"""
+Dynamic micro-batching scheduler for the FER inference path
+Collects concurrent prediction requests and flushes them through the model as one batch
+"""
+
+import asyncio
+import time
+
+
+class MicroBatchScheduler:
+    """
+    Queue-based scheduler that groups concurrent requests into batches
+
+    Requests are queued as they arrive. A background task takes the first
+    waiting request, keeps collecting until either max_batch_size requests
+    are gathered or max_wait_ms has passed, then hands the whole group to
+    predict_fn in a single call. Every caller gets back its own result.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5.0, executor=None):
+        """
+        Initialize the scheduler
+
+        Args:
+            predict_fn: Blocking callable taking a list of inputs and returning
+                        a list of results in the same order
+            max_batch_size: Maximum number of requests flushed together
+            max_wait_ms: Maximum time the first request of a batch waits for
+                         others to join before the batch is flushed
+            executor: concurrent.futures executor that runs predict_fn
+                      (defaults to the event loop's default executor)
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(max_wait_ms, 0) / 1000.0
+        self.executor = executor
+
+        self._queue = None
+        self._worker = None
+        # Requests taken off the queue and not yet answered (being collected or inferred)
+        self._in_flight = []
+
+        # Running statistics, exposed through stats()
+        self.batches_flushed = 0
+        self.requests_served = 0
+
+    async def start(self):
+        """Start the background batching task on the running event loop"""
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and fail any requests still queued or in flight"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        pending = self._in_flight
+        self._in_flight = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Inference scheduler stopped"))
+
+    async def submit(self, item):
+        """
+        Queue one input and wait for its result
+
+        Args:
+            item: A single model input (e.g. a 1x3x224x224 tensor)
+
+        Returns:
+            The result produced by predict_fn for this input
+        """
+        if self._worker is None:
+            raise RuntimeError("Inference scheduler is not running")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    def stats(self):
+        """Get batching statistics"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches_flushed": self.batches_flushed,
+            "requests_served": self.requests_served,
+            "average_batch_size": (
+                self.requests_served / self.batches_flushed if self.batches_flushed else 0.0
+            ),
+        }
+
+    async def _collect(self):
+        """Wait for the next request, then gather a batch until it is full or the deadline passes"""
+        batch = self._in_flight = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        # Drain anything that is already waiting without blocking further
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+
+        return batch
+
+    async def _run(self):
+        """Background loop: collect a batch, run it off the event loop, dispatch results"""
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect()
+
+            # Skip requests whose callers have already gone away
+            batch = self._in_flight = [
+                (item, future) for item, future in batch if not future.cancelled()
+            ]
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.predict_fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                self._in_flight = []
+                continue
+
+            self.batches_flushed += 1
+            self.requests_served += len(batch)
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self._in_flight = []
@@ -3,13 +3,31 @@ FastAPI server for facial emotion recognition using FER_static_ResNet50_AffectNe
 Provides REST API endpoints for emotion detection from face images
 """
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, Header, HTTPException, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from face_emotion_model import FaceEmotionDetector
-import torchvision.transforms as transforms
+from fastapi.responses import JSONResponse, Response
+from face_emotion_model import CONVERTED_SUFFIX, FaceEmotionDetector
+from frame_gate import FrameGate, motion_thumbnail
+import fer_metrics
+from inference_backends import TORCHSCRIPT_SUFFIX
+from inference_executor import InferenceExecutor, InferenceQueueFull
+from inference_scheduler import MicroBatchScheduler
+import multimodal_fusion
+from preprocessing import INPUT_SIZE, decode_face, decode_image, load_calibration_batches
+from result_cache import ResultCache, content_hash
+from stream_session import StreamSession
+from voice_emotion_model import VoiceEmotionDetector
+from voice_stream import VoiceStreamSession
+import torch
 from PIL import Image
-import io
+from datetime import datetime, timezone
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import gc
+import hmac
 import traceback
+import time
 import os
 
 # Initialize FastAPI application
@@ -28,30 +46,351 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize the face emotion detector with the FER model
-try:
-    # Try to load the model from the models directory
-    detector = FaceEmotionDetector(
-        model_path="models/FER_static_ResNet50_AffectNet.pt"
+# Count and time every HTTP request for /metrics
+app.add_middleware(fer_metrics.RequestMetricsMiddleware)
+
+# Inference precision: fp32, int8-dynamic, int8-static or bf16
+# int8-static calibrates on the sample images in FER_CALIBRATION_DIR
+PRECISION = os.getenv("FER_PRECISION", "fp32")
+
+# Inference backend: eager, torchscript or onnx
+# Compiled artifacts are cached next to the weights and rebuilt when they change
+BACKEND = os.getenv("FER_BACKEND", "eager")
+
+# Converted weights: the checkpoint is converted once to a plain state dict
+# cached next to it and memory-mapped on later starts. 0 always reads the .pt.
+WEIGHTS_CACHE = os.getenv("FER_WEIGHTS_CACHE", "1") == "1"
+
+# Model loading
+# The detector is loaded and warmed up in the background after the server has
+# started, so the process accepts connections and answers liveness probes at
+# once. Until it is ready, requests that need the model get 503 + Retry-After.
+detector = None
+model_status = {"state": "loading", "error": None, "timings": {}}
+_module_loaded_at = time.monotonic()
+_model_loader = None
+
+def _load_detector(model_path=None):
+    """
+    Initialize the face emotion detector with the FER model (blocking)
+    
+    Args:
+        model_path: Weights file to load; searched in the default locations if None
+    """
+    precision = PRECISION
+    calibration_data = None
+    if precision == "int8-static":
+        calibration_dir = os.getenv("FER_CALIBRATION_DIR", "calibration")
+        if os.path.isdir(calibration_dir):
+            calibration_data = load_calibration_batches(calibration_dir)
+        if not calibration_data:
+            print(f"No calibration images found in '{calibration_dir}'; falling back to fp32")
+            precision = "fp32"
+    
+    options = dict(
+        precision=precision,
+        calibration_data=calibration_data,
+        backend=BACKEND,
+        weights_cache=WEIGHTS_CACHE
     )
-except FileNotFoundError:
+    if model_path is not None:
+        return FaceEmotionDetector(model_path=model_path, **options)
     try:
+        # Try to load the model from the models directory
+        return FaceEmotionDetector(model_path="models/FER_static_ResNet50_AffectNet.pt", **options)
+    except FileNotFoundError:
         # Fallback: try finding the model in parent directory
-        detector = FaceEmotionDetector()
+        return FaceEmotionDetector(**options)
+
+def _warm_up(model):
+    """Run one forward pass so first-request costs (allocations, kernel selection) are paid now"""
+    model.predict_batch(torch.zeros((1, 3) + INPUT_SIZE))
+
+async def _load_model_in_background():
+    """Load the detector (unless already loaded before forking), warm it up and mark it ready"""
+    global detector
+    timings = model_status["timings"]
+    try:
+        if detector is None:
+            started = time.monotonic()
+            detector = await inference_executor.run_model(_load_detector)
+            timings["load_seconds"] = round(time.monotonic() - started, 3)
+        
+        started = time.monotonic()
+        await inference_executor.run_model(_warm_up, detector)
+        timings["warmup_seconds"] = round(time.monotonic() - started, 3)
+        timings["ready_after_seconds"] = round(time.monotonic() - _module_loaded_at, 3)
+        
+        model_status["state"] = "ready"
+        print(f"✓ Emotion detection ready after {timings['ready_after_seconds']}s")
     except Exception as e:
         print(f"Failed to initialize detector: {e}")
-        detector = None
-
-# Image preprocessing pipeline
-# ResNet50 expects 224x224 RGB images normalized with ImageNet statistics
-transform = transforms.Compose([
-    transforms.Resize((224, 224)),  # Resize to required input size
-    transforms.ToTensor(),  # Convert PIL Image to tensor
-    transforms.Normalize(
-        mean=[0.485, 0.456, 0.406],  # ImageNet normalization
-        std=[0.229, 0.224, 0.225]
+        traceback.print_exc()
+        model_status["state"] = "failed"
+        model_status["error"] = str(e)
+
+# Model hot-swap
+# A new model version is loaded and warmed up on a background thread while the
+# current one keeps serving, then swapped into `detector` with one assignment.
+# Batches already running hold their own reference to the old detector and
+# finish on it; its memory is released once they drop that reference.
+# Triggered by POST /admin/reload-model (enabled by setting FER_ADMIN_TOKEN)
+# or, with FER_WATCH_MODEL=1, by the weights file changing on disk.
+ADMIN_TOKEN = os.getenv("FER_ADMIN_TOKEN")
+WATCH_MODEL = os.getenv("FER_WATCH_MODEL", "0") == "1"
+WATCH_INTERVAL = float(os.getenv("FER_WATCH_INTERVAL", "10"))
+model_status["reload"] = {"state": "idle", "error": None, "swaps": 0}
+_swap_lock = asyncio.Lock()
+_model_watcher = None
+
+def _load_and_warm_up(model_path):
+    """Load and warm up a new detector without touching the active one (blocking)"""
+    model = _load_detector(model_path)
+    _warm_up(model)
+    return model
+
+async def swap_model(model_path=None):
+    """
+    Load a model version and atomically make it the active detector
+    
+    Args:
+        model_path: Weights file to load (default: reload the active model's file)
+    
+    Returns:
+        tuple: (new_detector, previous_version)
+    """
+    global detector
+    async with _swap_lock:
+        reload_status = model_status["reload"]
+        reload_status.update(state="loading", error=None)
+        if model_path is None and detector is not None:
+            model_path = detector.model_path
+        
+        try:
+            new_detector = await asyncio.to_thread(_load_and_warm_up, model_path)
+        except Exception as e:
+            print(f"Failed to load new model version: {e}")
+            traceback.print_exc()
+            reload_status.update(state="failed", error=str(e))
+            raise
+        
+        previous = detector
+        detector = new_detector
+        model_status.update(state="ready", error=None)
+        
+        # Results of the previous version must not be reused
+        if result_cache is not None:
+            result_cache.clear()
+        if frame_gate is not None:
+            frame_gate.clear()
+        
+        previous_version = previous.version if previous is not None else None
+        reload_status.update(state="idle", swaps=reload_status["swaps"] + 1)
+        print(f"✓ Swapped model {previous_version} -> {new_detector.version}")
+        
+        # Release the previous version (in-flight batches keep it alive until they finish)
+        del previous
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        
+        return new_detector, previous_version
+
+def _file_stamp(path):
+    """Size and modification time of a file, or None if it cannot be read"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+async def _watch_model_file():
+    """Hot-swap the model when its weights file changes on disk"""
+    watched_path = baseline = pending = None
+    while True:
+        await asyncio.sleep(WATCH_INTERVAL)
+        if detector is None or _swap_lock.locked():
+            continue
+        
+        stamp = _file_stamp(detector.model_path)
+        if detector.model_path != watched_path or baseline is None:
+            watched_path, baseline, pending = detector.model_path, stamp, None
+            continue
+        if stamp is None or stamp == baseline:
+            pending = None
+            continue
+        if stamp != pending:
+            # Wait one more interval for the file to stop changing
+            pending = stamp
+            continue
+        
+        print(f"Model file {watched_path} changed; loading the new version")
+        baseline, pending = stamp, None
+        try:
+            await swap_model(watched_path)
+        except Exception:
+            # Already reported; keep serving the current version
+            pass
+
+def _model_version_info(model):
+    """Version fields of a loaded detector, as reported by /model-info"""
+    return {
+        "version": model.version,
+        "model_file": os.path.basename(model.model_path),
+        "loaded_at": datetime.fromtimestamp(model.loaded_at, timezone.utc).isoformat(),
+        "load_seconds": round(model.load_seconds, 3)
+    }
+
+# Face localization
+# Crops the patient's face before classification and tracks its box across
+# frames that share a session_id, running full detection every
+# FER_DETECT_EVERY frames. Disabled with FER_FACE_DETECTION=0 or without OpenCV.
+face_locator = None
+if os.getenv("FER_FACE_DETECTION", "1") == "1":
+    try:
+        from face_locator import FaceLocator
+        face_locator = FaceLocator(detect_every=int(os.getenv("FER_DETECT_EVERY", "10")))
+    except (ImportError, AttributeError, FileNotFoundError) as e:
+        # AttributeError: OpenCV 5 builds without the Haar cascade module
+        print(f"Face detection disabled: {e}")
+
+def _preprocess(image_bytes, session_id=None, out=None):
+    """
+    Decode an upload into a model input, cropped to the face when possible
+    
+    Returns:
+        tuple: (tensor, face_box) where face_box is None if no face was located
+    """
+    if face_locator is None:
+        return decode_image(image_bytes, out), None
+    return decode_face(image_bytes, face_locator, session_id, out)
+
+# Repeated frame cache (opt-in)
+# Frames of a session that are identical to one of its recent frames (same
+# preprocessed pixels) reuse that frame's result. Frames without a session_id
+# are never cached. FER_CACHE_SIZE > 0 enables the cache.
+CACHE_SIZE = int(os.getenv("FER_CACHE_SIZE", "0"))
+result_cache = ResultCache(
+    max_entries=CACHE_SIZE,
+    ttl=float(os.getenv("FER_CACHE_TTL", "5"))
+) if CACHE_SIZE > 0 else None
+
+# Change-detection gating (opt-in)
+# Frames of a session whose face has barely changed since the session's last
+# computed result (mean intensity difference of a 16x16 thumbnail below
+# FER_GATE_THRESHOLD) reuse that result; after FER_GATE_MAX_SKIPPED reused
+# frames the next one is always recomputed. Off by default: a change of
+# expression alone (smile to frown) scores below 0.001, so the gate would
+# return the old emotion. FER_GATE_THRESHOLD > 0 enables it.
+GATE_THRESHOLD = float(os.getenv("FER_GATE_THRESHOLD", "0"))
+frame_gate = FrameGate(
+    threshold=GATE_THRESHOLD,
+    max_skipped=int(os.getenv("FER_GATE_MAX_SKIPPED", "15"))
+) if GATE_THRESHOLD > 0 else None
+
+def _prepare_frame(image_bytes, session_id=None):
+    """
+    Preprocess a single upload and compute the cheap signatures used to skip the model
+    
+    Returns:
+        tuple: (tensor, face_box, frame_hash, thumbnail), frame_hash and
+               thumbnail are None without a session or the cache / gating
+    """
+    tensor, face_box = _preprocess(image_bytes, session_id)
+    frame_hash = None
+    if result_cache is not None and session_id:
+        frame_hash = content_hash(tensor)
+    thumbnail = None
+    if frame_gate is not None and session_id:
+        thumbnail = motion_thumbnail(tensor)
+    return tensor, face_box, frame_hash, thumbnail
+
+# Inference execution configuration
+# Decoding and forward passes run on dedicated workers so the event loop only
+# handles I/O. At most FER_MAX_PENDING requests are admitted at once; beyond
+# that the service answers 503 with a Retry-After header.
+inference_executor = InferenceExecutor(
+    max_workers=int(os.getenv("FER_INFERENCE_WORKERS", "2")),
+    max_pending=int(os.getenv("FER_MAX_PENDING", "64")),
+    use_processes=os.getenv("FER_INFERENCE_EXECUTOR", "thread").lower() == "process",
+    retry_after=int(os.getenv("FER_RETRY_AFTER", "1"))
+)
+
+# Micro-batching configuration
+# Concurrent /predict-face requests are grouped into one forward pass of up to
+# FER_MAX_BATCH_SIZE images, waiting at most FER_MAX_WAIT_MS for a batch to fill
+MAX_BATCH_SIZE = int(os.getenv("FER_MAX_BATCH_SIZE", "16"))
+MAX_WAIT_MS = float(os.getenv("FER_MAX_WAIT_MS", "5"))
+
+def _forward(model, batch):
+    """Run one forward pass of the detector, recording its time and batch size"""
+    started = time.perf_counter()
+    result = model.predict_batch(batch)
+    fer_metrics.observe_forward(time.perf_counter() - started, len(batch))
+    return result
+
+def _predict_stacked(tensors):
+    """
+    Run a list of 1x3x224x224 tensors through the detector as one stacked batch
+    
+    Returns:
+        list: (emotion, confidence, emotion_probs) for each input tensor
+    """
+    # One reference for the whole batch, so a hot-swap cannot split it across versions
+    model = detector
+    predicted, confidences, probs = _forward(model, torch.cat(tensors, dim=0))
+    return [
+        (model.emotions[int(index)], float(confidence), emotion_probs)
+        for index, confidence, emotion_probs in zip(
+            predicted, confidences, model.probabilities_to_dicts(probs)
+        )
+    ]
+
+scheduler = MicroBatchScheduler(
+    _predict_stacked,
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait_ms=MAX_WAIT_MS,
+    executor=inference_executor.model_executor
+)
+
+@app.on_event("startup")
+async def start_scheduler():
+    """Start the inference scheduler and begin loading the model once the event loop is running"""
+    global _model_loader, _model_watcher
+    await scheduler.start()
+    _model_loader = asyncio.create_task(_load_model_in_background())
+    if WATCH_MODEL:
+        _model_watcher = asyncio.create_task(_watch_model_file())
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    """Stop the inference scheduler and fail any queued requests"""
+    if _model_watcher is not None:
+        _model_watcher.cancel()
+    await scheduler.stop()
+    inference_executor.shutdown()
+    voice_executor.shutdown(wait=False, cancel_futures=True)
+
+def _model_unavailable_error():
+    """Build the error for a request that needs the model before it is ready"""
+    if model_status["state"] == "failed":
+        return HTTPException(
+            status_code=500,
+            detail="Emotion detection model is not loaded"
+        )
+    return HTTPException(
+        status_code=503,
+        detail="Emotion detection model is still loading, please retry",
+        headers={"Retry-After": str(inference_executor.retry_after)}
+    )
+
+def _queue_full_error(e):
+    """Build the 503 response for a request rejected by the inference executor"""
+    return HTTPException(
+        status_code=503,
+        detail="Emotion detection service is busy, please retry",
+        headers={"Retry-After": str(e.retry_after)}
     )
-])
 
 # Health check endpoint
 @app.get("/")
@@ -60,27 +399,153 @@ def root():
     return {
         "status": "Face Emotion Recognition API is running",
         "model": "FER_static_ResNet50_AffectNet",
-        "model_loaded": detector is not None
+        "model_loaded": model_status["state"] == "ready"
     }
 
 # Health check endpoint with detailed status
 @app.get("/health")
 def health_check():
     """Detailed health check endpoint"""
+    state = model_status["state"]
+    messages = {
+        "loading": "Model is loading",
+        "ready": "Ready for emotion detection",
+        "failed": f"Model failed to load: {model_status['error']}",
+    }
     return {
-        "status": "healthy" if detector else "unhealthy",
-        "model_loaded": detector is not None,
-        "message": "Ready for emotion detection" if detector else "Model failed to load"
+        "status": {"loading": "starting", "ready": "healthy"}.get(state, "unhealthy"),
+        "liveness": "alive",
+        "readiness": state,
+        "model_loaded": state == "ready",
+        "message": messages[state],
+        "startup": model_status["timings"],
+        "reload": model_status["reload"],
+        "worker_pid": os.getpid(),
+        "batching": scheduler.stats(),
+        "executor": inference_executor.stats(),
+        "face_detection": face_locator.stats() if face_locator else None,
+        "cache": result_cache.stats() if result_cache else None,
+        "gating": frame_gate.stats() if frame_gate else None,
+        "active_streams": len(active_streams)
+    }
+
+# Liveness probe: the process is up and serving requests
+@app.get("/health/live")
+def liveness():
+    """Liveness probe"""
+    return {"status": "alive"}
+
+# Readiness probe: the model is loaded and warmed up
+@app.get("/health/ready")
+def readiness():
+    """Readiness probe, 503 until the model can serve requests"""
+    ready = model_status["state"] == "ready"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": model_status["state"], "startup": model_status["timings"]}
+    )
+
+# Prometheus metrics endpoint
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics in the text exposition format"""
+    body, content_type = fer_metrics.render()
+    return Response(content=body, media_type=content_type)
+
+fer_metrics.register_state_collector(health_check)
+
+async def _classify_frame(image_bytes, session_id=None, endpoint="/predict-face"):
+    """
+    Preprocess and classify one frame, reusing an earlier result when the
+    session's face has not changed or the cache has an identical frame
+    
+    Args:
+        image_bytes: Encoded image
+        session_id: Optional id of the stream the frame belongs to
+        endpoint: Endpoint label for the stage latency metrics
+    
+    Returns:
+        tuple: (emotion, confidence, emotion_probs, face_box, source) where
+               source is "model", "gate" or "cache"
+    """
+    # Decode, locate the face and preprocess on a worker, off the event loop
+    with fer_metrics.time_stage(endpoint, "preprocess"):
+        tensor, face_box, frame_hash, thumbnail = await inference_executor.run(
+            _prepare_frame, image_bytes, session_id
+        )
+    
+    # Reuse the session's last result if the face has not visibly changed
+    if thumbnail is not None:
+        prediction = frame_gate.check(session_id, thumbnail)
+        if prediction is not None:
+            return (*prediction, face_box, "gate")
+    
+    # Reuse the result of a recent identical frame of the session if there is one
+    prediction = None
+    if frame_hash is not None:
+        prediction = result_cache.get(frame_hash, session_id)
+    source = "cache" if prediction is not None else "model"
+    
+    if prediction is None:
+        # Get primary emotion, confidence and all probabilities from one
+        # forward pass, batched with other concurrent requests by the scheduler
+        with fer_metrics.time_stage(endpoint, "inference"):
+            prediction = await scheduler.submit(tensor.unsqueeze(0))
+        if frame_hash is not None:
+            result_cache.put(frame_hash, prediction, session_id)
+    
+    if thumbnail is not None:
+        frame_gate.update(session_id, thumbnail, prediction)
+    
+    emotion, confidence, emotion_probs = prediction
+    return emotion, confidence, emotion_probs, face_box, source
+
+def _reuse_flags(source):
+    """Response fields telling whether the result was computed or reused"""
+    return {
+        "computed": source == "model",
+        "cached": source == "cache",
+        "source": source
+    }
+
+def _format_prediction(emotion, confidence, emotion_probs):
+    """Build the emotion part of a /predict-face style response"""
+    # Extract individual emotions
+    emotions = {
+        "angry": emotion_probs.get("angry", 0),
+        "disgusted": emotion_probs.get("disgust", 0),
+        "fearful": emotion_probs.get("fear", 0),
+        "happy": emotion_probs.get("happy", 0),
+        "neutral": emotion_probs.get("neutral", 0),
+        "sad": emotion_probs.get("sad", 0),
+        "surprised": emotion_probs.get("surprise", 0),
+    }
+    
+    # Extract psychiatric indicators
+    psychiatric_indicators = {
+        "aggressive": emotion_probs.get("aggressive", 0),
+        "depressed": emotion_probs.get("depressed", 0),
+        "anxious": emotion_probs.get("anxious", 0),
+    }
+    
+    return {
+        "emotion": emotion,
+        "confidence": round(confidence, 4),
+        "all_emotions": {k: round(v, 4) for k, v in emotions.items()},
+        "psychiatric_indicators": {k: round(v, 4) for k, v in psychiatric_indicators.items()}
     }
 
 # Main emotion prediction endpoint
 @app.post("/predict-face")
-async def predict_face(file: UploadFile = File(...)):
+async def predict_face(file: UploadFile = File(...), session_id: str = Form(None)):
     """
     Predict emotion from a face image
     
     Args:
         file: Image file containing a face
+        session_id: Optional id shared by consecutive frames of one check-in,
+                    lets the face box be tracked instead of re-detected and
+                    identical frames reuse their result (if FER_CACHE_SIZE is set)
         
     Returns:
         JSON object with:
@@ -88,60 +553,43 @@ async def predict_face(file: UploadFile = File(...)):
         - confidence: Confidence score (0-1)
         - all_emotions: Probabilities for all emotion classes
         - psychiatric_indicators: Derived psychiatric indicators
+        - face_box: [x, y, w, h] of the classified face, or null for the whole frame
+        - computed: True if the model ran on this frame
+        - cached: True if the result was reused from an identical recent frame of the session
+        - source: "model", "cache", or "gate" when the session's last result was
+                  reused because the face had not changed
     """
-    if detector is None:
-        raise HTTPException(
-            status_code=500,
-            detail="Emotion detection model is not loaded"
-        )
+    if model_status["state"] != "ready":
+        raise _model_unavailable_error()
     
     try:
-        # Read image file
-        image_bytes = await file.read()
-        if not image_bytes:
-            raise HTTPException(
-                status_code=400,
-                detail="Empty image file"
+        with inference_executor.admit():
+            # Read image file
+            with fer_metrics.time_stage("/predict-face", "read"):
+                image_bytes = await file.read()
+            if not image_bytes:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Empty image file"
+                )
+            
+            emotion, confidence, emotion_probs, face_box, source = await _classify_frame(
+                image_bytes, session_id
             )
         
-        # Open and convert image to RGB
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        
-        # Apply preprocessing transformations
-        tensor = transform(image).unsqueeze(0)  # Add batch dimension
-        
-        # Get emotion prediction with all probabilities
-        emotion_probs = detector.predict_with_probabilities(tensor)
-        
-        # Get primary emotion and confidence
-        emotion, confidence = detector.predict_tensor(tensor)
-        
-        # Extract individual emotions
-        emotions = {
-            "angry": emotion_probs.get("angry", 0),
-            "disgusted": emotion_probs.get("disgust", 0),
-            "fearful": emotion_probs.get("fear", 0),
-            "happy": emotion_probs.get("happy", 0),
-            "neutral": emotion_probs.get("neutral", 0),
-            "sad": emotion_probs.get("sad", 0),
-            "surprised": emotion_probs.get("surprise", 0),
-        }
-        
-        # Extract psychiatric indicators
-        psychiatric_indicators = {
-            "aggressive": emotion_probs.get("aggressive", 0),
-            "depressed": emotion_probs.get("depressed", 0),
-            "anxious": emotion_probs.get("anxious", 0),
-        }
-        
-        return {
-            "success": True,
-            "emotion": emotion,
-            "confidence": round(confidence, 4),
-            "all_emotions": {k: round(v, 4) for k, v in emotions.items()},
-            "psychiatric_indicators": {k: round(v, 4) for k, v in psychiatric_indicators.items()}
-        }
+        # Rendered here rather than by FastAPI so serialization is timed too
+        with fer_metrics.time_stage("/predict-face", "serialize"):
+            return JSONResponse({
+                "success": True,
+                **_format_prediction(emotion, confidence, emotion_probs),
+                "face_box": list(face_box) if face_box else None,
+                **_reuse_flags(source)
+            })
         
+    except HTTPException:
+        raise
+    except InferenceQueueFull as e:
+        raise _queue_full_error(e)
     except Image.UnidentifiedImageError:
         raise HTTPException(
             status_code=400,
@@ -155,6 +603,300 @@ async def predict_face(file: UploadFile = File(...)):
             detail=f"Error processing image: {str(e)}"
         )
 
+# Streaming emotion analysis endpoint
+# Open streaming sessions by server-generated stream id; each is removed when its socket closes
+active_streams = {}
+# Default EMA weight of the newest frame in the smoothed estimate
+STREAM_EMA_ALPHA = float(os.environ.get("FER_STREAM_EMA_ALPHA", "0.3"))
+
+@app.websocket("/ws/predict-face")
+async def stream_face(websocket: WebSocket, session_id: str = None,
+                      alpha: float = None, window: int = 0):
+    """
+    Continuous face emotion analysis over one WebSocket connection
+    
+    The client sends each webcam frame as a binary message (JPEG/PNG bytes).
+    For every processed frame the server replies with a JSON message holding
+    the frame's own prediction plus a running smoothed estimate. If frames
+    arrive faster than they can be classified, only the newest waiting frame
+    is processed and the older ones are counted as dropped.
+    
+    Query parameters:
+        session_id: Optional client label of the stream; face tracking, the
+                    change gate and the result cache are always scoped to
+                    the connection
+        alpha: EMA weight of the newest frame (default FER_STREAM_EMA_ALPHA)
+        window: If > 0, smooth with the mean of the last `window` frames instead
+    """
+    await websocket.accept()
+    
+    if model_status["state"] != "ready":
+        await websocket.send_json({"success": False, "error": _model_unavailable_error().detail})
+        # 1013: try again later
+        await websocket.close(code=1013 if model_status["state"] == "loading" else 1011)
+        return
+    
+    try:
+        session = StreamSession(
+            detector.emotions, session_id,
+            alpha=STREAM_EMA_ALPHA if alpha is None else alpha,
+            window=window
+        )
+    except ValueError as e:
+        await websocket.send_json({"success": False, "error": str(e)})
+        await websocket.close(code=1008)
+        return
+    active_streams[session.stream_id] = session
+    
+    pending = []
+    frame_ready = asyncio.Event()
+    
+    async def receive_frames():
+        """Keep only the newest unprocessed frame until the client disconnects"""
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            image_bytes = message.get("bytes")
+            if not image_bytes:
+                # Text/control messages are ignored
+                continue
+            session.frames_received += 1
+            if pending:
+                session.frames_dropped += 1
+                pending.clear()
+            pending.append(image_bytes)
+            frame_ready.set()
+    
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while True:
+            ready = asyncio.create_task(frame_ready.wait())
+            done, _ = await asyncio.wait({receiver, ready}, return_when=asyncio.FIRST_COMPLETED)
+            if ready not in done:
+                # Client went away
+                ready.cancel()
+                break
+            
+            frame_ready.clear()
+            image_bytes = pending.pop()
+            await websocket.send_json(await _stream_frame(session, image_bytes))
+    except Exception as e:
+        print(f"Stream {session.stream_id} closed: {e}")
+    finally:
+        receiver.cancel()
+        # Free all per-session state
+        active_streams.pop(session.stream_id, None)
+        if face_locator is not None:
+            face_locator.reset(session.stream_id)
+        if frame_gate is not None:
+            frame_gate.reset(session.stream_id)
+
+async def _stream_frame(session, image_bytes):
+    """Classify one streamed frame and fold it into the session's smoothed estimate"""
+    try:
+        with inference_executor.admit():
+            emotion, confidence, emotion_probs, face_box, source = await _classify_frame(
+                image_bytes, session.stream_id, endpoint="/ws/predict-face"
+            )
+    except InferenceQueueFull as e:
+        return {"success": False, "frame": session.frames_received,
+                "error": "busy", "retry_after": e.retry_after}
+    except Image.UnidentifiedImageError:
+        return {"success": False, "frame": session.frames_received,
+                "error": "Invalid image file format"}
+    
+    session.frames_processed += 1
+    smoothed_emotion, smoothed_confidence, smoothed_probs = session.smooth(emotion_probs)
+    
+    return {
+        "success": True,
+        "frame": session.frames_received,
+        **_format_prediction(emotion, confidence, emotion_probs),
+        "face_box": list(face_box) if face_box else None,
+        **_reuse_flags(source),
+        "smoothed": _format_prediction(smoothed_emotion, smoothed_confidence, smoothed_probs),
+        "frames_processed": session.frames_processed,
+        "frames_dropped": session.frames_dropped,
+        "fps": round(session.fps(), 2)
+    }
+
+# Streaming voice analysis endpoint
+# Trained voice classifier (defaults to models/voice_emotion_classifier.npz)
+VOICE_MODEL = os.getenv("FER_VOICE_MODEL")
+# Seconds of audio between the estimates sent to a voice stream
+VOICE_UPDATE_INTERVAL = float(os.getenv("FER_VOICE_UPDATE_INTERVAL", "1.0"))
+voice_detector = None
+# Whole-clip voice analysis runs on its own threads, next to (not behind) face decoding
+voice_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("FER_VOICE_WORKERS", "1")),
+    thread_name_prefix="fer-voice"
+)
+
+def _get_voice_detector():
+    """Create the voice detector on first use, so face-only deployments never load it"""
+    global voice_detector
+    if voice_detector is None:
+        # Features are extracted with the profile the model was trained on
+        voice_detector = VoiceEmotionDetector(model_path=VOICE_MODEL)
+    return voice_detector
+
+@app.websocket("/ws/predict-voice")
+async def stream_voice(websocket: WebSocket, session_id: str = None,
+                       sample_rate: int = 16000, sample_format: str = "f32"):
+    """
+    Continuous voice emotion analysis over one WebSocket connection
+    
+    The client sends raw mono PCM as binary messages while recording. Each
+    chunk is folded into running MFCC, chroma, mel, contrast and tonnetz
+    statistics, so the recording is never kept or re-analysed. Every
+    FER_VOICE_UPDATE_INTERVAL seconds of audio the server replies with the
+    current estimate. Sending the text message "estimate" asks for one
+    immediately; "end" returns the final estimate and closes the stream.
+    Streams are only scored by a voice model trained on lite features;
+    otherwise the connection is closed with code 1008.
+    
+    Query parameters:
+        session_id: Optional id echoed back in every message
+        sample_rate: Sample rate of the PCM (resampled as needed)
+        sample_format: "f32" (float32) or "s16" (16-bit integer), little-endian
+    """
+    await websocket.accept()
+    
+    try:
+        detector_ = await asyncio.to_thread(_get_voice_detector)
+        session = VoiceStreamSession(detector_, sample_rate, sample_format, session_id)
+    except ValueError as e:
+        await websocket.send_json({"success": False, "error": str(e)})
+        await websocket.close(code=1008)
+        return
+    active_streams[session.stream_id] = session
+    
+    next_update = VOICE_UPDATE_INTERVAL
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            if message.get("bytes"):
+                session.chunks_received += 1
+                with fer_metrics.time_stage("/ws/predict-voice", "features"):
+                    await asyncio.to_thread(session.add_chunk, message["bytes"])
+                if session.extractor.seconds >= next_update:
+                    next_update = session.extractor.seconds + VOICE_UPDATE_INTERVAL
+                    await websocket.send_json(_voice_update(session))
+            elif message.get("text") == "estimate":
+                await websocket.send_json(_voice_update(session))
+            elif message.get("text") == "end":
+                await asyncio.to_thread(session.add_chunk, b"", True)
+                await websocket.send_json(_voice_update(session, final=True))
+                await websocket.close()
+                break
+    except Exception as e:
+        print(f"Voice stream {session.session_id} closed: {e}")
+    finally:
+        active_streams.pop(session.stream_id, None)
+
+def _voice_update(session, final=False):
+    """Build the message reporting a voice stream's current estimate"""
+    estimate = session.estimate()
+    return {
+        "success": True,
+        "session_id": session.session_id,
+        "final": final,
+        "seconds": round(session.extractor.seconds, 3),
+        "emotion": estimate["emotion"],
+        "confidence": estimate["confidence"],
+        "emotions": estimate["emotions"]
+    }
+
+# Multimodal (face + voice) prediction endpoint
+@app.post("/predict-multimodal")
+async def predict_multimodal(files: list[UploadFile] = File(default=[]),
+                             audio: UploadFile = File(None)):
+    """
+    Predict one emotion from a check-in's face frames and voice clip
+    
+    The frames are classified as one batch while the audio is analyzed on a
+    voice worker at the same time. Face frames are averaged weighted by their
+    confidence, then face and voice are combined weighted by each modality's
+    confidence. Voice only counts when a trained voice model is loaded.
+    
+    Args:
+        files: Face images (webcam frames)
+        audio: Voice recording (WAV, FLAC, OGG, ...)
+        
+    Returns:
+        Fused emotion with psychiatric indicators, plus per-modality results
+    """
+    if not files and audio is None:
+        raise HTTPException(status_code=400, detail="Send face images (files) and/or an audio clip (audio)")
+    # Also needed for voice-only requests: results use the face model's labels and indicators
+    if model_status["state"] != "ready":
+        raise _model_unavailable_error()
+    
+    try:
+        with inference_executor.admit():
+            audio_bytes = await audio.read() if audio is not None else None
+            frames, voice = await asyncio.gather(
+                _predict_files(files, endpoint="/predict-multimodal") if files else _no_frames(),
+                _analyze_voice_clip(audio_bytes) if audio_bytes else _no_voice()
+            )
+    except InferenceQueueFull as e:
+        raise _queue_full_error(e)
+    
+    emotions = detector.emotions
+    face_probs, face_confidence = multimodal_fusion.face_distribution(
+        [list(frame["all_emotions"].values()) for frame in frames if "error" not in frame],
+        emotions
+    )
+    voice_probs = None
+    voice_confidence = 0.0
+    if voice is not None and voice["emotion"] is not None:
+        voice_probs = multimodal_fusion.voice_distribution(voice["emotions"], emotions)
+        # An untrained voice model returns a fixed prior, which must not sway the result
+        voice_confidence = voice["confidence"] if voice_detector.model_loaded else 0.0
+    
+    fused, (face_weight, voice_weight) = multimodal_fusion.fuse(
+        [(face_probs, face_confidence), (voice_probs, voice_confidence)], emotions
+    )
+    if fused is None:
+        detail = "No face was classified"
+        if voice_probs is not None:
+            detail += " and no trained voice model is loaded"
+        elif audio_bytes:
+            detail += " and the audio could not be analyzed"
+        raise HTTPException(status_code=422, detail=detail)
+    
+    emotion_probs = detector.probabilities_to_dicts([fused])[0]
+    top = max(emotions, key=emotion_probs.get)
+    return {
+        "success": True,
+        **_format_prediction(top, emotion_probs[top], emotion_probs),
+        "modalities": {
+            "face": {"frames": len(frames), "confidence": round(face_confidence, 4),
+                     "weight": round(face_weight, 4)},
+            "voice": {"analyzed": voice_probs is not None, "confidence": round(voice_confidence, 4),
+                      "weight": round(voice_weight, 4)}
+        },
+        "frames": frames,
+        "voice": voice
+    }
+
+async def _no_frames():
+    return []
+
+async def _no_voice():
+    return None
+
+async def _analyze_voice_clip(audio_bytes):
+    """Analyze a whole voice clip on the voice workers"""
+    loop = asyncio.get_running_loop()
+    voice_detector_ = await loop.run_in_executor(voice_executor, _get_voice_detector)
+    with fer_metrics.time_stage("/predict-multimodal", "voice"):
+        return await loop.run_in_executor(voice_executor, voice_detector_.detect_emotion, audio_bytes)
+
 # Batch emotion prediction endpoint
 @app.post("/predict-batch")
 async def predict_batch(files: list[UploadFile] = File(...)):
@@ -167,36 +909,80 @@ async def predict_batch(files: list[UploadFile] = File(...)):
     Returns:
         List of emotion predictions for each image
     """
-    if detector is None:
-        raise HTTPException(
-            status_code=500,
-            detail="Emotion detection model is not loaded"
+    if model_status["state"] != "ready":
+        raise _model_unavailable_error()
+    
+    try:
+        with inference_executor.admit():
+            return {"results": await _predict_files(files)}
+    except InferenceQueueFull as e:
+        raise _queue_full_error(e)
+
+async def _decode_into(image_bytes, out):
+    """Decode one image on the executor into a preallocated tensor row, returning its face box"""
+    if inference_executor.use_processes:
+        # Worker processes cannot write into this process's memory
+        tensor, face_box = await inference_executor.run(_preprocess, image_bytes)
+        out.copy_(tensor)
+        return face_box
+    _, face_box = await inference_executor.run(_preprocess, image_bytes, None, out)
+    return face_box
+
+async def _predict_files(files, endpoint="/predict-batch"):
+    """Decode every upload, then classify them all with one forward pass"""
+    results = [None] * len(files)
+    positions = []
+    
+    # Decode every upload in parallel straight into its row of one batch tensor
+    with fer_metrics.time_stage(endpoint, "read"):
+        uploads = [await file.read() for file in files]
+    batch = torch.empty((len(uploads), 3) + INPUT_SIZE, dtype=torch.float32)
+    with fer_metrics.time_stage(endpoint, "preprocess"):
+        decoded = await asyncio.gather(
+            *(_decode_into(image_bytes, batch[i]) for i, image_bytes in enumerate(uploads)),
+            return_exceptions=True
         )
     
-    results = []
+    for i, (file, face_box) in enumerate(zip(files, decoded)):
+        if isinstance(face_box, Exception):
+            results[i] = {
+                "filename": file.filename,
+                "error": str(face_box)
+            }
+        else:
+            positions.append(i)
+    
+    # Only copy when some uploads failed and their rows must be dropped
+    if len(positions) < len(uploads):
+        batch = batch[positions]
     
-    for file in files:
+    if positions:
+        # One reference for the whole batch, so a hot-swap cannot split it across versions
+        model = detector
         try:
-            image_bytes = await file.read()
-            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-            tensor = transform(image).unsqueeze(0)
-            
-            emotion, confidence = detector.predict_tensor(tensor)
-            emotion_probs = detector.predict_with_probabilities(tensor)
+            with fer_metrics.time_stage(endpoint, "inference"):
+                predicted, confidences, probs = await inference_executor.run_model(
+                    _forward, model, batch
+                )
             
-            results.append({
-                "filename": file.filename,
-                "emotion": emotion,
-                "confidence": round(confidence, 4),
-                "all_emotions": {k: round(v, 4) for k, v in emotion_probs.items() if k in ["angry", "disgust", "fear", "happy", "neutral", "sad", "surprise"]}
-            })
+            for i, index, confidence, row in zip(positions, predicted, confidences, probs.tolist()):
+                results[i] = {
+                    "filename": files[i].filename,
+                    "emotion": model.emotions[int(index)],
+                    "confidence": round(float(confidence), 4),
+                    "all_emotions": {k: round(v, 4) for k, v in zip(model.emotions, row)},
+                    "face_box": list(decoded[i]) if decoded[i] else None
+                }
         except Exception as e:
-            results.append({
-                "filename": file.filename,
-                "error": str(e)
-            })
+            print(f"Error during batch emotion prediction: {e}")
+            traceback.print_exc()
+            for i in positions:
+                results[i] = {
+                    "filename": files[i].filename,
+                    "error": str(e)
+                }
     
-    return {"results": results}
+    return results
 
 # Get supported emotions endpoint
 @app.get("/emotions")
@@ -215,8 +1001,8 @@ def get_emotions():
 @app.get("/model-info")
 def get_model_info():
     """Get information about the loaded model"""
-    if detector is None:
-        return {"model_loaded": False}
+    if model_status["state"] != "ready":
+        return {"model_loaded": False, "state": model_status["state"]}
     
     return {
         "model_name": "FER_static_ResNet50_AffectNet",
@@ -225,15 +1011,115 @@ def get_model_info():
         "input_size": [3, 224, 224],
         "emotion_classes": 7,
         "device": str(detector.device),
+        "precision": detector.precision,
+        "backend": detector.backend.name,
+        **_model_version_info(detector),
+        "swaps": model_status["reload"]["swaps"],
         "model_loaded": True
     }
 
+# Model hot-swap endpoint
+@app.post("/admin/reload-model")
+async def reload_model(model_file: str = Form(None), x_admin_token: str = Header(None)):
+    """
+    Load a model version in the background and swap it in without downtime
+    
+    Requests keep being served by the current version until the new one is
+    loaded and warmed up. With FER_WORKERS > 1 only the worker that receives
+    this request swaps; use FER_WATCH_MODEL=1 to update every worker.
+    
+    Args:
+        model_file: Weights file name in the active model's directory
+                    (default: reload the active model's file)
+        x_admin_token: Must match FER_ADMIN_TOKEN (X-Admin-Token header)
+        
+    Returns:
+        JSON object with the new version, its load time and the previous version
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=404,
+            detail="Model reloading is disabled (set FER_ADMIN_TOKEN to enable it)"
+        )
+    if not hmac.compare_digest(x_admin_token or "", ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if model_status["state"] == "loading" or _swap_lock.locked():
+        raise HTTPException(status_code=409, detail="A model load is already in progress")
+    
+    model_path = None
+    if model_file:
+        # Only weights files next to the active model can be loaded
+        models_dir = (
+            Path(detector.model_path).resolve().parent if detector is not None
+            else Path(__file__).resolve().parent / "models"
+        )
+        candidate = (models_dir / model_file).resolve()
+        # Converted weights and TorchScript exports are also .pt files, but
+        # derived from a source file; loading one would rebuild artifacts of
+        # the artifact and delete the file being loaded as stale
+        derived = candidate.name.endswith((CONVERTED_SUFFIX, TORCHSCRIPT_SUFFIX))
+        if (candidate.parent != models_dir or candidate.suffix != ".pt" or derived
+                or not candidate.is_file()):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Model file must be an existing source .pt weights file in {models_dir}"
+            )
+        model_path = str(candidate)
+    
+    try:
+        new_detector, previous_version = await swap_model(model_path)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to load model: {str(e)}"
+        )
+    
+    return {
+        "success": True,
+        **_model_version_info(new_detector),
+        "previous_version": previous_version
+    }
+
 if __name__ == "__main__":
     import uvicorn
-    # Run the FastAPI server
-    uvicorn.run(
-        app,
-        host="0.0.0.0",
-        port=8000,
-        log_level="info"
-    )
+    
+    # FER_WORKERS > 1 forks that many worker processes after the model has
+    # been loaded, so every worker shares one copy of the weights
+    workers = int(os.getenv("FER_WORKERS", "1"))
+    
+    if workers > 1 and hasattr(os, "fork"):
+        from worker_pool import serve_prefork
+        # Load (but do not warm up) the model before forking; each worker
+        # runs its own warm-up pass once its event loop has started.
+        # Compiled backends and int8-static run the model while they are built
+        # (tracing, export, calibration), which must not happen before forking,
+        # so with those every worker loads the model itself. The memory-mapped
+        # converted weights are still shared through the page cache.
+        if BACKEND != "eager" or PRECISION == "int8-static":
+            print(f"Loading the model in each worker ({BACKEND} backend, {PRECISION} precision)")
+        else:
+            try:
+                started = time.monotonic()
+                detector = _load_detector()
+                model_status["timings"]["load_seconds"] = round(time.monotonic() - started, 3)
+            except Exception as e:
+                print(f"Failed to initialize detector before forking ({e}); workers will retry")
+        serve_prefork(
+            app,
+            detector.model if detector is not None else None,
+            host="0.0.0.0",
+            port=8000,
+            workers=workers,
+            torch_threads=int(os.getenv("FER_TORCH_THREADS", "0")),
+            log_level="info"
+        )
+    else:
+        if workers > 1:
+            print("Multi-process mode needs os.fork; running a single worker")
+        # Run the FastAPI server
+        uvicorn.run(
+            app,
+            host="0.0.0.0",
+            port=8000,
+            log_level="info"
+        )
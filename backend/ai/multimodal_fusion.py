@@ -0,0 +1,87 @@
+"""
+Confidence-weighted fusion of face and voice emotion predictions
+Combines per-frame face probabilities and a voice clip's probabilities into
+one distribution over the face model's emotions
+"""
+
+# Voice labels the face model has no class for, folded into the closest face class
+VOICE_TO_FACE = {"calm": "neutral"}
+
+
+def face_distribution(frame_probs, emotions):
+    """
+    Combine the probabilities of several frames of one check-in
+
+    Frames are weighted by their own confidence (top probability), so a
+    blurred or badly lit frame counts for less than a clear one.
+
+    Args:
+        frame_probs: List of per-frame probability rows, in `emotions` order
+        emotions: Face emotion labels
+
+    Returns:
+        tuple: (probability dict, modality confidence), or (None, 0.0) without frames
+    """
+    if not frame_probs:
+        return None, 0.0
+
+    weights = [max(row) for row in frame_probs]
+    total = sum(weights)
+    probs = {
+        emotion: sum(weight * row[i] for weight, row in zip(weights, frame_probs)) / total
+        for i, emotion in enumerate(emotions)
+    }
+    return probs, total / len(weights)
+
+
+def voice_distribution(voice_probs, emotions):
+    """
+    Map voice probabilities onto the face emotion labels
+
+    Args:
+        voice_probs: Dict of voice emotion -> probability
+        emotions: Face emotion labels
+
+    Returns:
+        dict: Face emotion -> probability (labels without a face class are
+        folded in through VOICE_TO_FACE, any others dropped and renormalized)
+    """
+    probs = dict.fromkeys(emotions, 0.0)
+    for emotion, value in voice_probs.items():
+        emotion = VOICE_TO_FACE.get(emotion, emotion)
+        if emotion in probs:
+            probs[emotion] += value
+
+    total = sum(probs.values())
+    if total > 0:
+        probs = {emotion: value / total for emotion, value in probs.items()}
+    return probs
+
+
+def fuse(distributions, emotions):
+    """
+    Average modality distributions weighted by each modality's confidence
+
+    Args:
+        distributions: List of (probability dict, weight) pairs; pairs with
+            no distribution or zero weight are ignored
+        emotions: Face emotion labels
+
+    Returns:
+        tuple: (fused probability list in `emotions` order, normalized
+        weights in input order), or (None, weights) if nothing can be fused
+    """
+    usable = [(probs, weight) for probs, weight in distributions if probs and weight > 0]
+    total = sum(weight for _, weight in usable)
+    weights = [
+        weight / total if probs and weight > 0 and total else 0.0
+        for probs, weight in distributions
+    ]
+    if not usable:
+        return None, weights
+
+    fused = [
+        sum(weight * probs[emotion] for probs, weight in usable) / total
+        for emotion in emotions
+    ]
+    return fused, weights
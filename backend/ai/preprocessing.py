@@ -0,0 +1,216 @@
+"""
+Image preprocessing for the FER model
+Turns uploaded image bytes into normalized ResNet50 input tensors
+"""
+
+from PIL import Image
+import numpy as np
+import torch
+import io
+
+INPUT_SIZE = (224, 224)
+# Minimum decode size when the face is located first, so a face that fills
+# only part of the frame still has enough pixels after cropping
+FACE_DECODE_SIZE = (640, 480)
+# Extra context kept around a detected face box, as a fraction of its size
+FACE_MARGIN = 0.2
+MEAN = (0.485, 0.456, 0.406)  # ImageNet normalization
+STD = (0.229, 0.224, 0.225)
+
+
+def reference_transform():
+    """
+    Get the reference preprocessing pipeline (torchvision)
+
+    ResNet50 expects 224x224 RGB images normalized with ImageNet statistics.
+    decode_image below produces the same layout with far less work per frame;
+    this pipeline is kept for comparison in benchmarks/bench_preprocessing.py.
+    torchvision is imported here rather than at module level because it
+    takes longer to import than torch itself.
+
+    Returns:
+        torchvision.transforms.Compose: Resize + ToTensor + Normalize
+    """
+    import torchvision.transforms as transforms
+
+    return transforms.Compose([
+        transforms.Resize(INPUT_SIZE),  # Resize to required input size
+        transforms.ToTensor(),  # Convert PIL Image to tensor
+        transforms.Normalize(mean=list(MEAN), std=list(STD))
+    ])
+
+
+# ToTensor + Normalize folded into one affine map per channel:
+# (v / 255 - mean) / std == v * _SCALE + _BIAS
+_SCALE = (1.0 / (255.0 * np.array(STD))).astype(np.float32)[:, None, None]
+_BIAS = (-np.array(MEAN) / np.array(STD)).astype(np.float32)[:, None, None]
+
+
+def _load_resized(image_bytes):
+    """
+    Decode an image at reduced scale and resize it to the model input size
+
+    For JPEGs the decoder is put in draft mode, so it decodes directly at the
+    smallest 1/2, 1/4 or 1/8 scale that is still at least 224x224. A 1080p
+    webcam frame is decoded at 480x270 instead of 1920x1080.
+
+    Returns:
+        PIL.Image.Image: 224x224 RGB image
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.format == "JPEG":
+        image.draft("RGB", INPUT_SIZE)
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    # reducing_gap lets PIL box-reduce large non-JPEG images before resampling
+    return image.resize(INPUT_SIZE, Image.BILINEAR, reducing_gap=2.0)
+
+
+def _normalize_into(image, out=None):
+    """
+    Convert a 224x224 RGB PIL image into a normalized CHW float32 tensor
+
+    Args:
+        image: 224x224 RGB PIL image
+        out: Optional preallocated float32 tensor (3, 224, 224) to write into
+
+    Returns:
+        torch.Tensor: `out`, or a new tensor if none was given
+    """
+    pixels = np.asarray(image, dtype=np.uint8)
+
+    if out is None:
+        out = torch.empty((3,) + INPUT_SIZE, dtype=torch.float32)
+    target = out.numpy()
+
+    # uint8 HWC -> scaled float32 CHW in a single conversion pass written
+    # directly into the output buffer, then the bias is added in place
+    np.multiply(pixels.transpose(2, 0, 1), _SCALE, out=target)
+    np.add(target, _BIAS, out=target)
+
+    return out
+
+
+def decode_image(image_bytes, out=None):
+    """
+    Decode an uploaded image and apply the model preprocessing
+
+    Kept free of any model state so it can run in a worker thread or process.
+
+    Args:
+        image_bytes: Raw bytes of an encoded image (JPEG, PNG, ...)
+        out: Optional preallocated float32 tensor (3, 224, 224) to write into,
+             e.g. one row of a batch tensor
+
+    Returns:
+        torch.Tensor: Preprocessed image tensor (3, 224, 224), `out` if given
+
+    Raises:
+        PIL.UnidentifiedImageError: If the bytes are not a readable image
+    """
+    return _normalize_into(_load_resized(image_bytes), out)
+
+
+def decode_face(image_bytes, locator, session_id=None, out=None):
+    """
+    Decode an uploaded image, crop it to the patient's face and preprocess it
+
+    Falls back to the whole frame when no face is found.
+
+    Args:
+        image_bytes: Raw bytes of an encoded image (JPEG, PNG, ...)
+        locator: face_locator.FaceLocator instance
+        session_id: Optional stream id, enables box tracking across frames
+        out: Optional preallocated float32 tensor (3, 224, 224) to write into
+
+    Returns:
+        tuple: (tensor, box) where box is the (x, y, w, h) face box in
+               original image pixels, or None if the whole frame was used
+
+    Raises:
+        PIL.UnidentifiedImageError: If the bytes are not a readable image
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    original_width = image.width
+    if image.format == "JPEG":
+        image.draft("RGB", FACE_DECODE_SIZE)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+
+    box = locator.locate(np.asarray(image), session_id)
+    if box is not None:
+        x, y, w, h = box
+        pad_x, pad_y = int(w * FACE_MARGIN), int(h * FACE_MARGIN)
+        image_width, image_height = image.size
+        image = image.crop((
+            max(0, x - pad_x), max(0, y - pad_y),
+            min(image_width, x + w + pad_x), min(image_height, y + h + pad_y)
+        ))
+
+        # Report the box in the coordinates of the uploaded image
+        scale = original_width / image_width
+        box = tuple(int(round(v * scale)) for v in box)
+
+    resized = image.resize(INPUT_SIZE, Image.BILINEAR, reducing_gap=2.0)
+    return _normalize_into(resized, out), box
+
+
+def decode_batch(images):
+    """
+    Decode several images straight into one preallocated batch tensor
+
+    Args:
+        images: List of encoded image bytes
+
+    Returns:
+        tuple: (batch, errors) where batch is an (n_ok, 3, 224, 224) tensor of
+               the images that decoded and errors maps the index of each image
+               that failed to its exception
+    """
+    batch = torch.empty((len(images), 3) + INPUT_SIZE, dtype=torch.float32)
+    errors = {}
+    row = 0
+
+    for i, image_bytes in enumerate(images):
+        try:
+            decode_image(image_bytes, out=batch[row])
+            row += 1
+        except Exception as e:
+            errors[i] = e
+
+    return batch[:row], errors
+
+
+def load_calibration_batches(directory, limit=64, batch_size=16):
+    """
+    Load sample images from a directory as preprocessed batches
+
+    Used to calibrate static INT8 quantization and by the benchmarks.
+
+    Args:
+        directory: Folder containing image files
+        limit: Maximum number of images to load
+        batch_size: Number of images per returned batch
+
+    Returns:
+        list: Tensors of shape (n, 3, 224, 224)
+    """
+    from pathlib import Path
+
+    files = sorted(path for path in Path(directory).iterdir() if path.is_file())
+
+    batches = []
+    loaded = 0
+    for i in range(0, len(files), batch_size):
+        if loaded >= limit:
+            break
+        chunk = files[i:i + min(batch_size, limit - loaded)]
+        # Anything that is not a readable image is skipped
+        batch, _ = decode_batch([path.read_bytes() for path in chunk])
+        if len(batch):
+            batches.append(batch)
+            loaded += len(batch)
+
+    return batches
@@ -0,0 +1,94 @@
+"""
+Psychiatric indicator scoring shared by the FER service and the Flask backend
+Holds the indicator weights in one table and scores any number of emotion
+distributions at once, column by column
+"""
+
+import numpy as np
+
+INDICATORS = ('aggressive', 'depressed', 'anxious')
+
+# Weight of each emotion in each indicator; emotions not listed weigh nothing.
+# Terms are summed in this order, as in the original per-indicator formulas
+INDICATOR_WEIGHTS = {
+    'aggressive': {'angry': 0.7, 'disgust': 0.3},
+    'depressed': {'sad': 0.6, 'fear': 0.3, 'disgust': 0.1},
+    'anxious': {'fear': 0.8, 'surprise': 0.2},
+}
+
+# Emotion columns used when scoring dictionaries (face and voice labels)
+EMOTIONS = ('angry', 'calm', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise')
+
+# The backend stores indicators as 0-10 indices
+INDEX_SCALE = 10.0
+
+
+def score(probs, emotions):
+    """
+    Compute the indicators of a batch of emotion distributions
+
+    Scoring is float64 and adds the weighted terms in INDICATOR_WEIGHTS
+    order, so each value equals the original scalar formula bit for bit
+    (the stored indices drive the medication-recommendation thresholds).
+
+    Args:
+        probs: (n, n_emotions) probability matrix
+        emotions: Emotion label of each column of probs
+
+    Returns:
+        np.ndarray: (n, n_indicators) float64 indicators in [0, 1], columns in INDICATORS order
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    columns = {emotion: i for i, emotion in enumerate(emotions)}
+    indicators = np.zeros((len(probs), len(INDICATORS)))
+    for column, indicator in enumerate(INDICATORS):
+        for emotion, weight in INDICATOR_WEIGHTS[indicator].items():
+            if emotion in columns:
+                indicators[:, column] += probs[:, columns[emotion]] * weight
+    return indicators
+
+
+def emotion_matrix(emotion_dicts, emotions=EMOTIONS):
+    """
+    Stack emotion probability dictionaries into a matrix
+
+    Args:
+        emotion_dicts: Sequence of emotion -> probability dictionaries
+        emotions: Column order; missing emotions are 0
+
+    Returns:
+        np.ndarray: (n, len(emotions)) float64 matrix
+    """
+    matrix = np.zeros((len(emotion_dicts), len(emotions)))
+    for column, emotion in enumerate(emotions):
+        matrix[:, column] = [probs.get(emotion, 0.0) for probs in emotion_dicts]
+    return matrix
+
+
+def score_dicts(emotion_dicts):
+    """
+    Compute the 0-10 indices of a batch of emotion probability dictionaries
+
+    Args:
+        emotion_dicts: Sequence of emotion -> probability dictionaries
+
+    Returns:
+        np.ndarray: (n, n_indicators) indices in [0, INDEX_SCALE], columns in INDICATORS order
+    """
+    return score(emotion_matrix(emotion_dicts), EMOTIONS) * INDEX_SCALE
+
+
+def clinical_indices(emotions):
+    """
+    Get the depression and aggression indices stored with an emotion log
+
+    Args:
+        emotions: Emotion -> probability dictionary
+
+    Returns:
+        tuple: (depression_index, aggression_index) on the 0-10 scale
+    """
+    indices = score_dicts([emotions])[0]
+    return (float(indices[INDICATORS.index('depressed')]),
+            float(indices[INDICATORS.index('aggressive')]))
+
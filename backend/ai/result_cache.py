@@ -0,0 +1,112 @@
+"""
+Per-session result cache for the FER service
+Reuses the prediction of a recent identical frame of the same session instead of running the model again
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+
+
+def content_hash(img_tensor):
+    """
+    Compute an exact content hash of a preprocessed image
+
+    Only frames whose model input is identical pixel for pixel share a hash,
+    so a cached result is always the one the model would return. Perceptual
+    hashes are not safe here: a smiling and a frowning version of the same
+    face hash alike.
+
+    Args:
+        img_tensor: Preprocessed image tensor (3, 224, 224)
+
+    Returns:
+        bytes: 16-byte BLAKE2b digest
+    """
+    data = img_tensor.detach().cpu().contiguous().numpy()
+    return hashlib.blake2b(memoryview(data).cast("B"), digest_size=16).digest()
+
+
+class ResultCache:
+    """
+    LRU + TTL cache of prediction results keyed by session and frame hash
+
+    Entries always belong to a session id; there is no global scope, so one
+    patient's frames are never answered with another's result. Only used
+    from the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self, max_entries=1024, ttl=5.0):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Maximum number of cached results across all sessions
+            ttl: Seconds a result stays valid
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        # (session_id, hash) -> (result, stored_at), in least-recently-used order
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, frame_hash, session_id):
+        """
+        Find the cached result of an identical frame of the same session
+
+        Args:
+            frame_hash: content_hash of the frame
+            session_id: Session the frame belongs to; None never matches
+
+        Returns:
+            The cached result, or None on a miss
+        """
+        entry = self._entries.get((session_id, frame_hash)) if session_id is not None else None
+        if entry is not None and time.monotonic() - entry[1] > self.ttl:
+            del self._entries[(session_id, frame_hash)]
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end((session_id, frame_hash))
+        return entry[0]
+
+    def put(self, frame_hash, result, session_id):
+        """
+        Store the result computed for a frame
+
+        Args:
+            frame_hash: content_hash of the frame
+            result: Prediction to return for identical frames
+            session_id: Session the frame belongs to; None stores nothing
+        """
+        if session_id is None:
+            return
+        key = (session_id, frame_hash)
+        self._entries[key] = (result, time.monotonic())
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every cached result, e.g. after the model has changed"""
+        self._entries.clear()
+
+    def stats(self):
+        """Get cache statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,103 @@
+"""
+Per-connection state for streaming face-emotion analysis
+Keeps a running smoothed estimate of the emotion probabilities of one stream
+"""
+
+from collections import deque
+import time
+import uuid
+
+
+class EmotionSmoother:
+    """
+    Smooth per-frame emotion probabilities over a stream
+
+    Uses an exponential moving average by default, or the plain mean of the
+    last `window` frames when a window size is given.
+    """
+
+    def __init__(self, alpha=0.3, window=0):
+        """
+        Initialize the smoother
+
+        Args:
+            alpha: EMA weight of the newest frame (0-1]
+            window: If > 0, use a windowed mean over this many frames instead of EMA
+        """
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+
+        self.alpha = alpha
+        self.window = window
+        self.state = None
+        self._history = deque(maxlen=window) if window > 0 else None
+
+    def update(self, probs):
+        """
+        Add one frame's probabilities and get the smoothed values
+
+        Args:
+            probs: Dict of label -> probability for the newest frame
+
+        Returns:
+            dict: Smoothed label -> probability
+        """
+        if self._history is not None:
+            self._history.append(probs)
+            count = len(self._history)
+            self.state = {
+                key: sum(frame[key] for frame in self._history) / count
+                for key in probs
+            }
+        elif self.state is None:
+            self.state = dict(probs)
+        else:
+            self.state = {
+                key: self.alpha * value + (1 - self.alpha) * self.state.get(key, value)
+                for key, value in probs.items()
+            }
+        return self.state
+
+
+class StreamSession:
+    """State of one streaming connection, discarded when it disconnects"""
+
+    def __init__(self, emotions, session_id=None, alpha=0.3, window=0):
+        """
+        Initialize the session
+
+        Args:
+            emotions: Basic emotion labels used to pick the smoothed emotion
+            session_id: Optional client-supplied label of the stream
+            alpha: EMA weight of the newest frame
+            window: Windowed-mean size (0 for EMA)
+        """
+        self.session_id = session_id
+        # Server-generated key of the connection's registry entry, face
+        # tracking, gate and cache state; clients may reuse session ids
+        self.stream_id = f"stream-{uuid.uuid4().hex}"
+        self.emotions = emotions
+        self.smoother = EmotionSmoother(alpha=alpha, window=window)
+        self.started = time.monotonic()
+        self.frames_received = 0
+        self.frames_processed = 0
+        self.frames_dropped = 0
+
+    def smooth(self, emotion_probs):
+        """
+        Fold one frame into the running estimate
+
+        Args:
+            emotion_probs: Probability dict from the detector (emotions + indicators)
+
+        Returns:
+            tuple: (smoothed_emotion, smoothed_confidence, smoothed_probs)
+        """
+        smoothed = self.smoother.update(emotion_probs)
+        emotion = max(self.emotions, key=smoothed.get)
+        return emotion, smoothed[emotion], smoothed
+
+    def fps(self):
+        """Processed frames per second since the stream opened"""
+        elapsed = time.monotonic() - self.started
+        return self.frames_processed / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,239 @@
+"""
+Vectorized emotion classifier for voice features
+Scores a batch of clips with one matrix product: standardized feature
+statistics -> multinomial logistic regression -> emotion probabilities
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from voice_features import FEATURE_VERSION, N_MELS, N_MFCC, PROFILES
+
+# Order and width of each feature statistic in the flattened feature vector
+FEATURE_LAYOUT = (
+    ('mfcc_mean', N_MFCC),
+    ('mfcc_std', N_MFCC),
+    ('chroma_mean', 12),
+    ('mel_mean', N_MELS),
+    ('contrast_mean', 7),
+    ('tonnetz_mean', 6),
+)
+N_FEATURES = sum(width for _, width in FEATURE_LAYOUT)
+
+EMOTIONS = ('angry', 'calm', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise')
+
+
+def flatten_features(feature_dicts):
+    """
+    Stack per-clip feature dictionaries into one contiguous float32 matrix
+
+    Mel band powers span many orders of magnitude, so they are stored as log
+    power; all other statistics are used as they are.
+
+    Args:
+        feature_dicts: Sequence of dictionaries from FeatureEngine.compute
+
+    Returns:
+        np.ndarray: (n_clips, N_FEATURES) float32 matrix
+    """
+    matrix = np.empty((len(feature_dicts), N_FEATURES), dtype=np.float32)
+    column = 0
+    for name, width in FEATURE_LAYOUT:
+        block = matrix[:, column:column + width]
+        for row, features in enumerate(feature_dicts):
+            block[row] = features[name]
+        if name == 'mel_mean':
+            np.log(np.maximum(block, 1e-10), out=block)
+        column += width
+    return matrix
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=1, keepdims=True)
+    np.exp(logits, out=logits)
+    logits /= logits.sum(axis=1, keepdims=True)
+    return logits
+
+
+class VoiceEmotionClassifier:
+    """
+    Multinomial logistic regression over flattened voice features
+
+    The model is a handful of small arrays (feature mean and scale, weight
+    matrix, bias) stored as an .npz file, so loading is instant and scoring a
+    batch is a single (n_clips, N_FEATURES) x (N_FEATURES, n_emotions)
+    product. Scores are deterministic. The file records the feature profile
+    the model was trained on, since full and lite tonnetz values differ.
+    """
+
+    def __init__(self, mean, scale, weights, bias, emotions=EMOTIONS, feature_profile=None):
+        """
+        Initialize the classifier
+
+        Args:
+            mean: (N_FEATURES,) feature means used for standardization
+            scale: (N_FEATURES,) feature standard deviations
+            weights: (N_FEATURES, n_emotions) weight matrix
+            bias: (n_emotions,) bias vector
+            emotions: Emotion label of each output column
+            feature_profile: FeatureEngine profile of the training features
+                             (None for a model that ignores the features)
+        """
+        self.emotions = list(emotions)
+        self.feature_profile = feature_profile
+        # Standardization is folded into the weights: ((x - mean) / scale) @ W + b
+        #   == x @ (W / scale[:, None]) + (b - (mean / scale) @ W)
+        scale = np.where(np.asarray(scale) > 0, scale, 1.0)
+        self.weights = np.ascontiguousarray(weights / scale[:, None], dtype=np.float32)
+        self.bias = (bias - (mean / scale) @ weights).astype(np.float32)
+        self._mean = np.asarray(mean, dtype=np.float32)
+        self._scale = np.asarray(scale, dtype=np.float32)
+        self._raw_weights = np.asarray(weights, dtype=np.float32)
+        self._raw_bias = np.asarray(bias, dtype=np.float32)
+
+    @classmethod
+    def load(cls, path, feature_profile=None):
+        """
+        Load a classifier saved with save()
+
+        Args:
+            path: .npz file
+            feature_profile: Profile the caller will extract features with
+                             (None accepts the file's)
+
+        Raises:
+            ValueError: If the file was trained on a different feature layout
+                        or profile
+        """
+        with np.load(path) as data:
+            version = int(data['feature_version'])
+            if version != FEATURE_VERSION or data['weights'].shape[0] != N_FEATURES:
+                raise ValueError(
+                    f"{path} was trained on feature version {version} with "
+                    f"{data['weights'].shape[0]} features; expected version "
+                    f"{FEATURE_VERSION} with {N_FEATURES}"
+                )
+            # Files saved before the profile was recorded were trained with the default
+            trained_profile = str(data['feature_profile']) if 'feature_profile' in data else "full"
+            if feature_profile is not None and feature_profile != trained_profile:
+                raise ValueError(
+                    f"{path} was trained on {trained_profile} profile features; "
+                    f"they cannot be scored with {feature_profile} profile features"
+                )
+            return cls(data['mean'], data['scale'], data['weights'], data['bias'],
+                       [str(emotion) for emotion in data['emotions']], trained_profile)
+
+    @classmethod
+    def prior(cls, emotions=EMOTIONS, neutral_weight=2.0):
+        """
+        Get an uninformative classifier for when no trained model is available
+
+        It ignores the features and always returns the same distribution,
+        with `neutral` neutral_weight times as likely as each other emotion.
+        """
+        bias = np.zeros(len(emotions), dtype=np.float32)
+        if 'neutral' in emotions:
+            bias[list(emotions).index('neutral')] = np.log(neutral_weight)
+        return cls(np.zeros(N_FEATURES), np.ones(N_FEATURES),
+                   np.zeros((N_FEATURES, len(emotions))), bias, emotions)
+
+    @classmethod
+    def fit(cls, features, labels, emotions=EMOTIONS, l2=1e-3, epochs=500, learning_rate=0.5,
+            feature_profile="full"):
+        """
+        Train on a labelled feature matrix with full-batch gradient descent
+
+        Args:
+            features: (n_clips, N_FEATURES) matrix from flatten_features
+            labels: (n_clips,) index into emotions of each clip's label
+            emotions: Emotion label of each output column
+            l2: L2 regularization strength
+            epochs: Number of gradient steps
+            learning_rate: Step size
+            feature_profile: FeatureEngine profile the features were extracted with
+
+        Returns:
+            VoiceEmotionClassifier: Trained classifier
+        """
+        features = np.asarray(features, dtype=np.float64)
+        labels = np.asarray(labels)
+        mean = features.mean(axis=0)
+        scale = features.std(axis=0)
+        scale[scale == 0] = 1.0
+        x = (features - mean) / scale
+
+        n_clips, n_classes = len(x), len(emotions)
+        targets = np.zeros((n_clips, n_classes))
+        targets[np.arange(n_clips), labels] = 1.0
+
+        weights = np.zeros((x.shape[1], n_classes))
+        bias = np.zeros(n_classes)
+        for _ in range(epochs):
+            error = (_softmax(x @ weights + bias) - targets) / n_clips
+            weights -= learning_rate * (x.T @ error + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+
+        return cls(mean, scale, weights, bias, emotions, feature_profile)
+
+    def save(self, path):
+        """Save the classifier as an .npz file"""
+        partial = f"{path}.{os.getpid()}.partial"
+        with open(partial, "wb") as f:
+            np.savez(f, mean=self._mean, scale=self._scale, weights=self._raw_weights,
+                     bias=self._raw_bias, emotions=np.array(self.emotions),
+                     feature_version=np.array(FEATURE_VERSION),
+                     feature_profile=np.array(self.feature_profile or "full"))
+        os.replace(partial, path)
+
+    def predict_proba(self, features):
+        """
+        Score a batch of clips
+
+        Args:
+            features: (n_clips, N_FEATURES) matrix from flatten_features
+
+        Returns:
+            np.ndarray: (n_clips, n_emotions) float32 probabilities
+        """
+        return _softmax(features @ self.weights + self.bias)
+
+
+def _train(args):
+    """Train on a directory with one subdirectory of recordings per emotion"""
+    from voice_emotion_model import VoiceEmotionDetector
+
+    detector = VoiceEmotionDetector(feature_profile=args.feature_profile,
+                                    feature_cache_dir=args.feature_cache_dir)
+    paths, labels = [], []
+    for label, emotion in enumerate(EMOTIONS):
+        directory = os.path.join(args.data_dir, emotion)
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            paths.append(os.path.join(directory, name))
+            labels.append(label)
+    if not paths:
+        raise SystemExit(f"No recordings found under {args.data_dir}/<emotion>/")
+
+    features = [detector.extract_features(path) for path in paths]
+    usable = [i for i, f in enumerate(features) if f is not None]
+    x = flatten_features([features[i] for i in usable])
+    y = np.array([labels[i] for i in usable])
+
+    classifier = VoiceEmotionClassifier.fit(x, y, feature_profile=args.feature_profile)
+    accuracy = float((classifier.predict_proba(x).argmax(axis=1) == y).mean())
+    classifier.save(args.output)
+    print(f"Trained on {len(usable)} recordings (training accuracy {accuracy:.1%}); saved {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the voice emotion classifier")
+    parser.add_argument("data_dir", help="Directory with one subdirectory of recordings per emotion")
+    parser.add_argument("--output", default=os.path.join("models", "voice_emotion_classifier.npz"))
+    parser.add_argument("--feature-profile", default="lite", choices=PROFILES,
+                        help="Features to train on; the service extracts the same profile. "
+                             "Streaming (/ws/predict-voice) only accepts lite models")
+    parser.add_argument("--feature-cache-dir", default=None)
+    _train(parser.parse_args())
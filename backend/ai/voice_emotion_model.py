@@ -5,53 +5,142 @@ This module provides functionality to detect emotions from voice recordings
 using a pre-trained deep learning model.
 """
 
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
 import numpy as np
 import librosa
 
-# Mock implementation of a voice emotion detection model
+from feature_cache import FeatureCache, content_key
+from voice_classifier import VoiceEmotionClassifier, flatten_features
+from voice_features import FeatureEngine
+
+DEFAULT_MODEL_PATH = Path(__file__).resolve().parent / "models" / "voice_emotion_classifier.npz"
+
+SAMPLE_RATE = 22050
+# Optional lower rate: less to decode and transform, features up to 8 kHz only
+FAST_SAMPLE_RATE = 16000
+# soxr resampling, far faster than the FFT or Kaiser resamplers at similar quality
+RESAMPLE_TYPE = "soxr_hq"
+
+
+def decode_audio(audio, sr=SAMPLE_RATE):
+    """
+    Decode a recording to a mono float32 signal, entirely in memory.
+    
+    Args:
+        audio: Path to the audio file, encoded file contents (bytes), or a
+            binary file-like object (e.g. an uploaded file)
+        sr: Sample rate to resample to
+        
+    Returns:
+        Tuple of (signal, sample rate)
+    """
+    if isinstance(audio, (bytes, bytearray, memoryview)):
+        audio = io.BytesIO(audio)
+    return librosa.load(audio, sr=sr, res_type=RESAMPLE_TYPE)
+
+
 class VoiceEmotionDetector:
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, feature_profile=None, feature_cache_dir=None,
+                 feature_cache_max_mb=256, sample_rate=SAMPLE_RATE):
         """
         Initialize the voice emotion detector.
         
         Args:
-            model_path: Path to the pre-trained model weights
+            model_path: Path to the trained classifier (.npz, see
+                voice_classifier.py); defaults to models/voice_emotion_classifier.npz
+            feature_profile: "full" for the reference features, or "lite" to
+                approximate tonnetz and skip harmonic/percussive separation.
+                None uses the profile the model was trained on ("full"
+                without a model); a different one raises ValueError
+            feature_cache_dir: Directory for cached feature vectors, so
+                re-analysed recordings skip decoding (None disables caching)
+            feature_cache_max_mb: Size cap of the feature cache
+            sample_rate: Rate recordings are decoded at; FAST_SAMPLE_RATE
+                trades features above 8 kHz for faster analysis
         """
-        self.emotions = ['angry', 'calm', 'disgust', 'fear', 'happy', 'neutral', 'sad', 'surprise']
-        self.model_loaded = True
+        self.classifier, self.model_loaded = self._load_classifier(model_path, feature_profile)
+        self.emotions = self.classifier.emotions
+        feature_profile = feature_profile or self.classifier.feature_profile or "full"
+        self.feature_engine = FeatureEngine(feature_profile)
+        self.sample_rate = sample_rate
+        self.feature_cache = None
+        if feature_cache_dir:
+            self.feature_cache = FeatureCache(
+                feature_cache_dir, max_bytes=int(feature_cache_max_mb * 1024 * 1024)
+            )
+        # Recreates this detector in conversation worker processes
+        self._worker_config = {
+            "model_path": model_path,
+            "feature_profile": feature_profile,
+            "feature_cache_dir": feature_cache_dir,
+            "feature_cache_max_mb": feature_cache_max_mb,
+            "sample_rate": sample_rate,
+        }
+
+    def _load_classifier(self, model_path, feature_profile=None):
+        """
+        Load the trained classifier, or fall back to an uninformative prior
+        
+        Returns:
+            Tuple of (classifier, whether a trained model was loaded)
+        
+        Raises:
+            ValueError: If the model was trained on another feature profile
+        """
+        if model_path is None and not DEFAULT_MODEL_PATH.exists():
+            print(f"⚠ No voice emotion model at {DEFAULT_MODEL_PATH}; "
+                  f"every clip gets the same prior probabilities")
+            return VoiceEmotionClassifier.prior(), False
+        
+        classifier = VoiceEmotionClassifier.load(model_path or DEFAULT_MODEL_PATH, feature_profile)
         print("Voice emotion detection model loaded successfully")
+        return classifier, True
         
-    def extract_features(self, audio_path, sr=22050):
+    def extract_features(self, audio_path, sr=None):
         """
         Extract audio features from a voice recording.
         
         Args:
-            audio_path: Path to the audio file
-            sr: Sample rate
+            audio_path: Path to the audio file, its contents as bytes, a binary
+                file-like object, or a mono signal already decoded at sample
+                rate sr (e.g. a segment from split_recording)
+            sr: Sample rate (defaults to the detector's sample_rate)
             
         Returns:
             Dictionary of extracted features
         """
+        sr = sr or self.sample_rate
         try:
+            # Uploads are read once and decoded from memory
+            if hasattr(audio_path, "read"):
+                audio_path = audio_path.read()
+            
+            # Reuse the features of a previously analysed identical clip
+            key = None
+            if self.feature_cache is not None:
+                key = self._cache_key(audio_path, sr)
+                features = self.feature_cache.get(key)
+                if features is not None:
+                    return features
+            
             # Load audio file
-            y, sr = librosa.load(audio_path, sr=sr)
+            if isinstance(audio_path, np.ndarray):
+                y = audio_path
+            else:
+                y, sr = decode_audio(audio_path, sr)
             
-            # Extract features
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-            chroma = librosa.feature.chroma_stft(y=y, sr=sr)
-            mel = librosa.feature.melspectrogram(y=y, sr=sr)
-            contrast = librosa.feature.spectral_contrast(y=y, sr=sr)
-            tonnetz = librosa.feature.tonnetz(y=librosa.effects.harmonic(y), sr=sr)
+            # Extract features from one shared STFT
+            features = self.feature_engine.compute(y, sr)
             
-            # Compute statistics
-            features = {
-                'mfcc_mean': np.mean(mfccs, axis=1),
-                'mfcc_std': np.std(mfccs, axis=1),
-                'chroma_mean': np.mean(chroma, axis=1),
-                'mel_mean': np.mean(mel, axis=1),
-                'contrast_mean': np.mean(contrast, axis=1),
-                'tonnetz_mean': np.mean(tonnetz, axis=1)
-            }
+            if key is not None:
+                # Return what a later cache hit returns
+                features = {name: value.astype(np.float32) for name, value in features.items()}
+                self.feature_cache.put(key, features)
             
             return features
             
@@ -59,54 +148,220 @@ class VoiceEmotionDetector:
             print(f"Error extracting features: {str(e)}")
             return None
         
-    def detect_emotion(self, audio_path):
+    def _cache_key(self, audio_path, sr):
+        """Key a clip by its content and the feature settings, without decoding it"""
+        config_id = self.feature_engine.config_id(sr)
+        if isinstance(audio_path, np.ndarray):
+            return content_key(np.ascontiguousarray(audio_path).tobytes(),
+                               f"{config_id}-pcm-{audio_path.dtype}")
+        if isinstance(audio_path, (bytes, bytearray, memoryview)):
+            return content_key(audio_path, config_id)
+        with open(audio_path, "rb") as f:
+            return content_key(f.read(), config_id)
+        
+    def detect_emotion(self, audio_path, sr=None):
         """
         Detect the emotion from a voice recording.
         
         Args:
-            audio_path: Path to the audio file
+            audio_path: Path to the audio file, its contents as bytes, a binary
+                file-like object, or a mono signal at sample rate sr
+            sr: Sample rate (defaults to the detector's sample_rate)
             
         Returns:
-            Dictionary with detected emotion and confidence score
+            Dictionary with detected emotion, confidence score and the
+            probability of every emotion
         """
-        # This would normally extract features and use the model to predict
-        # For now, returning a mock result
+        return self.detect_emotions_batch([audio_path], sr)[0]
         
-        # Mock feature extraction
-        features = self.extract_features(audio_path) if audio_path else None
+    def detect_emotions_batch(self, audio_clips, sr=None):
+        """
+        Detect the emotions of many recordings, scoring them in one vectorized call.
         
-        # Mock prediction
-        # In a real implementation, this would pass the features to a neural network
-        emotion_idx = np.random.randint(0, len(self.emotions))
-        confidence = np.random.uniform(0.6, 0.95)
+        Features of every clip are flattened into one float32 matrix, so the
+        classifier runs once per batch rather than once per clip.
         
-        return {
-            "emotion": self.emotions[emotion_idx],
-            "confidence": float(confidence),
-            "features_extracted": features is not None
-        }
+        Args:
+            audio_clips: List of recordings, each in any form detect_emotion accepts
+            sr: Sample rate (defaults to the detector's sample_rate)
+            
+        Returns:
+            List of results in clip order. Clips whose features could not be
+            extracted get emotion None and empty probabilities
+        """
+        return self.classify_features([
+            self.extract_features(clip, sr) if clip is not None else None
+            for clip in audio_clips
+        ])
+        
+    def classify_features(self, feature_dicts):
+        """
+        Score already extracted features in one vectorized call.
         
-    def detect_emotions_from_conversation(self, audio_segments):
+        Args:
+            feature_dicts: List of dictionaries from extract_features (or
+                OnlineFeatureExtractor.features); None entries are skipped
+            
+        Returns:
+            List of results in input order (see detect_emotions_batch)
+        """
+        usable = [i for i, features in enumerate(feature_dicts) if features is not None]
+        
+        results = [
+            {"emotion": None, "confidence": 0.0, "emotions": {}, "features_extracted": False}
+            for _ in feature_dicts
+        ]
+        if not usable:
+            return results
+        
+        probs = self.classifier.predict_proba(flatten_features([feature_dicts[i] for i in usable]))
+        best = probs.argmax(axis=1)
+        for i, row, top in zip(usable, probs.tolist(), best.tolist()):
+            results[i] = {
+                "emotion": self.emotions[top],
+                "confidence": row[top],
+                "emotions": dict(zip(self.emotions, row)),
+                "features_extracted": True
+            }
+        return results
+        
+    def detect_emotions_from_conversation(self, audio_segments, workers=1, sr=None):
         """
         Detect emotions from a conversation by analyzing multiple audio segments.
         
         Args:
-            audio_segments: List of paths to audio segments
+            audio_segments: List of paths to audio segments, or of mono signals
+                at sample rate sr (see split_recording)
+            workers: Number of worker processes; 1 analyzes the segments here,
+                one after another, and None uses one process per CPU
+            sr: Sample rate (defaults to the detector's sample_rate)
             
         Returns:
-            List of emotions detected for each segment
+            List of emotions detected for each segment, in segment order
+        """
+        if workers == 1 or len(audio_segments) <= 1:
+            return self.detect_emotions_batch(audio_segments, sr)
+        
+        results = [None] * len(audio_segments)
+        
+        for index, emotion_result in self.iter_conversation_emotions(audio_segments, workers, sr):
+            results[index] = emotion_result
+            
+        return results
+        
+    def iter_conversation_emotions(self, audio_segments, workers=None, sr=None):
+        """
+        Analyze conversation segments in parallel, yielding each result as it finishes.
+        
+        Segments are fanned out over a process pool, so decoding and feature
+        extraction use every core. Results arrive in completion order; use
+        the index to place them. Each worker process builds its own detector
+        with this detector's feature profile and cache directory.
+        
+        Args:
+            audio_segments: List of paths to audio segments, or of mono signals
+                at sample rate sr
+            workers: Number of worker processes (None: one per CPU)
+            sr: Sample rate (defaults to the detector's sample_rate)
+            
+        Yields:
+            Tuples of (segment index, emotion result)
+        """
+        workers = min(workers or os.cpu_count() or 1, len(audio_segments))
+        if workers <= 1:
+            for index, segment in enumerate(audio_segments):
+                yield index, self.detect_emotion(segment, sr)
+            return
+        
+        # fork avoids re-importing librosa in every worker; fall back to spawn where unavailable
+        methods = multiprocessing.get_all_start_methods()
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("fork" if "fork" in methods else "spawn"),
+            initializer=_init_conversation_worker,
+            initargs=(self._worker_config,)
+        )
+        try:
+            futures = [
+                pool.submit(_detect_segment, index, segment, sr)
+                for index, segment in enumerate(audio_segments)
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # Also reached when the caller stops consuming early
+            pool.shutdown(wait=True, cancel_futures=True)
+    
+    def analyze_recording(self, audio_path, segment_seconds=10.0, workers=None, sr=None):
         """
-        results = []
+        Detect emotions over time in one long recording.
         
-        for segment in audio_segments:
-            emotion_result = self.detect_emotion(segment)
-            results.append(emotion_result)
+        The recording is decoded once and split in memory, so no pre-cut
+        segment files are needed.
+        
+        Args:
+            audio_path: Path to the audio file, its contents as bytes, or a
+                binary file-like object
+            segment_seconds: Length of each analyzed segment
+            workers: Number of worker processes (None: one per CPU)
+            sr: Sample rate (defaults to the detector's sample_rate)
             
+        Returns:
+            List of emotion results in time order, each with the segment's
+            start and end time in seconds
+        """
+        y, sr = decode_audio(audio_path, sr or self.sample_rate)
+        segments = split_recording(y, sr, segment_seconds)
+        results = self.detect_emotions_from_conversation(segments, workers, sr)
+        
+        start = 0.0
+        for segment, result in zip(segments, results):
+            result["start"] = round(start, 3)
+            start += len(segment) / sr
+            result["end"] = round(start, 3)
         return results
 
+
+def split_recording(y, sr=SAMPLE_RATE, segment_seconds=10.0, min_segment_seconds=1.0):
+    """
+    Split a decoded recording into consecutive segments without copying it.
+    
+    Args:
+        y: Mono audio signal
+        sr: Sample rate
+        segment_seconds: Length of each segment
+        min_segment_seconds: A shorter trailing remainder is merged into the
+            previous segment instead of being analyzed on its own
+        
+    Returns:
+        List of views into y
+    """
+    step = max(1, int(segment_seconds * sr))
+    bounds = list(range(0, len(y), step))
+    if len(bounds) > 1 and len(y) - bounds[-1] < min_segment_seconds * sr:
+        bounds.pop()
+    bounds.append(len(y))
+    return [y[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+# Detector of a conversation worker process, set up by _init_conversation_worker
+_worker_detector = None
+
+
+def _init_conversation_worker(config):
+    """Create the worker's detector"""
+    global _worker_detector
+    _worker_detector = VoiceEmotionDetector(**config)
+
+
+def _detect_segment(index, segment, sr):
+    """Analyze one conversation segment in a worker process"""
+    return index, _worker_detector.detect_emotion(segment, sr)
+
 # Example usage
 if __name__ == "__main__":
     detector = VoiceEmotionDetector()
-    # This would normally use a real audio file
-    result = detector.detect_emotion(None)
+    # Two seconds of a 220 Hz tone; this would normally be a real recording
+    t = np.arange(2 * SAMPLE_RATE) / SAMPLE_RATE
+    result = detector.detect_emotion(np.sin(2 * np.pi * 220 * t).astype(np.float32))
     print(f"Detected emotion: {result['emotion']} with confidence {result['confidence']:.2f}")
@@ -0,0 +1,387 @@
+"""
+Audio feature extraction for the voice emotion model
+Computes the STFT and mel power spectrogram of a clip once and derives
+every feature from those shared intermediates
+"""
+
+import copy
+import functools
+
+import numpy as np
+import librosa
+import scipy.fft
+
+# STFT and mel parameters; librosa's defaults, so features match per-feature calls
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+N_MFCC = 13
+# Bump when a change to the computation alters feature values, so cached
+# features from older code are not reused
+FEATURE_VERSION = 1
+
+PROFILES = ("full", "lite")
+# Power dB floor below the loudest frame, as in librosa.power_to_db
+TOP_DB = 80.0
+# Tuning candidates of librosa.estimate_tuning (its histogram bin edges at the
+# default resolution of 0.01); the estimate is the left edge of one bin
+TUNING_EDGES = np.linspace(-0.5, 0.5, int(np.ceil(1.0 / 0.01)) + 1)
+# Log2 bins of spectral-peak magnitudes, for the median in estimate_tuning
+PEAK_MAGNITUDE_EDGES = np.arange(-64.0, 48.0 + 1 / 16, 1 / 16)
+# librosa.feature.spectral_contrast defaults
+CONTRAST_BANDS = 6
+CONTRAST_FMIN = 200.0
+CONTRAST_QUANTILE = 0.02
+
+
+def reference_features(y, sr):
+    """
+    Extract features with one librosa call per feature (reference)
+
+    Every call below computes its own STFT of y, and tonnetz additionally
+    runs a harmonic/percussive separation (another STFT and an inverse STFT)
+    before a constant-Q transform. FeatureEngine produces the same features
+    from a single STFT; this version is kept for comparison in
+    benchmarks/bench_voice_features.py.
+
+    Args:
+        y: Mono audio signal
+        sr: Sample rate
+
+    Returns:
+        dict: Per-feature frame statistics
+    """
+    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=N_MFCC)
+    chroma = librosa.feature.chroma_stft(y=y, sr=sr)
+    mel = librosa.feature.melspectrogram(y=y, sr=sr)
+    contrast = librosa.feature.spectral_contrast(y=y, sr=sr)
+    tonnetz = librosa.feature.tonnetz(y=librosa.effects.harmonic(y), sr=sr)
+
+    return {
+        'mfcc_mean': np.mean(mfccs, axis=1),
+        'mfcc_std': np.std(mfccs, axis=1),
+        'chroma_mean': np.mean(chroma, axis=1),
+        'mel_mean': np.mean(mel, axis=1),
+        'contrast_mean': np.mean(contrast, axis=1),
+        'tonnetz_mean': np.mean(tonnetz, axis=1)
+    }
+
+
+class FeatureEngine:
+    """
+    Extract the voice model's features from one shared STFT
+
+    Profiles:
+        full: Same features as reference_features. Harmonic/percussive
+              separation is done on the shared STFT, so only the inverse
+              STFT and the constant-Q chroma for tonnetz remain extra work
+        lite: Tonnetz is projected from the STFT chroma instead, skipping
+              the separation and the constant-Q transform. Tonnetz values
+              are approximate; all other features are identical to full
+    """
+
+    def __init__(self, profile="full"):
+        """
+        Initialize the engine
+
+        Args:
+            profile: "full" or "lite"
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown feature profile '{profile}', expected one of {PROFILES}")
+        self.profile = profile
+        # Mel filter banks by sample rate; building one costs as much as a short clip's STFT
+        self._mel_bases = {}
+
+    def config_id(self, sr):
+        """Identify everything that determines the features of a clip, for cache keys"""
+        return f"v{FEATURE_VERSION}-{self.profile}-sr{sr}-fft{N_FFT}-hop{HOP_LENGTH}-mel{N_MELS}-mfcc{N_MFCC}"
+
+    def _mel_basis(self, sr):
+        basis = self._mel_bases.get(sr)
+        if basis is None:
+            basis = self._mel_bases[sr] = librosa.filters.mel(sr=sr, n_fft=N_FFT, n_mels=N_MELS)
+        return basis
+
+    def compute(self, y, sr):
+        """
+        Extract features from an audio signal
+
+        Args:
+            y: Mono audio signal
+            sr: Sample rate
+
+        Returns:
+            dict: Per-feature frame statistics (see reference_features)
+        """
+        stft = librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH)
+        magnitude = np.abs(stft)
+        power = magnitude ** 2
+        mel = self._mel_basis(sr) @ power
+
+        mfccs = librosa.feature.mfcc(S=librosa.power_to_db(mel), n_mfcc=N_MFCC)
+        chroma = librosa.feature.chroma_stft(S=power, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH)
+        contrast = librosa.feature.spectral_contrast(
+            S=magnitude, sr=sr, n_fft=N_FFT, hop_length=HOP_LENGTH
+        )
+
+        if self.profile == "full":
+            harmonic_stft, _ = librosa.decompose.hpss(stft)
+            harmonic = librosa.istft(harmonic_stft, hop_length=HOP_LENGTH, length=len(y))
+            tonnetz = librosa.feature.tonnetz(y=harmonic, sr=sr)
+        else:
+            tonnetz = librosa.feature.tonnetz(chroma=chroma)
+
+        return {
+            'mfcc_mean': np.mean(mfccs, axis=1),
+            'mfcc_std': np.std(mfccs, axis=1),
+            'chroma_mean': np.mean(chroma, axis=1),
+            'mel_mean': np.mean(mel, axis=1),
+            'contrast_mean': np.mean(contrast, axis=1),
+            'tonnetz_mean': np.mean(tonnetz, axis=1)
+        }
+
+
+class _RunningStats:
+    """Running per-row mean and variance of feature frames (Chan et al. block update)"""
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, size):
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+
+    def update(self, block):
+        """Fold in a (size, n_frames) block of frames"""
+        n = block.shape[1]
+        block_mean = block.mean(axis=1)
+        block_m2 = ((block - block_mean[:, None]) ** 2).sum(axis=1)
+
+        total = self.count + n
+        delta = block_mean - self.mean
+        self.mean += delta * (n / total)
+        self.m2 += block_m2 + delta ** 2 * (self.count * n / total)
+        self.count = total
+
+    def std(self):
+        return np.sqrt(self.m2 / self.count)
+
+
+@functools.lru_cache(maxsize=4)
+def _tuned_chroma_bases(sr):
+    """Chroma filter banks for every tuning estimate_tuning can return, stacked (shared, read-only)"""
+    bases = np.stack([
+        librosa.filters.chroma(sr=sr, n_fft=N_FFT, tuning=tuning) for tuning in TUNING_EDGES[:-1]
+    ])
+    bases.setflags(write=False)
+    return bases
+
+
+@functools.lru_cache(maxsize=4)
+def _contrast_bands(sr):
+    """(frequency bins, quantile count) of each spectral_contrast band, as librosa selects them"""
+    freq = librosa.fft_frequencies(sr=sr, n_fft=N_FFT)
+    octa = np.zeros(CONTRAST_BANDS + 2)
+    octa[1:] = CONTRAST_FMIN * (2.0 ** np.arange(0, CONTRAST_BANDS + 1))
+
+    bands = []
+    for k, (f_low, f_high) in enumerate(zip(octa[:-1], octa[1:])):
+        current_band = np.logical_and(freq >= f_low, freq <= f_high)
+        idx = np.flatnonzero(current_band)
+        if k > 0:
+            current_band[idx[0] - 1] = True
+        if k == CONTRAST_BANDS:
+            current_band[idx[-1] + 1:] = True
+        rows = np.flatnonzero(current_band)
+        if k < CONTRAST_BANDS:
+            rows = rows[:-1]
+        count = int(np.maximum(np.rint(CONTRAST_QUANTILE * np.sum(current_band)), 1))
+        bands.append((rows, count))
+    return tuple(bands)
+
+
+class _OnlineState:
+    """Running statistics of the frames an OnlineFeatureExtractor has seen"""
+
+    def __init__(self):
+        # Loudest mel, contrast-peak and contrast-valley levels so far, for the dB floors
+        self.db_max = -np.inf
+        self.peak_db_max = -np.inf
+        self.valley_db_max = -np.inf
+        self.stats = {
+            'mfcc': _RunningStats(N_MFCC),
+            'mel': _RunningStats(N_MELS),
+            'contrast': _RunningStats(CONTRAST_BANDS + 1),
+        }
+        # Chroma and tonnetz sums under every candidate tuning
+        self.chroma_sum = np.zeros((len(TUNING_EDGES) - 1, 12))
+        self.tonnetz_sum = np.zeros((len(TUNING_EDGES) - 1, 6))
+        # Spectral peaks by (log2 magnitude bin, tuning bin)
+        self.peaks = np.zeros((len(PEAK_MAGNITUDE_EDGES) - 1, len(TUNING_EDGES) - 1), dtype=np.int32)
+
+    def copy(self):
+        state = copy.copy(self)
+        state.stats = {name: copy.deepcopy(stats) for name, stats in self.stats.items()}
+        state.chroma_sum = self.chroma_sum.copy()
+        state.tonnetz_sum = self.tonnetz_sum.copy()
+        state.peaks = self.peaks.copy()
+        return state
+
+
+class OnlineFeatureExtractor:
+    """
+    Incremental version of the lite feature profile for streamed audio
+
+    Audio is fed in chunks of any size. Each complete STFT frame is turned
+    into MFCC, chroma, mel, spectral contrast and tonnetz columns and folded
+    into running statistics; only the samples of the next incomplete frame
+    are kept. features() can be called at any point and costs the same
+    however long the stream is.
+
+    Frames are centered like librosa.stft's (half a frame of zeros before
+    the first sample and after the last), and chroma is accumulated under
+    every tuning librosa.estimate_tuning can return, with the spectral peaks
+    it estimates the tuning from kept as a histogram. Mel, chroma and tonnetz
+    therefore match FeatureEngine("lite") on the whole clip to float
+    precision. The MFCC and spectral contrast dB floors (80 dB below the
+    loudest level) follow the loudest frame so far instead of the loudest of
+    the clip, so those drift until the clip's peak level is reached: up to
+    about 0.5% (MFCC means, contrast) and 3% (MFCC deviations) on steady
+    speech, and 15% (means) and 50% (deviations) on a clip fading in over
+    40 dB. benchmarks/bench_voice_features.py --online checks these bounds.
+    """
+
+    def __init__(self, sr=22050):
+        """
+        Initialize the extractor
+
+        Args:
+            sr: Sample rate of the audio that will be fed in
+        """
+        self.sr = sr
+        self._window = librosa.filters.get_window("hann", N_FFT, fftbins=True).astype(np.float32)
+        self._mel_basis = librosa.filters.mel(sr=sr, n_fft=N_FFT, n_mels=N_MELS)
+        self._chroma_bases = _tuned_chroma_bases(sr)
+
+        # Centered frames: the stream starts with half a frame of zeros
+        self._pending = np.zeros(N_FFT // 2, dtype=np.float32)
+        self._state = _OnlineState()
+        self.samples = 0
+
+    @property
+    def frames(self):
+        """Number of STFT frames folded into the statistics"""
+        return self._state.stats['mel'].count
+
+    @property
+    def seconds(self):
+        """Duration of the audio fed in so far"""
+        return self.samples / self.sr
+
+    def update(self, samples):
+        """
+        Feed the next chunk of audio
+
+        Args:
+            samples: Mono float samples at the extractor's sample rate
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        self.samples += len(samples)
+        buffer = np.concatenate([self._pending, samples])
+        if len(buffer) < N_FFT:
+            self._pending = buffer
+            return
+
+        n_frames = 1 + (len(buffer) - N_FFT) // HOP_LENGTH
+        # Samples not yet covered by a complete frame start where the next frame starts
+        self._pending = buffer[n_frames * HOP_LENGTH:].copy()
+        self._fold(buffer, n_frames, self._state)
+
+    def _fold(self, buffer, n_frames, state):
+        """Fold the first n_frames frames of buffer into state"""
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, N_FFT)[::HOP_LENGTH][:n_frames]
+        power = (np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2).T.astype(np.float32)
+        mel = self._mel_basis @ power
+
+        db = 10.0 * np.log10(np.maximum(mel, 1e-10))
+        state.db_max = max(state.db_max, float(db.max()))
+        np.maximum(db, state.db_max - TOP_DB, out=db)
+        mfcc = scipy.fft.dct(db, axis=0, type=2, norm="ortho")[:N_MFCC]
+
+        # spectral_contrast, with its dB floors held across chunks like the MFCC one
+        magnitude = np.sqrt(power)
+        peak = np.empty((CONTRAST_BANDS + 1, n_frames))
+        valley = np.empty_like(peak)
+        for k, (rows, count) in enumerate(_contrast_bands(self.sr)):
+            ordered = np.sort(magnitude[rows], axis=0)
+            valley[k] = ordered[:count].mean(axis=0)
+            peak[k] = ordered[-count:].mean(axis=0)
+        peak_db = 10.0 * np.log10(np.maximum(peak, 1e-10))
+        valley_db = 10.0 * np.log10(np.maximum(valley, 1e-10))
+        state.peak_db_max = max(state.peak_db_max, float(peak_db.max()))
+        state.valley_db_max = max(state.valley_db_max, float(valley_db.max()))
+        contrast = (np.maximum(peak_db, state.peak_db_max - TOP_DB)
+                    - np.maximum(valley_db, state.valley_db_max - TOP_DB))
+
+        state.stats['mfcc'].update(mfcc)
+        state.stats['mel'].update(mel)
+        state.stats['contrast'].update(contrast)
+
+        # (n_tunings, 12, n_frames) chroma under every candidate tuning
+        chroma = librosa.util.normalize(self._chroma_bases @ power, norm=np.inf, axis=-2)
+        state.chroma_sum += chroma.sum(axis=-1)
+        state.tonnetz_sum += librosa.feature.tonnetz(chroma=chroma).sum(axis=-1)
+
+        # Spectral peaks as in librosa.estimate_tuning(S=power)
+        pitch, magnitude = librosa.piptrack(S=power, sr=self.sr, n_fft=N_FFT)
+        found = pitch > 0
+        residual = np.mod(12 * librosa.hz_to_octs(pitch[found]), 1.0)
+        residual[residual >= 0.5] -= 1.0
+        log_magnitude = np.log2(np.maximum(magnitude[found], 2.0 ** PEAK_MAGNITUDE_EDGES[0]))
+        log_magnitude = np.minimum(log_magnitude, PEAK_MAGNITUDE_EDGES[-1])
+        state.peaks += np.histogram2d(
+            log_magnitude, residual, bins=[PEAK_MAGNITUDE_EDGES, TUNING_EDGES]
+        )[0].astype(np.int32)
+
+    @staticmethod
+    def _tuning_index(peaks):
+        """Index into TUNING_EDGES of the tuning estimate_tuning would return"""
+        by_magnitude = peaks.sum(axis=1)
+        total = by_magnitude.sum()
+        if not total:
+            # No pitched frames: estimate_tuning returns 0.0
+            return int(np.argmin(np.abs(TUNING_EDGES)))
+        # Peaks at or above the median magnitude (the median's bin is included whole)
+        median_bin = int(np.searchsorted(np.cumsum(by_magnitude), total / 2))
+        return int(np.argmax(peaks[median_bin:].sum(axis=0)))
+
+    def features(self):
+        """
+        Get the statistics of everything fed in so far
+
+        Returns:
+            dict: Same layout as FeatureEngine.compute, or None before the
+            first complete frame
+        """
+        if not self.samples:
+            return None
+
+        # Frames overlapping the end of the stream, padded with zeros as if it ended here
+        state = self._state.copy()
+        tail = np.concatenate([self._pending, np.zeros(N_FFT // 2, dtype=np.float32)])
+        if len(tail) >= N_FFT:
+            self._fold(tail, 1 + (len(tail) - N_FFT) // HOP_LENGTH, state)
+        if not state.stats['mel'].count:
+            return None
+
+        tuning = self._tuning_index(state.peaks)
+        count = state.stats['mel'].count
+        return {
+            'mfcc_mean': state.stats['mfcc'].mean.copy(),
+            'mfcc_std': state.stats['mfcc'].std(),
+            'chroma_mean': state.chroma_sum[tuning] / count,
+            'mel_mean': state.stats['mel'].mean.copy(),
+            'contrast_mean': state.stats['contrast'].mean.copy(),
+            'tonnetz_mean': state.tonnetz_sum[tuning] / count
+        }
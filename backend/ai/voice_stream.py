@@ -0,0 +1,98 @@
+"""
+Per-connection state for streaming voice-emotion analysis
+Folds raw PCM chunks into running feature statistics as they arrive, so an
+emotion estimate is available at any point without keeping the recording
+"""
+
+import time
+import uuid
+
+import numpy as np
+import soxr
+
+from voice_features import OnlineFeatureExtractor
+
+# Accepted PCM sample formats -> numpy dtype (little-endian, mono)
+SAMPLE_FORMATS = {"f32": np.dtype("<f4"), "s16": np.dtype("<i2")}
+
+
+class VoiceStreamSession:
+    """State of one streaming voice connection, discarded when it disconnects"""
+
+    def __init__(self, detector, sample_rate=16000, sample_format="f32", session_id=None):
+        """
+        Initialize the session
+
+        Args:
+            detector: VoiceEmotionDetector used to score the running features
+            sample_rate: Sample rate of the incoming PCM
+            sample_format: "f32" (float32) or "s16" (16-bit integer) samples
+            session_id: Id reported back to the client (a random one is
+                        generated if not given)
+
+        Raises:
+            ValueError: For an unsupported sample rate or format, or a
+                        detector whose model was not trained on lite features
+        """
+        # OnlineFeatureExtractor computes the lite profile
+        if detector.classifier.feature_profile not in (None, "lite"):
+            raise ValueError(
+                f"The voice model was trained on {detector.classifier.feature_profile} "
+                f"profile features; streaming requires a model trained with --feature-profile lite"
+            )
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(
+                f"Unsupported sample format '{sample_format}', expected one of {list(SAMPLE_FORMATS)}"
+            )
+        if not 8000 <= sample_rate <= 192000:
+            raise ValueError("sample_rate must be between 8000 and 192000")
+
+        self.session_id = session_id or f"voice-{uuid.uuid4().hex}"
+        # Server-generated registry key; clients may reuse session ids
+        self.stream_id = f"voice-{uuid.uuid4().hex}"
+        self.detector = detector
+        self.dtype = SAMPLE_FORMATS[sample_format]
+        self.extractor = OnlineFeatureExtractor(detector.sample_rate)
+        # soxr keeps filter state between chunks, so chunk boundaries are seamless
+        self._resampler = None
+        if sample_rate != detector.sample_rate:
+            self._resampler = soxr.ResampleStream(
+                sample_rate, detector.sample_rate, 1, dtype="float32"
+            )
+        # Bytes of a sample split across two messages
+        self._partial = b""
+        self.started = time.monotonic()
+        self.chunks_received = 0
+
+    def add_chunk(self, data, last=False):
+        """
+        Decode, resample and fold in one chunk of PCM
+
+        Args:
+            data: Raw PCM bytes in the session's sample format
+            last: True for the final chunk, to flush the resampler
+        """
+        data = self._partial + data
+        usable = len(data) - len(data) % self.dtype.itemsize
+        self._partial = data[usable:]
+
+        samples = np.frombuffer(data[:usable], dtype=self.dtype)
+        if self.dtype.kind == "i":
+            samples = samples.astype(np.float32) / 32768.0
+        else:
+            samples = samples.astype(np.float32, copy=False)
+
+        if self._resampler is not None:
+            samples = self._resampler.resample_chunk(samples, last=last)
+        if len(samples):
+            self.extractor.update(samples)
+
+    def estimate(self):
+        """
+        Score everything received so far
+
+        Returns:
+            dict: Emotion result (see VoiceEmotionDetector.detect_emotions_batch);
+            emotion is None until the first complete analysis frame
+        """
+        return self.detector.classify_features([self.extractor.features()])[0]
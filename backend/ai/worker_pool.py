@@ -0,0 +1,143 @@
+"""
+Pre-fork multi-process serving mode for the FER service
+Loads the model once in the parent and forks workers that share its weights
+"""
+
+import gc
+import os
+import signal
+import socket
+import time
+
+
+def threads_per_worker(workers, requested=None):
+    """
+    Get the number of torch intra-op threads each worker should use
+
+    Args:
+        workers: Number of worker processes
+        requested: Explicit thread count (None or 0 splits the cores evenly)
+
+    Returns:
+        int: Threads per worker, at least 1
+    """
+    if requested:
+        return max(1, requested)
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _bind_socket(host, port, backlog=2048):
+    """Create the listening socket shared by all workers"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock, torch_threads, log_level):
+    """Body of a forked worker: pin torch threads and serve on the shared socket"""
+    import torch
+    import uvicorn
+
+    torch.set_num_threads(torch_threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Already fixed for this process
+        pass
+
+    # Let the worker handle signals itself instead of inheriting the parent's handlers
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+    config = uvicorn.Config(app, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def serve_prefork(app, model, host="0.0.0.0", port=8000, workers=2,
+                  torch_threads=None, log_level="info"):
+    """
+    Serve `app` from several forked worker processes sharing one copy of the model
+
+    The model must already be loaded in this process. Its tensors are moved
+    to shared memory and the garbage collector is frozen so that forked
+    workers read the same physical weight pages instead of copying them.
+    No forward pass may run in the parent before forking, otherwise torch
+    cannot reconfigure the intra-op thread pool in the children.
+
+    Crashed workers are restarted; SIGINT/SIGTERM stop all workers.
+
+    Args:
+        app: ASGI application to serve
+        model: torch.nn.Module shared by the workers (may be None)
+        host: Interface to bind
+        port: Port to bind
+        workers: Number of worker processes
+        torch_threads: Intra-op threads per worker (default: cores / workers)
+        log_level: uvicorn log level
+    """
+    if not hasattr(os, "fork"):
+        raise RuntimeError("Multi-process serving requires os.fork (not available on this platform)")
+
+    if model is not None:
+        # Explicitly shared, read-only weights: one physical copy for every worker
+        model.share_memory()
+
+    # Objects created so far are never collected, so the GC does not write
+    # to their pages and trigger copy-on-write in the children
+    gc.collect()
+    gc.freeze()
+
+    threads = threads_per_worker(workers, torch_threads)
+    sock = _bind_socket(host, port)
+    print(f"Starting {workers} FER workers on {host}:{port} "
+          f"({threads} torch thread(s) each, model shared from pid {os.getpid()})")
+
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _run_worker(app, sock, threads, log_level)
+            finally:
+                os._exit(0)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+
+        print(f"FER worker {pid} exited with status {status}; restarting")
+        # Avoid a tight restart loop when workers die immediately
+        if time.monotonic() - started < 1.0:
+            time.sleep(1.0)
+        spawn()
+
+    sock.close()
@@ -13,6 +13,9 @@ import numpy as np
 import cv2
 import datetime
 import logging
+import sqlite3
+import tempfile
+from werkzeug.exceptions import BadRequest, HTTPException, RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 
 # Import custom modules
@@ -24,6 +27,10 @@ from patient_mode.face_detector import analyze_face_emotion
 from patient_mode.voice_analyzer import analyze_voice_emotion
 from doctor_mode.recommend_engine import MedicineRecommender
 from chatbot.rule_engine import RuleBasedChatbot
+from ai.psychiatric_scoring import clinical_indices, emotion_matrix
+import app_metrics
+from mood_rollup import MoodRollup
+from app_metrics import time_stage
 
 # Configure logging
 logging.basicConfig(
@@ -39,16 +46,40 @@ logger = logging.getLogger(__name__)
 # Initialize Flask app
 app = Flask(__name__, static_folder='build')
 CORS(app)  # Enable CORS for all routes
+app_metrics.init_app(app)  # Request metrics, served at /metrics
 
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Largest request body accepted; Flask rejects bigger ones with 413 before reading them
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_UPLOAD_MB', 32)) * 1024 * 1024
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    limit_mb = app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)
+    return jsonify({'success': False, 'message': f'Request body larger than {limit_mb} MB'}), 413
 
 # Initialize database
 initialize_database()
 
+# Daily mood rollups, kept in the emotion-log database and updated by triggers on
+# the log table in the same transaction as each EmotionLog.add_log
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+EMOTION_DB = os.environ.get(
+    'EMOTION_DB', os.path.join(BACKEND_DIR, 'database', 'emotion_recognition.db')
+)
+EMOTION_LOG_TABLE = os.environ.get('EMOTION_LOG_TABLE', 'emotion_logs')
+mood_rollup = None
+
+def _get_mood_rollup():
+    """Open the mood rollup on first use, so a missing log database only affects /mood"""
+    global mood_rollup
+    if mood_rollup is None:
+        mood_rollup = MoodRollup(EMOTION_DB, EMOTION_LOG_TABLE)
+    return mood_rollup
+
 # Initialize medicine recommender
 medicine_recommender = MedicineRecommender()
 
@@ -148,98 +179,178 @@ def add_patient():
     else:
         return jsonify({'success': False, 'message': 'Failed to add patient'}), 500
 
+# Most frames accepted in one /api/analyze/face request
+MAX_FACE_FRAMES = int(os.environ.get('MAX_FACE_FRAMES', 16))
+
+def _read_into_array(stream, size):
+    """Read up to `size` bytes of a stream straight into a new uint8 array"""
+    buffer = np.empty(size, dtype=np.uint8)
+    view = memoryview(buffer)
+    filled = 0
+    while filled < size:
+        count = stream.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+    return buffer[:filled]
+
+def _decode_image(buffer):
+    """Decode an encoded image held in a uint8 array, or None if it is not one"""
+    if not len(buffer):
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+def _read_face_frames():
+    """
+    Decode the frames of a face analysis request
+    
+    Accepts a raw image body (image/* or application/octet-stream, with
+    patient_id in the query string), a multipart upload with one or more
+    `image` files, or a JSON body with a base64 `image` (or an `images` list).
+    Raw bodies and uploads are read straight into the array that is decoded.
+    At most MAX_FACE_FRAMES + 1 frames are decoded, enough to reject a larger batch.
+    
+    Returns:
+        tuple: (list of decoded images, None where decoding failed; patient_id)
+    """
+    mimetype = request.mimetype
+    if mimetype.startswith('image/') or mimetype == 'application/octet-stream':
+        if request.content_length is None:
+            buffer = np.frombuffer(request.get_data(cache=False), np.uint8)
+        else:
+            # The length is client-controlled; check it before allocating the buffer
+            if request.content_length > app.config['MAX_CONTENT_LENGTH']:
+                raise RequestEntityTooLarge()
+            buffer = _read_into_array(request.stream, request.content_length)
+        return [_decode_image(buffer)], request.args.get('patient_id')
+    
+    if mimetype == 'multipart/form-data':
+        images = []
+        for upload in request.files.getlist('image')[:MAX_FACE_FRAMES + 1]:
+            size = upload.stream.seek(0, os.SEEK_END)
+            upload.stream.seek(0)
+            images.append(_decode_image(_read_into_array(upload.stream, size)))
+        return images, request.form.get('patient_id')
+    
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    elif not isinstance(data, dict):
+        raise BadRequest('JSON body must be an object')
+    encoded = data.get('images') or ([data['image']] if data.get('image') else [])
+    if not isinstance(encoded, list) or not all(isinstance(item, str) for item in encoded):
+        raise BadRequest('image must be a base64-encoded image and images a list of them')
+    images = []
+    for image_data in encoded[:MAX_FACE_FRAMES + 1]:
+        image_data = image_data.split(',')[1] if ',' in image_data else image_data
+        images.append(_decode_image(np.frombuffer(base64.b64decode(image_data), np.uint8)))
+    return images, data.get('patient_id')
+
 # Face emotion analysis
 @app.route('/api/analyze/face', methods=['POST'])
 def analyze_face():
     try:
-        data = request.json
-        image_data = data.get('image')
-        patient_id = data.get('patient_id')
+        with time_stage('/api/analyze/face', 'decode'):
+            images, patient_id = _read_face_frames()
         
-        if not image_data:
+        if not images:
             return jsonify({'success': False, 'message': 'No image data provided'}), 400
-        
-        # Decode base64 image
-        image_data = image_data.split(',')[1] if ',' in image_data else image_data
-        image_bytes = base64.b64decode(image_data)
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if len(images) > MAX_FACE_FRAMES:
+            return jsonify({
+                'success': False,
+                'message': f'At most {MAX_FACE_FRAMES} frames per request'
+            }), 400
         
         # Analyze face emotion
-        result = analyze_face_emotion(img)
+        with time_stage('/api/analyze/face', 'analyze'):
+            frame_results = [analyze_face_emotion(img) if img is not None else None
+                             for img in images]
         
-        if not result:
+        detected = [frame for frame in frame_results if frame]
+        if not detected:
             return jsonify({'success': False, 'message': 'No face detected'}), 400
         
+        if len(images) == 1:
+            result = detected[0]
+        else:
+            # A batch is one check-in: average the frames in which a face was found
+            labels = list(detected[0]['emotions'])
+            mean = emotion_matrix([frame['emotions'] for frame in detected], labels).mean(axis=0)
+            result = {
+                'emotions': dict(zip(labels, mean.tolist())),
+                'frames': frame_results,
+                'faces_detected': len(detected)
+            }
+        
         # Calculate depression and aggression indices
         emotions = result['emotions']
-        depression_index = (emotions.get('sad', 0) * 0.6 + 
-                           emotions.get('fear', 0) * 0.3 + 
-                           emotions.get('disgust', 0) * 0.1) * 10
-        
-        aggression_index = (emotions.get('angry', 0) * 0.7 + 
-                           emotions.get('disgust', 0) * 0.3) * 10
+        depression_index, aggression_index = clinical_indices(emotions)
         
         # Save to database if patient_id provided
         if patient_id:
-            timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            log_id = EmotionLog.add_log(
-                patient_id, 
-                timestamp, 
-                json.dumps(emotions), 
-                depression_index, 
-                aggression_index, 
-                'face'
-            )
+            with time_stage('/api/analyze/face', 'store'):
+                timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                log_id = EmotionLog.add_log(
+                    patient_id, 
+                    timestamp, 
+                    json.dumps(emotions), 
+                    depression_index, 
+                    aggression_index, 
+                    'face'
+                )
             
-            # Get medicine recommendations
-            depression_rec = None
-            aggression_rec = None
+                # Get medicine recommendations
+                depression_rec = None
+                aggression_rec = None
             
-            if depression_index > 3:
-                depression_rec = medicine_recommender.recommend_for_depression(depression_index)
+                if depression_index > 3:
+                    depression_rec = medicine_recommender.recommend_for_depression(depression_index)
             
-            if aggression_index > 3:
-                aggression_rec = medicine_recommender.recommend_for_aggression(aggression_index)
+                if aggression_index > 3:
+                    aggression_rec = medicine_recommender.recommend_for_aggression(aggression_index)
             
-            # Combine recommendations
-            recommendations = []
-            if depression_rec and depression_rec[0]:
-                recommendations.append({
-                    'type': 'depression',
-                    'medicine': depression_rec[0],
-                    'dosage': depression_rec[1],
-                    'notes': depression_rec[2]
-                })
+                # Combine recommendations
+                recommendations = []
+                if depression_rec and depression_rec[0]:
+                    recommendations.append({
+                        'type': 'depression',
+                        'medicine': depression_rec[0],
+                        'dosage': depression_rec[1],
+                        'notes': depression_rec[2]
+                    })
             
-            if aggression_rec and aggression_rec[0]:
-                recommendations.append({
-                    'type': 'aggression',
-                    'medicine': aggression_rec[0],
-                    'dosage': aggression_rec[1],
-                    'notes': aggression_rec[2]
-                })
+                if aggression_rec and aggression_rec[0]:
+                    recommendations.append({
+                        'type': 'aggression',
+                        'medicine': aggression_rec[0],
+                        'dosage': aggression_rec[1],
+                        'notes': aggression_rec[2]
+                    })
             
-            # Save recommendations to database
-            for rec in recommendations:
-                MedicineRecommendation.add_recommendation(
-                    patient_id,
-                    timestamp,
-                    rec['medicine'],
-                    rec['dosage'],
-                    rec['notes'],
-                    rec['type']
-                )
+                # Save recommendations to database
+                for rec in recommendations:
+                    MedicineRecommendation.add_recommendation(
+                        patient_id,
+                        timestamp,
+                        rec['medicine'],
+                        rec['dosage'],
+                        rec['notes'],
+                        rec['type']
+                    )
             
-            result['log_id'] = log_id
-            result['recommendations'] = recommendations
+                result['log_id'] = log_id
+                result['recommendations'] = recommendations
         
         result['depression_index'] = round(depression_index, 2)
         result['aggression_index'] = round(aggression_index, 2)
         result['success'] = True
         
-        return jsonify(result)
+        with time_stage('/api/analyze/face', 'serialize'):
+            response = jsonify(result)
+        return response
     
+    except HTTPException as e:
+        return jsonify({'success': False, 'message': e.description}), e.code
     except Exception as e:
         logger.error(f"Error in face analysis: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -257,49 +368,55 @@ def analyze_voice():
         if audio_file.filename == '':
             return jsonify({'success': False, 'message': 'No audio file selected'}), 400
         
-        # Save audio file temporarily
-        filename = secure_filename(audio_file.filename)
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        audio_file.save(file_path)
+        # Save audio file temporarily; analyze_voice_emotion takes a path.
+        # The name is unique per request, so concurrent uploads of files with
+        # the same name cannot overwrite each other
+        with time_stage('/api/analyze/voice', 'save'):
+            extension = os.path.splitext(secure_filename(audio_file.filename))[1]
+            fd, file_path = tempfile.mkstemp(suffix=extension, dir=app.config['UPLOAD_FOLDER'])
+            with os.fdopen(fd, 'wb') as f:
+                audio_file.save(f)
         
         # Analyze voice emotion
-        result = analyze_voice_emotion(file_path)
-        
-        # Remove temporary file
-        os.remove(file_path)
+        try:
+            with time_stage('/api/analyze/voice', 'analyze'):
+                result = analyze_voice_emotion(file_path)
+        finally:
+            # Remove temporary file
+            os.remove(file_path)
         
         if not result:
             return jsonify({'success': False, 'message': 'Failed to analyze audio'}), 400
         
         # Calculate depression and aggression indices
         emotions = result['emotions']
-        depression_index = (emotions.get('sad', 0) * 0.6 + 
-                           emotions.get('fear', 0) * 0.3 + 
-                           emotions.get('disgust', 0) * 0.1) * 10
-        
-        aggression_index = (emotions.get('angry', 0) * 0.7 + 
-                           emotions.get('disgust', 0) * 0.3) * 10
+        depression_index, aggression_index = clinical_indices(emotions)
         
         # Save to database if patient_id provided
         if patient_id:
-            timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            log_id = EmotionLog.add_log(
-                patient_id, 
-                timestamp, 
-                json.dumps(emotions), 
-                depression_index, 
-                aggression_index, 
-                'voice'
-            )
+            with time_stage('/api/analyze/voice', 'store'):
+                timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                log_id = EmotionLog.add_log(
+                    patient_id, 
+                    timestamp, 
+                    json.dumps(emotions), 
+                    depression_index, 
+                    aggression_index, 
+                    'voice'
+                )
             
-            result['log_id'] = log_id
+                result['log_id'] = log_id
         
         result['depression_index'] = round(depression_index, 2)
         result['aggression_index'] = round(aggression_index, 2)
         result['success'] = True
         
-        return jsonify(result)
+        with time_stage('/api/analyze/voice', 'serialize'):
+            response = jsonify(result)
+        return response
     
+    except HTTPException as e:
+        return jsonify({'success': False, 'message': e.description}), e.code
     except Exception as e:
         logger.error(f"Error in voice analysis: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -375,6 +492,8 @@ def add_report():
         else:
             return jsonify({'success': False, 'message': 'Failed to add report'}), 500
     
+    except HTTPException as e:
+        return jsonify({'success': False, 'message': e.description}), e.code
     except Exception as e:
         logger.error(f"Error adding report: {str(e)}")
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -405,50 +524,41 @@ def chat():
         'timestamp': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     })
 
+# Emotions charted by the mood view
+MOOD_EMOTIONS = ('happy', 'sad', 'angry', 'fear', 'disgust', 'surprise', 'neutral')
+
 # Get mood visualization data
 @app.route('/api/patient/<int:patient_id>/mood', methods=['GET'])
 def get_mood_data(patient_id):
     days = request.args.get('days', default=7, type=int)
     
-    # Get logs for the specified number of days
-    logs = EmotionLog.get_logs_for_patient_by_days(patient_id, days)
+    try:
+        rollup = _get_mood_rollup()
+    except (sqlite3.Error, ValueError) as e:
+        logger.error(f"Mood rollup unavailable: {str(e)}")
+        return jsonify({'success': False, 'message': 'Mood data is unavailable'}), 503
     
-    if not logs:
+    # The last `days` calendar days, today included
+    daily = rollup.daily(patient_id, days)
+    if not daily:
         return jsonify({'success': True, 'data': []})
     
-    # Process data for visualization
-    dates = []
-    depression_values = []
-    aggression_values = []
-    emotions_data = []
-    
-    for log in logs:
-        date = log['timestamp'].split(' ')[0]
-        if date not in dates:
-            dates.append(date)
-            depression_values.append(log['depression_index'])
-            aggression_values.append(log['aggression_index'])
-            
-            # Parse emotions JSON
-            emotions = json.loads(log['emotions'])
-            emotions_data.append({
-                'date': date,
-                'happy': emotions.get('happy', 0),
-                'sad': emotions.get('sad', 0),
-                'angry': emotions.get('angry', 0),
-                'fear': emotions.get('fear', 0),
-                'disgust': emotions.get('disgust', 0),
-                'surprise': emotions.get('surprise', 0),
-                'neutral': emotions.get('neutral', 0)
-            })
-    
+    # One aggregated entry per day: means, with min and max of the indices
     return jsonify({
         'success': True,
         'data': {
-            'dates': dates,
-            'depression': depression_values,
-            'aggression': aggression_values,
-            'emotions': emotions_data
+            'dates': [day['day'] for day in daily],
+            'counts': [day['count'] for day in daily],
+            'depression': [day['depression']['mean'] for day in daily],
+            'depression_min': [day['depression']['min'] for day in daily],
+            'depression_max': [day['depression']['max'] for day in daily],
+            'aggression': [day['aggression']['mean'] for day in daily],
+            'aggression_min': [day['aggression']['min'] for day in daily],
+            'aggression_max': [day['aggression']['max'] for day in daily],
+            'emotions': [
+                {'date': day['day'], **{emotion: day[emotion]['mean'] for emotion in MOOD_EMOTIONS}}
+                for day in daily
+            ]
         }
     })
 
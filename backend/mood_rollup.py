@@ -0,0 +1,239 @@
+"""
+Per-patient daily rollups of emotion logs
+Keeps count, sum, min and max of each index and emotion per patient and day
+in the emotion-log database itself, maintained by triggers on the log table,
+so mood charts read one row per day
+"""
+
+import datetime
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+from ai.psychiatric_scoring import EMOTIONS
+
+# Aggregated values of each log: the stored indices, then each emotion probability
+METRICS = ('depression', 'aggression') + EMOTIONS
+
+# Columns of the log table the rollup reads (those written by EmotionLog.add_log)
+LOG_COLUMNS = ('patient_id', 'timestamp', 'emotions', 'depression_index', 'aggression_index')
+
+_AGGREGATES = ', '.join(f'{m}_sum REAL, {m}_min REAL, {m}_max REAL' for m in METRICS)
+_COLUMNS = ', '.join(f'{m}_{stat}' for m in METRICS for stat in ('sum', 'min', 'max'))
+_MERGE = ', '.join(
+    f'{m}_sum = {m}_sum + excluded.{m}_sum, '
+    f'{m}_min = MIN({m}_min, excluded.{m}_min), '
+    f'{m}_max = MAX({m}_max, excluded.{m}_max)'
+    for m in METRICS
+)
+
+
+def _day(row):
+    """SQL for the YYYY-MM-DD day of a log ('%Y-%m-%d %H:%M:%S' timestamps)"""
+    return f'substr({row}timestamp, 1, 10)'
+
+
+def _scored(row):
+    """SQL condition for logs with both indices; others are left out of the rollup"""
+    return f'{row}depression_index IS NOT NULL AND {row}aggression_index IS NOT NULL'
+
+
+def _values(row):
+    """SQL for each entry of METRICS of a log; missing or unparsable emotions are 0"""
+    emotions = [
+        f"COALESCE(CASE WHEN json_valid({row}emotions) "
+        f"THEN json_extract({row}emotions, '$.{e}') END, 0.0)"
+        for e in EMOTIONS
+    ]
+    return [f'{row}depression_index', f'{row}aggression_index'] + emotions
+
+
+def _cutoff(days):
+    """Get the first day of a window of `days` calendar days ending today"""
+    return (datetime.date.today() - datetime.timedelta(days=days - 1)).isoformat()
+
+
+class MoodRollup:
+    """
+    SQLite table of daily emotion-log aggregates, next to the log table
+
+    Triggers on the log table upsert each new log into its day's row in the
+    same transaction as the insert, and recompute a day from its logs when
+    one is updated or deleted; logs without both indices are skipped. Reading
+    a window costs one indexed row per day regardless of how many logs each
+    day holds. Means are sum / count; the sums keep them exact under merging.
+    """
+
+    def __init__(self, path, log_table='emotion_logs'):
+        """
+        Initialize the rollup, installing its table and triggers if needed
+
+        Logs stored before the triggers existed are aggregated in the same
+        transaction that installs them, so no log is counted twice or missed.
+        The table and triggers are reinstalled the same way when their
+        definitions change.
+
+        Args:
+            path: Existing SQLite database file holding the emotion logs
+            log_table: Table EmotionLog.add_log inserts into
+
+        Raises:
+            sqlite3.Error: If the database cannot be opened
+            ValueError: If the table does not exist or lacks one of LOG_COLUMNS
+        """
+        if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', log_table):
+            raise ValueError(f"Invalid log table name '{log_table}'")
+        self.path = path
+        self.log_table = log_table
+        # sqlite3 connections may not be shared between Flask's worker threads
+        self._local = threading.local()
+
+        conn = self._connection()
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info("{log_table}")')}
+        missing = [column for column in LOG_COLUMNS if column not in columns]
+        if missing:
+            raise ValueError(
+                f"{path} has no '{log_table}' table with columns {', '.join(missing)}"
+            )
+
+        schema = self._schema()
+        with self._transaction() as conn:
+            # Recomputing a day and rebuilding read the logs by patient and time
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{log_table}_patient_timestamp" '
+                         f'ON "{log_table}" (patient_id, timestamp)')
+            installed = dict(conn.execute(
+                'SELECT name, sql FROM sqlite_master WHERE name IN ({})'.format(
+                    ', '.join('?' for _ in schema)
+                ), list(schema)
+            ).fetchall())
+            if {name: ' '.join(sql.split()) for name, sql in installed.items()} != {
+                name: ' '.join(sql.split()) for name, sql in schema.items()
+            }:
+                for name in installed:
+                    kind = 'TABLE' if name == 'mood_daily' else 'TRIGGER'
+                    conn.execute(f'DROP {kind} "{name}"')
+                for sql in schema.values():
+                    conn.execute(sql)
+                self._rebuild(conn, None)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit; writes take explicit BEGIN IMMEDIATE transactions. The
+            # database must already exist (mode=rw), so a wrong path is not created
+            conn = self._local.conn = sqlite3.connect(
+                Path(self.path).resolve().as_uri() + '?mode=rw', uri=True, isolation_level=None
+            )
+        return conn
+
+    def _transaction(self):
+        """Context manager for a write transaction that holds the write lock from its start"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        return conn
+
+    def _aggregate(self, where):
+        """SQL selecting rollup rows from the logs matching a condition"""
+        values = ', '.join(f'{expr} AS {m}' for m, expr in zip(METRICS, _values('')))
+        aggregates = ', '.join(f'SUM({m}), MIN({m}), MAX({m})' for m in METRICS)
+        return f'''
+            SELECT patient_id, day, COUNT(*), {aggregates} FROM (
+                SELECT patient_id, {_day('')} AS day, {values}
+                FROM "{self.log_table}" WHERE ({where}) AND {_scored('')}
+            ) GROUP BY patient_id, day
+        '''
+
+    def _recompute_day(self, row):
+        """Trigger SQL rebuilding the day row of an OLD or NEW log from the table"""
+        day = _day(row)
+        return f'''
+            DELETE FROM mood_daily WHERE patient_id = {row}patient_id AND day = {day};
+            INSERT INTO mood_daily (patient_id, day, count, {_COLUMNS}) {self._aggregate(
+                f"patient_id = {row}patient_id AND timestamp >= {day} "
+                f"AND timestamp < date({day}, '+1 day')"
+            )};
+        '''
+
+    def _schema(self):
+        """CREATE statements of the rollup table and its triggers, by name"""
+        table = self.log_table
+        values = ', '.join(f'{v}, {v}, {v}' for v in _values('NEW.'))
+        return {
+            'mood_daily': f'''
+                CREATE TABLE mood_daily (
+                    patient_id INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    {_AGGREGATES},
+                    PRIMARY KEY (patient_id, day)
+                )
+            ''',
+            f'{table}_mood_insert': f'''
+                CREATE TRIGGER "{table}_mood_insert" AFTER INSERT ON "{table}"
+                WHEN {_scored('NEW.')} BEGIN
+                    INSERT INTO mood_daily (patient_id, day, count, {_COLUMNS})
+                    VALUES (NEW.patient_id, {_day('NEW.')}, 1, {values})
+                    ON CONFLICT (patient_id, day) DO UPDATE SET count = count + 1, {_MERGE};
+                END
+            ''',
+            f'{table}_mood_delete': f'''
+                CREATE TRIGGER "{table}_mood_delete" AFTER DELETE ON "{table}" BEGIN
+                    {self._recompute_day('OLD.')}
+                END
+            ''',
+            f'{table}_mood_update': f'''
+                CREATE TRIGGER "{table}_mood_update" AFTER UPDATE OF {', '.join(LOG_COLUMNS)}
+                ON "{table}" BEGIN
+                    {self._recompute_day('OLD.')}
+                    {self._recompute_day('NEW.')}
+                END
+            ''',
+        }
+
+    def _rebuild(self, conn, patient_id):
+        where = 'patient_id = ?' if patient_id is not None else '1'
+        params = (patient_id,) if patient_id is not None else ()
+        conn.execute(f'DELETE FROM mood_daily WHERE {where}', params)
+        conn.execute(
+            f'INSERT INTO mood_daily (patient_id, day, count, {_COLUMNS}) {self._aggregate(where)}',
+            params
+        )
+
+    def rebuild(self, patient_id=None):
+        """
+        Recompute the rollup from the log table, e.g. after logs were changed
+        with the triggers absent
+
+        The logs are read and the rows replaced in one transaction, so logs
+        inserted meanwhile are neither lost nor counted twice.
+
+        Args:
+            patient_id: Only rebuild this patient's days (None: every patient)
+        """
+        with self._transaction() as conn:
+            self._rebuild(conn, patient_id)
+
+    def daily(self, patient_id, days):
+        """
+        Get the daily aggregates of the last `days` calendar days, today included
+
+        Returns:
+            list: One dict per day with logs, oldest first: day, count, and
+            {metric: {'mean', 'min', 'max'}} for every entry of METRICS
+        """
+        rows = self._connection().execute(
+            f'SELECT day, count, {_COLUMNS} FROM mood_daily '
+            'WHERE patient_id = ? AND day >= ? ORDER BY day',
+            (patient_id, _cutoff(days))
+        ).fetchall()
+
+        result = []
+        for row in rows:
+            day, count, values = row[0], row[1], row[2:]
+            entry = {'day': day, 'count': count}
+            for i, metric in enumerate(METRICS):
+                total, low, high = values[3 * i:3 * i + 3]
+                entry[metric] = {'mean': total / count, 'min': low, 'max': high}
+            result.append(entry)
+        return result
@@ -0,0 +1,81 @@
+"""
+Tests for result reuse in the FER service (result_cache.py, frame_gate.py)
+Run with `python test_frame_reuse.py` (or pytest) from the backend directory
+"""
+import importlib.util
+import os
+import sys
+
+AI_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai')
+sys.path.insert(0, AI_DIR)
+sys.path.insert(0, os.path.join(AI_DIR, 'benchmarks'))
+
+from common import synthetic_face
+from frame_gate import FrameGate, motion_thumbnail
+from preprocessing import decode_image
+from result_cache import ResultCache, content_hash
+
+
+def _frames(seed=0):
+    """Preprocessed smiling and frowning versions of the same synthetic face"""
+    return (decode_image(synthetic_face(seed, expression='smile')),
+            decode_image(synthetic_face(seed, expression='frown')))
+
+
+def test_cache_only_matches_identical_frames():
+    cache = ResultCache()
+    for seed in range(5):
+        smile, frown = _frames(seed)
+        assert content_hash(smile) != content_hash(frown)
+
+        cache.put(content_hash(smile), 'happy', 'patient')
+        assert cache.get(content_hash(frown), 'patient') is None
+        assert cache.get(content_hash(smile.clone()), 'patient') == 'happy'
+
+
+def test_cache_is_scoped_to_sessions():
+    smile, _ = _frames()
+    frame_hash = content_hash(smile)
+    cache = ResultCache()
+
+    cache.put(frame_hash, 'happy', None)
+    assert cache.get(frame_hash, None) is None
+    assert cache.stats()['entries'] == 0
+
+    cache.put(frame_hash, 'happy', 'patient-a')
+    assert cache.get(frame_hash, 'patient-b') is None
+    assert cache.get(frame_hash, None) is None
+    assert cache.get(frame_hash, 'patient-a') == 'happy'
+
+
+def test_gate_cannot_tell_expressions_apart():
+    # Why gating is opt-in: once enabled, a frown reuses the smile's result
+    smile, frown = _frames()
+    gate = FrameGate(threshold=0.02)
+    gate.update('patient', motion_thumbnail(smile), 'happy')
+    assert gate.check('patient', motion_thumbnail(frown)) == 'happy'
+
+
+def test_service_runs_every_expression_change_by_default():
+    for name in ('FER_GATE_THRESHOLD', 'FER_CACHE_SIZE'):
+        os.environ.pop(name, None)
+    # By path: backend/main.py (the desktop app) shadows the service under pytest
+    spec = importlib.util.spec_from_file_location('main', os.path.join(AI_DIR, 'main.py'))
+    main = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(main)
+    assert main.frame_gate is None and main.result_cache is None
+
+    for seed in range(5):
+        for expression in ('smile', 'frown', 'smile'):
+            # Neither signature is computed, so the frame always goes to the model
+            _, _, frame_hash, thumbnail = main._prepare_frame(
+                synthetic_face(seed, expression=expression), 'patient'
+            )
+            assert frame_hash is None and thumbnail is None
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f'✓ {name}')
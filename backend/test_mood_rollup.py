@@ -0,0 +1,137 @@
+"""
+Tests for the trigger-maintained mood rollup (mood_rollup.py)
+Run with `python test_mood_rollup.py` (or pytest) from the backend directory
+"""
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mood_rollup import MoodRollup
+
+TODAY = datetime.date.today().isoformat()
+
+
+def _log_database(directory):
+    """Create an emotion-log database shaped like EmotionLog's table"""
+    path = os.path.join(directory, 'logs.db')
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE emotion_logs (
+            id INTEGER PRIMARY KEY, patient_id INTEGER, timestamp TEXT, emotions TEXT,
+            depression_index REAL, aggression_index REAL, source TEXT
+        )
+    ''')
+    conn.commit()
+    return path, conn
+
+
+def _add_log(conn, depression, aggression, emotions=None, day=TODAY, patient_id=1):
+    conn.execute(
+        'INSERT INTO emotion_logs (patient_id, timestamp, emotions, depression_index, '
+        'aggression_index, source) VALUES (?, ?, ?, ?, ?, ?)',
+        (patient_id, f'{day} 10:00:00', json.dumps(emotions or {'sad': 0.5}),
+         depression, aggression, 'face')
+    )
+    conn.commit()
+
+
+def test_logs_without_indices_are_skipped():
+    with tempfile.TemporaryDirectory() as directory:
+        path, conn = _log_database(directory)
+        _add_log(conn, None, 1.0)  # Stored before the rollup existed
+        rollup = MoodRollup(path)
+        _add_log(conn, 4.0, 2.0)
+        _add_log(conn, 2.0, None)
+        _add_log(conn, 6.0, 4.0)
+
+        [day] = rollup.daily(1, 7)
+        assert day['count'] == 2
+        assert day['depression'] == {'mean': 5.0, 'min': 4.0, 'max': 6.0}
+        assert day['aggression']['mean'] == 3.0
+
+        conn.execute('UPDATE emotion_logs SET depression_index = NULL WHERE depression_index = 6.0')
+        conn.commit()
+        [day] = rollup.daily(1, 7)
+        assert day['count'] == 1 and day['depression']['mean'] == 4.0
+
+        rollup.rebuild()
+        assert rollup.daily(1, 7)[0]['count'] == 1
+
+
+def test_rollup_follows_inserts_updates_and_deletes():
+    with tempfile.TemporaryDirectory() as directory:
+        path, conn = _log_database(directory)
+        yesterday = (datetime.date.today() - datetime.timedelta(days=1)).isoformat()
+        _add_log(conn, 1.0, 0.0, {'sad': 0.2}, day=yesterday)
+        rollup = MoodRollup(path)
+        _add_log(conn, 3.0, 1.0, {'sad': 0.4})
+        _add_log(conn, 5.0, 1.0, {'sad': 0.8})
+
+        days = rollup.daily(1, 2)
+        assert [day['day'] for day in days] == [yesterday, TODAY]
+        assert abs(days[1]['sad']['mean'] - 0.6) < 1e-12
+        assert rollup.daily(1, 1)[0]['day'] == TODAY
+
+        # An insert that is rolled back leaves no trace
+        conn.execute(
+            "INSERT INTO emotion_logs (patient_id, timestamp, emotions, depression_index, "
+            "aggression_index) VALUES (1, ?, '{}', 9, 9)", (f'{TODAY} 11:00:00',)
+        )
+        conn.rollback()
+        assert rollup.daily(1, 1)[0]['count'] == 2
+
+        conn.execute('UPDATE emotion_logs SET timestamp = ? WHERE depression_index = 5.0',
+                     (f'{yesterday} 09:00:00',))
+        conn.execute('DELETE FROM emotion_logs WHERE depression_index = 1.0')
+        conn.commit()
+        [day_before, today] = rollup.daily(1, 2)
+        assert (day_before['count'], day_before['depression']['mean']) == (1, 5.0)
+        assert (today['count'], today['depression']['mean']) == (1, 3.0)
+
+
+def test_changed_definitions_are_reinstalled():
+    with tempfile.TemporaryDirectory() as directory:
+        path, conn = _log_database(directory)
+        MoodRollup(path)
+        # A trigger from an older definition that counts nothing
+        conn.execute('DROP TRIGGER emotion_logs_mood_insert')
+        conn.execute('CREATE TRIGGER emotion_logs_mood_insert AFTER INSERT ON emotion_logs '
+                     'BEGIN SELECT 1; END')
+        conn.commit()
+        _add_log(conn, 2.0, 2.0)
+
+        rollup = MoodRollup(path)
+        _add_log(conn, 4.0, 4.0)
+        assert rollup.daily(1, 1)[0]['count'] == 2
+
+
+def test_missing_database_is_not_created():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'missing.db')
+        try:
+            MoodRollup(path)
+        except sqlite3.Error:
+            pass
+        else:
+            raise AssertionError('MoodRollup opened a database that does not exist')
+        assert not os.path.exists(path)
+
+        path, _ = _log_database(directory)
+        try:
+            MoodRollup(path, 'other_logs')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('MoodRollup accepted a missing log table')
+
+
+if __name__ == '__main__':
+    for name, test in list(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print(f'✓ {name}')